@@ -1,6 +1,7 @@
-from flask import Flask, render_template, jsonify, request, send_file
+from flask import Flask, render_template, jsonify, request, send_file, Response, stream_with_context
 import os
 import json
+import queue
 import threading
 import time
 from datetime import datetime
@@ -8,17 +9,27 @@ from core.cleaner import PCCleaner
 from core.system_monitor import SystemMonitor
 from core.admin_utils import AdminUtils
 from core.duplicate_finder import DuplicateFinder
+from core.duplicate_tree import DuplicateTree
+from core.scan_checkpoint import DEFAULT_CHECKPOINT_PATH
+from core.metrics_history import parse_range
+from core.write_attribution import DiskWriterTracker
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'dexter_pc_optimizer_secret_key')
 
 # Global variables for state management
 scan_progress = {'progress': 0, 'status': 'idle', 'files': []}
+duplicate_search = {'status': 'idle', 'progress': {}, 'duplicates': [], 'potential_savings': 0}
+duplicate_cancel = threading.Event()
 system_stats = {}
 cleaner = PCCleaner()
 monitor = SystemMonitor()
+monitor.start_sampler()
 admin_utils = AdminUtils()
 duplicate_finder = DuplicateFinder()
+cleaner_roots = cleaner.get_category_roots()
+disk_writers = DiskWriterTracker(cleaner_roots)
+disk_writers.start()
 
 @app.route('/')
 def index():
@@ -29,21 +40,83 @@ def index():
 def get_system_status():
     """Get current system status and statistics"""
     try:
-        stats = monitor.get_system_stats()
-        admin_status = admin_utils.check_admin_privileges()
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'cpu_usage': stats['cpu_usage'],
-                'memory_usage': stats['memory_usage'],
-                'disk_usage': stats['disk_usage'],
-                'free_space': stats['free_space'],
-                'total_space': stats['total_space'],
-                'is_admin': admin_status,
-                'temperature': stats.get('temperature', None)
-            }
-        })
+        return jsonify({'success': True, 'data': build_system_status(monitor.get_snapshot())})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/system-stream')
+def stream_system_status():
+    """
+    Push system status to the client as server-sent events
+    
+    Every client is fed from the one background sampler. The first event
+    is a full 'snapshot'; after that 'delta' events carry only the fields
+    that changed.
+    """
+    def generate():
+        subscriber = monitor.subscribe()
+        try:
+            last = build_system_status(monitor.get_snapshot())
+            yield f"retry: 5000\nevent: snapshot\ndata: {json.dumps(last)}\n\n"
+            while True:
+                try:
+                    status = build_system_status(subscriber.get(timeout=15))
+                except queue.Empty:
+                    yield ": keepalive\n\n"  # Lets proxies and the server notice dead clients
+                    continue
+                
+                delta = {key: value for key, value in status.items() if last.get(key) != value}
+                last = status
+                if delta:
+                    yield f"event: delta\ndata: {json.dumps(delta)}\n\n"
+        finally:
+            monitor.unsubscribe(subscriber)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def build_system_status(stats):
+    """Shape a monitor snapshot for the dashboard"""
+    return {
+        'cpu_usage': stats['cpu_usage'],
+        'memory_usage': stats['memory_usage'],
+        'disk_usage': stats['disk_usage'],
+        'free_space': stats['free_space'],
+        'total_space': stats['total_space'],
+        'is_admin': admin_utils.check_admin_privileges(),
+        'temperature': stats.get('temperature', None),
+        'load_average': stats.get('load_average'),
+        'disk_io': stats.get('disk_io', {}),
+        'network_io': stats.get('network_io', {}),
+        'cgroup': stats.get('cgroup'),
+        'timestamp': stats.get('timestamp')
+    }
+
+@app.route('/api/top-processes')
+def get_top_processes():
+    """Get the top processes, e.g. ?limit=10&sort=cpu (cpu, memory or io)"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), 100))
+        return jsonify({'success': True, 'data': monitor.get_top_processes(limit, request.args.get('sort', 'cpu'))})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/disk-writers')
+def get_disk_writers():
+    """Rank the processes writing into the directories the cleaner empties"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), 100))
+        return jsonify({'success': True, 'data': disk_writers.get_report(limit)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/system-history')
+def get_system_history():
+    """Get the min/avg/max history of one metric, e.g. ?metric=cpu_usage&range=1h"""
+    try:
+        metric = request.args.get('metric', 'cpu_usage')
+        range_seconds = parse_range(request.args.get('range', '1h'))
+        return jsonify({'success': True, 'data': monitor.history.query(metric, range_seconds)})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -205,7 +278,8 @@ def clean_files():
         if not file_paths:
             return jsonify({'success': False, 'error': 'No files selected'})
         
-        # Perform cleanup
+        # Perform cleanup; never elevated, since the API is unauthenticated and
+        # the paths come from the request (use `cli.py clean --elevate` locally)
         results = cleaner.clean_files(file_paths)
         
         # Log cleanup results
@@ -222,25 +296,162 @@ def clean_files():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+def parse_search_options(body):
+    """
+    Validate the timeout and search options of a duplicate search request
+    
+    Returns:
+        (timeout in seconds or None, keyword arguments for iter_duplicates)
+        
+    Raises:
+        ValueError: For a value of the wrong type or range
+    """
+    timeout = body.get('timeout')
+    if timeout is not None:
+        if isinstance(timeout, bool) or not isinstance(timeout, (int, float, str)):
+            raise ValueError("timeout must be a number of seconds")
+        timeout = float(timeout)
+        if not 0 < timeout < float('inf'):
+            raise ValueError("timeout must be a positive number of seconds")
+    
+    search_options = {}
+    for key in ('include', 'exclude'):
+        value = body.get(key)
+        if value is not None:
+            if isinstance(value, str):
+                value = [value]
+            if not isinstance(value, list) or not all(isinstance(pattern, str) for pattern in value):
+                raise ValueError(f"{key} must be a list of glob patterns")
+            search_options[key] = value
+    for key in ('max_files', 'max_bytes_read'):
+        value = body.get(key)
+        if value is not None:
+            if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+                raise ValueError(f"{key} must be a positive integer")
+            search_options[key] = value
+    for key in ('one_filesystem', 'media_payload'):
+        value = body.get(key)
+        if value is not None:
+            if not isinstance(value, bool):
+                raise ValueError(f"{key} must be true or false")
+            search_options[key] = value
+    return timeout, search_options
+
 @app.route('/api/find-duplicates', methods=['POST'])
 def find_duplicates():
-    """Find duplicate files"""
+    """Start a background duplicate file search"""
+    global duplicate_search, duplicate_cancel
+    
     try:
-        directory = request.json.get('directory', '/')
+        directory = request.json.get('directories') or request.json.get('directory', '~')
+        # Rejected here, before the search is marked as running
+        timeout, search_options = parse_search_options(request.json)
         
-        duplicates = duplicate_finder.find_duplicates(directory)
+        if duplicate_search['status'] == 'scanning':
+            return jsonify({'success': False, 'error': 'Duplicate search already in progress'})
         
-        return jsonify({
-            'success': True,
-            'data': {
-                'duplicates': duplicates,
-                'total_groups': len(duplicates),
-                'potential_savings': duplicate_finder.calculate_savings(duplicates)
-            }
-        })
+        duplicate_cancel = threading.Event()
+        duplicate_search = {
+            'status': 'scanning',
+            'directory': directory,
+            'progress': {},
+            'duplicates': [],
+            'tree': DuplicateTree(),
+            'potential_savings': 0
+        }
+        
+        search_thread = threading.Thread(target=perform_duplicate_search,
+                                         args=(duplicate_search, directory, duplicate_cancel, timeout,
+                                               search_options))
+        search_thread.daemon = True
+        search_thread.start()
+        
+        return jsonify({'success': True, 'message': 'Duplicate search started'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+def perform_duplicate_search(state, directory, cancel_event, timeout=None, search_options=None):
+    """Run a duplicate search, publishing groups and progress as they come"""
+    timer = None
+    try:
+        if timeout:
+            timer = threading.Timer(float(timeout), cancel_event.set)
+            timer.daemon = True
+            timer.start()
+        
+        def progress_callback(progress):
+            state['progress'] = progress
+        
+        # A search interrupted by a restart picks up from its checkpoint
+        for group in duplicate_finder.iter_duplicates(directory, progress_callback=progress_callback,
+                                                      cancel_event=cancel_event,
+                                                      checkpoint_path=DEFAULT_CHECKPOINT_PATH,
+                                                      **(search_options or {})):
+            state['duplicates'].append(group)
+            duplicate_finder.get_duplicate_tree([group], state['tree'])
+            state['potential_savings'] += duplicate_finder.calculate_savings([group])
+        
+        state['hardlink_sets'] = len(duplicate_finder.hardlink_sets)
+        state['status'] = 'cancelled' if cancel_event.is_set() else 'completed'
+        
+        print(f"Duplicate search {state['status']}: {len(state['duplicates'])} groups in {directory}")
+        
+    except Exception as e:
+        state['status'] = 'error'
+        state['error'] = str(e)
+        print(f"Duplicate search error: {e}")
+    finally:
+        if timer:
+            timer.cancel()
+
+@app.route('/api/duplicate-progress')
+def get_duplicate_progress():
+    """Get duplicate search progress and the groups found after index 'since'"""
+    state = duplicate_search
+    since = request.args.get('since', 0, type=int)
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'status': state['status'],
+            'progress': state['progress'],
+            'duplicates': state['duplicates'][since:],
+            'total_groups': len(state['duplicates']),
+            'potential_savings': state['potential_savings'],
+            'hardlink_sets': state.get('hardlink_sets', 0),
+            'error': state.get('error')
+        }
+    })
+
+@app.route('/api/duplicate-tree')
+def get_duplicate_tree():
+    """List one directory of the duplicate tree, largest wasted space first"""
+    tree = duplicate_search.get('tree')
+    if tree is None:
+        return jsonify({'success': False, 'error': 'No duplicate search results'})
+    
+    try:
+        node = request.args.get('node', DuplicateTree.ROOT, type=int)
+        path = request.args.get('path')
+        if path:
+            node = tree.find(path)
+            if node is None:
+                return jsonify({'success': False, 'error': f'No duplicates under {path}'})
+        
+        data = tree.list_children(node,
+                                  offset=request.args.get('offset', 0, type=int),
+                                  limit=min(request.args.get('limit', 100, type=int), 1000))
+        data['summary'] = tree.get_summary()
+        return jsonify({'success': True, 'data': data})
+    except KeyError as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/cancel-duplicates', methods=['POST'])
+def cancel_duplicates():
+    """Cancel the running duplicate search"""
+    duplicate_cancel.set()
+    return jsonify({'success': True, 'message': 'Cancellation requested'})
+
 @app.route('/api/request-admin')
 def request_admin():
     """Request admin privileges"""
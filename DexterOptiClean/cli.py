@@ -0,0 +1,374 @@
+"""Headless command-line entry point for scheduled cleaning.
+
+Unlike app.py this module does not import Flask and only imports the core
+module needed by the chosen command, so cron jobs start quickly.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Optional
+
+CATEGORIES = ['basic', 'advanced', 'browser', 'gaming']
+DEFAULT_CATEGORIES = ['basic']
+
+
+def emit(record: Dict, as_json: bool, text: str):
+    """Write one result line to stdout and flush it immediately"""
+    sys.stdout.write((json.dumps(record) if as_json else text) + "\n")
+    sys.stdout.flush()
+
+
+def cmd_scan(args) -> int:
+    """Scan cleaning categories and stream the candidate files"""
+    from core.cleaner import PCCleaner
+
+    cleaner = PCCleaner()
+    total_files = 0
+    total_size = 0
+
+    for category in args.categories:
+        for file_info in cleaner.scan_category(category):
+            total_files += 1
+            total_size += file_info.get('size', 0)
+            emit({'event': 'file', 'category': category, **file_info}, args.json,
+                 f"{file_info['path']}\t{file_info.get('size', 0)}")
+
+    emit({'event': 'summary', 'files': total_files, 'size': total_size}, args.json,
+         f"# {total_files} files, {total_size} bytes")
+    return 0
+
+
+def cmd_clean(args) -> int:
+    """Scan cleaning categories and delete the files as they are found"""
+    from core.cleaner import PCCleaner
+
+    cleaner = PCCleaner()
+    cleaned = 0
+    freed = 0
+    errors = 0
+
+    # Files the user may not delete go to the privileged helper (sudo -n),
+    # limited to the cleaner's own roots; only ever offered locally
+    admin_utils = None
+    elevate = None
+    if args.elevate and not args.dry_run:
+        from core.admin_utils import AdminUtils
+
+        admin_utils = AdminUtils()
+        allowed_roots = [root for roots in cleaner.get_category_roots().values() for root in roots]
+
+        def elevate(file_paths):
+            return admin_utils.elevate_file_operations([('delete', path, None) for path in file_paths],
+                                                       allowed_roots)
+
+    try:
+        for category in args.categories:
+            for file_info in cleaner.scan_category(category):
+                path = file_info['path']
+                if args.dry_run:
+                    cleaned += 1
+                    freed += file_info.get('size', 0)
+                    emit({'event': 'would_clean', 'path': path, 'size': file_info.get('size', 0)},
+                         args.json, f"would clean {path}")
+                    continue
+
+                results = cleaner.clean_files([path], elevate=elevate)
+                for error in results['errors']:
+                    errors += 1
+                    emit({'event': 'error', 'path': path, 'error': error}, args.json, f"error {error}")
+                if results['cleaned_files']:
+                    cleaned += 1
+                    freed += results['freed_space']
+                    emit({'event': 'cleaned', 'path': path, 'size': results['freed_space']},
+                         args.json, f"cleaned {path}")
+    finally:
+        if admin_utils:
+            admin_utils.close_privileged_helper()
+
+    emit({'event': 'summary', 'cleaned': cleaned, 'freed_space': freed, 'errors': errors},
+         args.json, f"# cleaned {cleaned} files, freed {freed} bytes, {errors} errors")
+    return 1 if errors else 0
+
+
+def cmd_dedupe(args) -> int:
+    """Find duplicate files and optionally remove the extra copies"""
+    from core.duplicate_finder import DuplicateFinder
+
+    finder = DuplicateFinder()
+    if args.dirs:
+        return dedupe_directories(finder, args)
+
+    groups = []
+    group_count = 0
+    savings = 0
+    keep_groups = args.plan or args.remove
+
+    search = finder.iter_duplicates(args.directories, min_file_size=args.min_size,
+                                    include=args.include, exclude=args.exclude,
+                                    max_files=args.max_files, max_bytes_read=args.max_bytes,
+                                    one_filesystem=args.one_filesystem, media_payload=args.media_payload,
+                                    checkpoint_path=args.checkpoint)
+
+    writer = None
+    if args.export:
+        from core.report_writer import open_report_writer
+        writer = open_report_writer(args.export, args.export_format)
+
+    try:
+        for group in search:
+            group_savings = finder.calculate_savings([group])
+            group_count += 1
+            savings += group_savings
+            if keep_groups:
+                groups.append(group)
+            keep_file = finder.suggest_files_to_keep(group)
+            if writer:
+                writer.write_group(group, keep_file, group_savings)
+            emit({'event': 'group', 'hash': group['hash'], 'size': group['size'],
+                  'keep': keep_file, 'files': [f['path'] for f in group['files']]},
+                 args.json, f"{group['hash']}\t{group['size']}\t" +
+                 "\t".join(f['path'] for f in group['files']))
+    finally:
+        if writer:
+            writer.close()
+
+    if args.plan:
+        plan = finder.plan_removal(groups)
+        plan.save(args.plan)
+        emit({'event': 'plan', 'path': args.plan, 'actions': len(plan), 'bytes': plan.total_bytes()},
+             args.json, f"# plan with {len(plan)} removals written to {args.plan}")
+
+    removed = 0
+    freed = 0
+    errors: List[str] = []
+    if args.remove and groups:
+        results = finder.apply_plan(finder.plan_removal(groups), journal_path=args.journal)
+        removed = len(results['removed_files'])
+        freed = results['space_freed']
+        errors = results['errors']
+        emit_apply_results(results, args.json)
+
+    emit({'event': 'summary', 'groups': group_count, 'potential_savings': savings,
+          'removed': removed, 'space_freed': freed},
+         args.json, f"# {group_count} groups, {savings} bytes reclaimable")
+    return 1 if errors else 0
+
+
+def dedupe_directories(finder, args) -> int:
+    """Report identical directory trees, optionally removing the extra copies"""
+    groups = finder.find_duplicate_directories(args.directories, min_file_size=args.min_size,
+                                               include=args.include, exclude=args.exclude,
+                                               one_filesystem=args.one_filesystem)
+    for group in groups:
+        emit({'event': 'directory_group', **group}, args.json,
+             f"{group['hash']}\t{group['wasted']}\t" + "\t".join(group['directories']))
+
+    errors: List[str] = []
+    if args.plan or args.remove:
+        plan = finder.plan_directory_removal(groups)
+        if args.plan:
+            plan.save(args.plan)
+            emit({'event': 'plan', 'path': args.plan, 'actions': len(plan), 'bytes': plan.total_bytes()},
+                 args.json, f"# plan with {len(plan)} removals written to {args.plan}")
+        if args.remove and len(plan):
+            results = finder.apply_plan(plan, journal_path=args.journal)
+            errors = results['errors']
+            emit_apply_results(results, args.json)
+
+    wasted = sum(group['wasted'] for group in groups)
+    emit({'event': 'summary', 'directory_groups': len(groups), 'potential_savings': wasted},
+         args.json, f"# {len(groups)} duplicate directory trees, {wasted} bytes reclaimable")
+    return 1 if errors else 0
+
+
+def emit_apply_results(results: Dict, as_json: bool):
+    """Write the per-file outcome lines of a plan run"""
+    for key, event in (('removed_files', 'removed'), ('linked_files', 'linked'),
+                       ('restored_files', 'restored')):
+        for path in results.get(key, []):
+            emit({'event': event, 'path': path}, as_json, f"{event} {path}")
+    for error in results['errors']:
+        emit({'event': 'error', 'error': error}, as_json, f"error {error}")
+
+
+def cmd_apply(args) -> int:
+    """Apply a saved removal plan, or resume or undo a journaled run"""
+    from core.duplicate_finder import DuplicateFinder
+    from core.removal_plan import RemovalPlan
+
+    finder = DuplicateFinder(cache_path=None)
+    if args.undo:
+        results = finder.undo_plan(args.undo, workers=args.workers)
+    elif args.resume:
+        results = finder.resume_plan(args.resume, workers=args.workers)
+    elif args.plan:
+        results = finder.apply_plan(RemovalPlan.load(args.plan), journal_path=args.journal,
+                                    workers=args.workers)
+    else:
+        emit({'event': 'error', 'error': 'nothing to do'}, args.json,
+             "error: give a plan file, --resume JOURNAL or --undo JOURNAL")
+        return 2
+
+    emit_apply_results(results, args.json)
+    emit({'event': 'summary', 'journal': results['journal'], 'errors': len(results['errors']),
+          'space_freed': results.get('space_freed', 0), 'cancelled': results['cancelled']},
+         args.json, f"# journal {results['journal']}, {len(results['errors'])} errors")
+    return 1 if results['errors'] else 0
+
+
+def cmd_blocks(args) -> int:
+    """Estimate block-level dedup and compression savings per directory"""
+    from core.duplicate_finder import DuplicateFinder
+
+    def progress_callback(progress):
+        if args.json:
+            emit({'event': 'progress', **progress}, True, "")
+
+    report = DuplicateFinder(cache_path=None).analyze_block_savings(
+        args.directories, min_file_size=args.min_size, progress_callback=progress_callback,
+        include=args.include, exclude=args.exclude, one_filesystem=args.one_filesystem)
+
+    for entry in report['directories'][:args.top]:
+        emit({'event': 'directory', **entry}, args.json,
+             f"{entry['directory']}\t{entry['bytes']}\t{entry['dedup_savings']}\t{entry['compress_savings']}")
+
+    summary = {key: value for key, value in report.items() if key != 'directories'}
+    emit({'event': 'summary', **summary}, args.json,
+         f"# {report['files']} files, {report['total_bytes']} bytes, "
+         f"dedup saves {report['dedup_savings']}, compression saves {report['compress_savings']}")
+    return 0
+
+
+def cmd_cache(args) -> int:
+    """Show, prune, trim or clear the persistent hash cache"""
+    from core.hash_cache import DEFAULT_MAX_DISK_ENTRIES, HashCache
+
+    cache = HashCache(max_disk_entries=args.max_entries or DEFAULT_MAX_DISK_ENTRIES)
+    try:
+        if args.clear:
+            cache.clear()
+            emit({'event': 'cleared'}, args.json, "cleared")
+        if args.max_entries:
+            removed = cache.trim()
+            emit({'event': 'trimmed', 'removed': removed}, args.json, f"trimmed {removed}")
+        if args.prune:
+            removed = cache.prune()
+            emit({'event': 'pruned', 'removed': removed}, args.json, f"pruned {removed}")
+
+        stats = cache.get_stats()
+        emit({'event': 'summary', 'path': stats['persistent_path'], 'entries': stats['disk_entries'],
+              'max_entries': stats['max_disk_entries']},
+             args.json, f"# {stats['disk_entries']} cached hashes in {stats['persistent_path']}")
+    finally:
+        cache.close()
+    return 0
+
+
+def cmd_report(args) -> int:
+    """Print a one-shot system status report"""
+    from core.system_monitor import SystemMonitor
+
+    stats = SystemMonitor().get_system_stats()
+    if args.json:
+        emit(stats, True, "")
+    else:
+        for key, value in stats.items():
+            emit({}, False, f"{key}: {value}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser for all sub-commands"""
+    parser = argparse.ArgumentParser(prog='dexter-clean',
+                                     description='DEXTER PC Optimizer headless mode')
+    parser.add_argument('--json', action='store_true', help='emit one JSON object per line')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    scan = sub.add_parser('scan', help='list cleanup candidates')
+    scan.add_argument('categories', nargs='*', metavar='CATEGORY',
+                      help=f"categories to scan: {', '.join(CATEGORIES)} (default: basic)")
+    scan.set_defaults(func=cmd_scan)
+
+    clean = sub.add_parser('clean', help='delete cleanup candidates')
+    clean.add_argument('categories', nargs='*', metavar='CATEGORY',
+                      help=f"categories to clean: {', '.join(CATEGORIES)} (default: basic)")
+    clean.add_argument('--dry-run', action='store_true', help='only show what would be cleaned')
+    clean.add_argument('--elevate', action='store_true',
+                       help='delete files owned by other users through sudo -n (never prompts)')
+    clean.set_defaults(func=cmd_clean)
+
+    dedupe = sub.add_parser('dedupe', help='find duplicate files')
+    dedupe.add_argument('directories', nargs='*', default=['~'], help='directories searched together')
+    dedupe.add_argument('--include', action='append', help='only consider files matching this glob')
+    dedupe.add_argument('--exclude', action='append', help='skip files and directories matching this glob')
+    dedupe.add_argument('--max-files', type=int, help='stop walking after this many candidate files')
+    dedupe.add_argument('--max-bytes', type=int, help='stop hashing after reading this many bytes')
+    dedupe.add_argument('--one-filesystem', action='store_true', help='stay on the filesystem of each directory')
+    dedupe.add_argument('--min-size', type=int, default=1024, help='minimum file size in bytes')
+    dedupe.add_argument('--checkpoint', metavar='FILE',
+                        help='save progress here and resume from it after an interruption')
+    dedupe.add_argument('--media-payload', action='store_true',
+                        help='match audio and images by media payload, ignoring tags and EXIF')
+    dedupe.add_argument('--dirs', action='store_true',
+                        help='report identical directory trees instead of single files (all file types)')
+    dedupe.add_argument('--remove', action='store_true', help='remove duplicates, keeping the best copy')
+    dedupe.add_argument('--export', help='stream groups to a report file as they are found')
+    dedupe.add_argument('--export-format', choices=['csv', 'jsonl', 'bin'],
+                        help='report format (default: from the --export extension)')
+    dedupe.add_argument('--plan', help='write the removal plan to this file for a later apply')
+    dedupe.add_argument('--journal', help='journal file for --remove (default under the data directory)')
+    dedupe.set_defaults(func=cmd_dedupe)
+
+    apply = sub.add_parser('apply', help='apply a removal plan, or resume or undo a run')
+    apply.add_argument('plan', nargs='?', help='plan file written by dedupe --plan')
+    apply.add_argument('--journal', help='journal file for a new run')
+    apply.add_argument('--resume', metavar='JOURNAL', help='finish an interrupted run')
+    apply.add_argument('--undo', metavar='JOURNAL', help='restore the files a run removed')
+    apply.add_argument('--workers', type=int, help='worker threads')
+    apply.set_defaults(func=cmd_apply)
+
+    blocks = sub.add_parser('blocks', help='estimate block-level dedup and compression savings')
+    blocks.add_argument('directories', nargs='*', default=['~'])
+    blocks.add_argument('--min-size', type=int, default=1024 * 1024, help='minimum file size in bytes')
+    blocks.add_argument('--include', action='append', help='only consider files matching this glob')
+    blocks.add_argument('--exclude', action='append', help='skip files and directories matching this glob')
+    blocks.add_argument('--one-filesystem', action='store_true', help='stay on the filesystem of each directory')
+    blocks.add_argument('--top', type=int, default=20, help='number of directories to list')
+    blocks.set_defaults(func=cmd_blocks)
+
+    cache = sub.add_parser('cache', help='show or maintain the duplicate finder hash cache')
+    cache.add_argument('--prune', action='store_true', help='drop entries of deleted or changed files')
+    cache.add_argument('--max-entries', type=int,
+                       help='drop the least recently used entries beyond this many')
+    cache.add_argument('--clear', action='store_true', help='remove all entries')
+    cache.set_defaults(func=cmd_cache)
+
+    report = sub.add_parser('report', help='print system status')
+    report.set_defaults(func=cmd_report)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if hasattr(args, 'categories'):
+        # Checked here because argparse rejects an empty or default list when
+        # choices is set on a nargs='*' positional
+        unknown = [category for category in args.categories if category not in CATEGORIES]
+        if unknown:
+            parser.error(f"invalid category: {', '.join(unknown)} (choose from {', '.join(CATEGORIES)})")
+        args.categories = args.categories or list(DEFAULT_CATEGORIES)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # Output was piped into something like `head`; stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
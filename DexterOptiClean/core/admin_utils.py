@@ -1,13 +1,17 @@
 import os
+import stat
 import sys
 import subprocess
 import platform
+from typing import Dict, List, Optional, Sequence, Tuple
+from core.privileged_helper import PrivilegedHelper
 
 class AdminUtils:
     """Admin privilege management utilities"""
     
     def __init__(self):
         self.platform = platform.system().lower()
+        self._helper = None
     
     def check_admin_privileges(self) -> bool:
         """Check if the application is running with admin/root privileges"""
@@ -197,6 +201,10 @@ class AdminUtils:
             else:
                 return False
             
+            if self._helper and self._helper.running:
+                # Reuse the privileged helper instead of spawning a process
+                return self._helper.run([(operation, source, destination)])[0]['success']
+            
             result = self.run_as_admin(command)
             return result.returncode == 0
             
@@ -204,6 +212,54 @@ class AdminUtils:
             print(f"Error in elevated file operation: {e}")
             return False
     
+    def elevate_file_operations(self, operations: Sequence[Tuple[str, str, Optional[str]]],
+                                allowed_roots: Sequence[str]) -> List[Dict]:
+        """
+        Perform many file operations with elevated privileges
+        
+        On Unix-like systems they go in batches to one long-lived helper
+        started through sudo, which refuses paths outside allowed_roots.
+        The helper stays up for later calls with the same roots. Windows
+        falls back to one elevated command per operation.
+        
+        World-writable roots such as /tmp are dropped: the files in them
+        that the user may not touch belong to other users.
+        
+        Args:
+            operations: (operation, source, destination) tuples with
+                operation 'delete', 'move' or 'copy'
+            allowed_roots: Directories the operations may touch
+        
+        Returns:
+            One dict per operation with path, success, freed bytes and error
+        """
+        if self.platform == 'windows':
+            results = []
+            for operation, source, destination in operations:
+                success = self.elevate_file_operation(operation, source, destination)
+                results.append({'path': source, 'success': success, 'freed': 0,
+                                'error': None if success else f"Permission denied: {source}"})
+            return results
+        
+        roots = []
+        for root in allowed_roots:
+            root = os.path.realpath(os.path.expanduser(root))
+            try:
+                if not os.stat(root).st_mode & stat.S_IWOTH:
+                    roots.append(root)
+            except OSError:
+                continue
+        if self._helper is None or self._helper.allowed_roots != roots:
+            self.close_privileged_helper()
+            self._helper = PrivilegedHelper(roots)
+        return self._helper.run(operations)
+    
+    def close_privileged_helper(self):
+        """Stop the privileged helper if one is running"""
+        if self._helper:
+            self._helper.close()
+            self._helper = None
+    
     def create_scheduled_task(self, task_name: str, command: str, schedule: str = 'daily') -> bool:
         """Create a scheduled task (Windows) or cron job (Unix)"""
         try:
@@ -0,0 +1,255 @@
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+
+def find_cgroup_dir(root: str = CGROUP_ROOT) -> Optional[str]:
+    """
+    Find this process's cgroup v2 directory
+
+    Returns:
+        Directory of the cgroup, or None without a unified (v2) hierarchy
+    """
+    if not os.path.exists(os.path.join(root, 'cgroup.controllers')):
+        return None
+    try:
+        with open('/proc/self/cgroup', 'r') as f:
+            for line in f:
+                if line.startswith('0::'):
+                    path = os.path.join(root, line[3:].strip().lstrip('/'))
+                    # Inside a cgroup namespace the path may not be visible; the
+                    # namespace root is then mounted at root
+                    return path if os.path.isdir(path) else root
+    except OSError:
+        pass
+    return root
+
+
+def available_cpus() -> int:
+    """
+    CPUs this process can actually use
+
+    The smallest of the CPU count, the scheduler affinity mask and the
+    cgroup v2 CPU quota, rounded up. Use it to size worker pools so a
+    container limited to two CPUs does not start a worker per host core.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+
+    cgroup = CgroupStats.detect()
+    if cgroup:
+        limit = cgroup.cpu_limit()
+        cgroup.close()
+        if limit:
+            cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+class CgroupStats:
+    """
+    Usage and limits of a cgroup v2, read straight from its files
+
+    Control files are opened once and re-read with pread, so a sample
+    costs a few small reads and no path lookups. Limits set on ancestor
+    cgroups apply too, so the effective limit is the smallest along the
+    path up to the hierarchy root. CPU and I/O rates are deltas between
+    calls to refresh.
+    """
+
+    def __init__(self, path: str, root: str = CGROUP_ROOT):
+        """
+        Args:
+            path: The cgroup directory
+            root: Mount point of the hierarchy
+        """
+        self.path = path
+        self.root = root
+        self._fds = {}  # file path -> descriptor, or None if it does not exist
+        self._devices = {}  # 'major:minor' -> device name
+        self._lock = threading.Lock()
+        self._previous = None  # (monotonic time, cpu.stat, io.stat)
+        self.stats = None
+
+    @classmethod
+    def detect(cls, root: str = CGROUP_ROOT) -> Optional['CgroupStats']:
+        """Get the stats of this process's cgroup, or None without cgroup v2"""
+        path = find_cgroup_dir(root)
+        return cls(path, root) if path else None
+
+    def close(self):
+        with self._lock:
+            for fd in self._fds.values():
+                if fd is not None:
+                    os.close(fd)
+            self._fds.clear()
+
+    def _read(self, name: str, directory: Optional[str] = None) -> Optional[str]:
+        """Read a control file through its cached descriptor"""
+        file_path = os.path.join(directory or self.path, name)
+        with self._lock:
+            if file_path not in self._fds:
+                try:
+                    self._fds[file_path] = os.open(file_path, os.O_RDONLY)
+                except OSError:
+                    self._fds[file_path] = None
+            fd = self._fds[file_path]
+            if fd is None:
+                return None
+            try:
+                return os.pread(fd, 65536, 0).decode('ascii', 'replace')
+            except OSError:
+                os.close(fd)
+                del self._fds[file_path]  # Reopen next time, e.g. after the cgroup was recreated
+                return None
+
+    def _read_keyed(self, name: str) -> Dict[str, int]:
+        """Parse 'key value' lines such as cpu.stat and memory.stat"""
+        values = {}
+        for line in (self._read(name) or '').splitlines():
+            key, _, value = line.partition(' ')
+            if value.strip().isdigit():
+                values[key] = int(value)
+        return values
+
+    def _ancestors(self) -> List[str]:
+        """The cgroup and its parents up to the hierarchy root"""
+        directories = [self.path]
+        path = self.path
+        while os.path.normpath(path) != os.path.normpath(self.root) and path.startswith(self.root):
+            path = os.path.dirname(path)
+            directories.append(path)
+        return directories
+
+    def _smallest_limit(self, name: str, parse) -> Optional[float]:
+        limits = [parse(content) for content in (self._read(name, directory) for directory in self._ancestors())
+                  if content]
+        limits = [limit for limit in limits if limit is not None]
+        return min(limits) if limits else None
+
+    def memory_limit(self) -> Optional[int]:
+        """Effective memory.max in bytes, or None if unlimited"""
+        def parse(content):
+            content = content.strip()
+            return int(content) if content.isdigit() else None  # 'max' means unlimited
+        limit = self._smallest_limit('memory.max', parse)
+        return int(limit) if limit is not None else None
+
+    def cpu_limit(self) -> Optional[float]:
+        """Effective cpu.max quota in CPUs, or None if unlimited"""
+        def parse(content):
+            quota, _, period = content.strip().partition(' ')
+            if quota == 'max' or not quota.isdigit() or not period.strip().isdigit():
+                return None
+            return int(quota) / int(period)
+        return self._smallest_limit('cpu.max', parse)
+
+    def memory(self) -> Dict:
+        """
+        Memory usage relative to the limit
+
+        The working set leaves out inactive file cache, which the kernel
+        reclaims before hitting the limit; percent is based on it and is
+        None without a limit.
+        """
+        current = int((self._read('memory.current') or '0').strip() or 0)
+        stat = self._read_keyed('memory.stat')
+        working_set = max(current - stat.get('inactive_file', 0), 0)
+        limit = self.memory_limit()
+        return {
+            'current': current,
+            'working_set': working_set,
+            'limit': limit,
+            'percent': working_set / limit * 100 if limit else None
+        }
+
+    def _effective_cpus(self) -> float:
+        limit = self.cpu_limit()
+        if hasattr(os, 'sched_getaffinity'):
+            cpus = len(os.sched_getaffinity(0))
+        else:
+            cpus = os.cpu_count() or 1
+        return min(limit, cpus) if limit else cpus
+
+    def measure_cpu_percent(self, interval: float) -> float:
+        """Block for interval seconds and return CPU use relative to the quota"""
+        start = time.monotonic()
+        before = self._read_keyed('cpu.stat').get('usage_usec', 0)
+        time.sleep(interval)
+        used = self._read_keyed('cpu.stat').get('usage_usec', 0) - before
+        elapsed = time.monotonic() - start
+        return min(max(used, 0) / (elapsed * 1e6 * self._effective_cpus()) * 100, 100.0)
+
+    def _device_name(self, device: str) -> str:
+        """Map 'major:minor' from io.stat to a name like 'sda' as psutil uses"""
+        name = self._devices.get(device)
+        if name is None:
+            name = device
+            try:
+                with open(f"/sys/dev/block/{device}/uevent", 'r') as f:
+                    for line in f:
+                        if line.startswith('DEVNAME='):
+                            name = line.strip().split('=', 1)[1]
+                            break
+            except OSError:
+                pass
+            self._devices[device] = name
+        return name
+
+    def _read_io(self, name: str) -> Dict[str, Dict[str, str]]:
+        """Parse io.stat and io.max: 'major:minor key=value ...' per device"""
+        devices = {}
+        for line in (self._read(name) or '').splitlines():
+            device, *fields = line.split()
+            devices[device] = dict(field.split('=', 1) for field in fields if '=' in field)
+        return devices
+
+    def refresh(self) -> Dict:
+        """
+        Sample usage and limits; rates cover the time since the last refresh
+
+        Returns:
+            Dictionary with the cgroup 'path', 'memory' (see memory), 'cpu'
+            (usage relative to the quota or to the usable CPUs, quota in
+            CPUs, throttled share of the interval) and 'io' (per device
+            read/write bytes per second and IOPS, plus any io.max limits).
+            Rates are None on the first refresh.
+        """
+        now = time.monotonic()
+        cpu_stat = self._read_keyed('cpu.stat')
+        io_stat = self._read_io('io.stat')
+        io_max = self._read_io('io.max')
+        previous, self._previous = self._previous, (now, cpu_stat, io_stat)
+        elapsed = now - previous[0] if previous and now > previous[0] else None
+
+        cpu = {
+            'usage_usec': cpu_stat.get('usage_usec', 0),
+            'limit_cores': self.cpu_limit(),
+            'nr_throttled': cpu_stat.get('nr_throttled', 0),
+            'percent': None,
+            'throttled_percent': None
+        }
+        if elapsed:
+            used = max(cpu['usage_usec'] - previous[1].get('usage_usec', 0), 0)
+            throttled = max(cpu_stat.get('throttled_usec', 0) - previous[1].get('throttled_usec', 0), 0)
+            cpu['percent'] = min(used / (elapsed * 1e6 * self._effective_cpus()) * 100, 100.0)
+            cpu['throttled_percent'] = min(throttled / (elapsed * 1e6) * 100, 100.0)
+
+        io = {}
+        for device in set(io_stat) | set(io_max):
+            current = io_stat.get(device, {})
+            before = previous[2].get(device) if elapsed else None
+            entry = {'limits': {key: int(value) for key, value in io_max.get(device, {}).items() if value.isdigit()}}
+            if before is not None:
+                for key, rate in (('rbytes', 'read_bytes_per_sec'), ('wbytes', 'write_bytes_per_sec'),
+                                  ('rios', 'read_iops'), ('wios', 'write_iops')):
+                    entry[rate] = max(int(current.get(key, 0)) - int(before.get(key, 0)), 0) / elapsed
+            io[self._device_name(device)] = entry
+
+        self.stats = {'path': self.path, 'memory': self.memory(), 'cpu': cpu, 'io': io}
+        return self.stats
@@ -0,0 +1,189 @@
+import os
+import hashlib
+import random
+import threading
+import zlib
+from collections import defaultdict
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class ChunkAnalyzer:
+    """Estimate block-level deduplication and compression savings
+
+    Files are split into content-defined chunks, so data shifted by an
+    insert still produces the same chunks, and chunk digests are indexed
+    to count repeated blocks. The index only keeps a uniform sample of
+    digests sized to max_index_entries, which keeps memory bounded no
+    matter how much data is analyzed.
+    """
+
+    # Bytes of the rolling window; a boundary needs one specific bit pattern
+    WINDOW = 13
+
+    def __init__(self, min_chunk_size: int = 2048, max_chunk_size: int = 65536,
+                 max_index_entries: int = 1_000_000, read_size: int = 1024 * 1024):
+        """
+        Args:
+            min_chunk_size: Smallest chunk cut, except at end of file
+            max_chunk_size: Largest chunk; data without boundaries is cut here
+            max_index_entries: Target number of sampled chunk digests kept in memory
+            read_size: Bytes read from a file at a time
+        """
+        self.min_chunk_size = max(min_chunk_size, self.WINDOW)
+        self.max_chunk_size = max(max_chunk_size, self.min_chunk_size)
+        self.max_index_entries = max_index_entries
+        self.read_size = read_size
+
+        # The rolling hash keeps one bit per byte for the last WINDOW bytes:
+        # h = ((h << 1) | bit[byte]) & (2**WINDOW - 1), cutting where h equals
+        # a fixed pattern. Mapping bytes to b'a'/b'b' turns that into a
+        # substring search, which runs in C instead of a per-byte Python loop.
+        # Average chunk size is 2**WINDOW (8 KB) past the minimum.
+        rng = random.Random(0x6465787465)
+        values = list(range(256))
+        rng.shuffle(values)
+        ones = set(values[:128])
+        self._bit_table = bytes(ord('b') if i in ones else ord('a') for i in range(256))
+        self._pattern = b'abbabaabbbaba'
+
+    @property
+    def average_chunk_size(self) -> int:
+        return self.min_chunk_size + (1 << self.WINDOW)
+
+    def iter_chunks(self, f) -> Iterator[memoryview]:
+        """
+        Split a binary file object into content-defined chunks
+
+        At most read_size + max_chunk_size bytes are buffered.
+
+        Yields:
+            Views of each chunk, valid until the next chunk is requested
+        """
+        buf = bytearray()
+        window = self.WINDOW
+        eof = False
+
+        while not eof:
+            data = f.read(self.read_size)
+            eof = not data
+            buf += data
+
+            bits = buf.translate(self._bit_table)
+            start = 0
+            with memoryview(buf) as view:
+                while start < len(buf):
+                    limit = min(start + self.max_chunk_size, len(buf))
+                    pos = bits.find(self._pattern, start + self.min_chunk_size - window, limit)
+                    if pos >= 0:
+                        end = pos + window
+                    elif len(buf) - start >= self.max_chunk_size:
+                        end = start + self.max_chunk_size
+                    elif eof:
+                        end = len(buf)
+                    else:
+                        break  # Need more data to place the next boundary
+
+                    chunk = view[start:end]
+                    yield chunk
+                    chunk.release()
+                    start = end
+
+            del buf[:start]
+
+    def analyze_files(self, file_paths: List[str],
+                      progress_callback: Optional[Callable] = None,
+                      cancel_event: Optional[threading.Event] = None) -> Dict:
+        """
+        Estimate block-level savings for a set of files
+
+        Args:
+            file_paths: Files to analyze; hardlinks should be passed once
+            progress_callback: Optional callback receiving a progress dict
+            cancel_event: Optional event that stops the analysis when set
+
+        Returns:
+            Totals and per-directory estimates of dedup and compression savings
+        """
+        sizes = {}
+        for file_path in file_paths:
+            try:
+                sizes[file_path] = os.path.getsize(file_path)
+            except OSError:
+                continue
+
+        total_bytes = sum(sizes.values())
+        expected_chunks = max(1, total_bytes // self.average_chunk_size)
+        sample_rate = min(1.0, self.max_index_entries / expected_chunks)
+        threshold = int(sample_rate * (1 << 64))
+
+        index = set()
+        directories = defaultdict(lambda: {'bytes': 0, 'sampled_bytes': 0,
+                                           'sampled_duplicate_bytes': 0, 'sampled_compress_savings': 0})
+        progress = {'files_done': 0, 'files_total': len(sizes), 'bytes_done': 0, 'bytes_total': total_bytes}
+        chunk_count = 0
+        index_full = False
+
+        for file_path, file_size in sizes.items():
+            if cancel_event and cancel_event.is_set():
+                break
+
+            stats = directories[os.path.dirname(file_path)]
+            try:
+                with open(file_path, 'rb') as f:
+                    for chunk in self.iter_chunks(f):
+                        chunk_count += 1
+                        length = len(chunk)
+                        stats['bytes'] += length
+
+                        digest = int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), 'big')
+                        if digest >= threshold:
+                            continue
+
+                        stats['sampled_bytes'] += length
+                        if digest in index:
+                            stats['sampled_duplicate_bytes'] += length
+                            continue
+
+                        # Past the hard cap new chunks count as unique, which
+                        # can only under-estimate savings
+                        if not index_full:
+                            index.add(digest)
+                            index_full = len(index) >= self.max_index_entries * 2
+                        stats['sampled_compress_savings'] += max(0, length - len(zlib.compress(chunk, 1)))
+            except (OSError, PermissionError) as e:
+                print(f"Error reading file {file_path}: {e}")
+
+            progress['files_done'] += 1
+            progress['bytes_done'] += file_size
+            if progress_callback:
+                progress_callback(dict(progress))
+
+        return self._build_report(directories, sample_rate, chunk_count, progress['files_done'])
+
+    def _build_report(self, directories: Dict, sample_rate: float, chunk_count: int, file_count: int) -> Dict:
+        """Scale sampled counts back up to whole-data estimates"""
+        report_dirs = []
+        for directory, stats in directories.items():
+            report_dirs.append({
+                'directory': directory,
+                'bytes': stats['bytes'],
+                'dedup_savings': int(stats['sampled_duplicate_bytes'] / sample_rate),
+                'compress_savings': int(stats['sampled_compress_savings'] / sample_rate)
+            })
+
+        report_dirs.sort(key=lambda d: d['dedup_savings'] + d['compress_savings'], reverse=True)
+
+        total_bytes = sum(d['bytes'] for d in report_dirs)
+        dedup_savings = min(total_bytes, sum(d['dedup_savings'] for d in report_dirs))
+        compress_savings = min(total_bytes - dedup_savings, sum(d['compress_savings'] for d in report_dirs))
+
+        return {
+            'files': file_count,
+            'chunks': chunk_count,
+            'total_bytes': total_bytes,
+            'sample_rate': sample_rate,
+            'dedup_savings': dedup_savings,
+            'compress_savings': compress_savings,
+            'unique_bytes': total_bytes - dedup_savings,
+            'directories': report_dirs
+        }
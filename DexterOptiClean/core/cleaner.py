@@ -177,6 +177,36 @@ class PCCleaner:
         
         return files
 
+    def get_category_roots(self) -> Dict[str, List[str]]:
+        """
+        Get the directories each cleaning category works in
+
+        Glob patterns are cut back to their last directory without
+        wildcards, so '/var/log/*/*.log' becomes '/var/log'.
+
+        Returns:
+            Dictionary of category name to expanded root paths
+        """
+        categories = {
+            'temp_files': self.temp_dirs,
+            'system_logs': self.system_logs,
+            **{f"{browser}_cache": dirs for browser, dirs in self.browser_dirs.items()},
+            **self.advanced_dirs,
+            **self.gaming_dirs
+        }
+
+        roots = {}
+        for category, patterns in categories.items():
+            category_roots = []
+            for pattern in patterns:
+                root = os.path.expanduser(pattern)
+                while glob.has_magic(root):
+                    root = os.path.dirname(root)
+                if root and root != os.sep and root not in category_roots:
+                    category_roots.append(root)
+            roots[category] = category_roots
+        return roots
+
     def _scan_basic_cleaning(self) -> List[Dict]:
         """Scan basic cleaning categories"""
         files = []
@@ -667,13 +697,24 @@ class PCCleaner:
         
         return files
 
-    def clean_files(self, file_paths: List[str]) -> Dict:
-        """Clean the specified files"""
+    def clean_files(self, file_paths: List[str],
+                    elevate: Optional[Callable[[List[str]], List[Dict]]] = None) -> Dict:
+        """
+        Clean the specified files
+
+        Args:
+            file_paths: Files and directories to remove
+            elevate: Called once with every path that failed with permission
+                denied, e.g. to delete them through AdminUtils'
+                privileged helper; returns one dict per path with success,
+                freed bytes and error
+        """
         results = {
             'cleaned_files': [],
             'errors': [],
             'freed_space': 0
         }
+        denied = []
         
         for file_path in file_paths:
             try:
@@ -694,10 +735,20 @@ class PCCleaner:
                     results['errors'].append(f"File not found: {file_path}")
                     
             except PermissionError:
-                results['errors'].append(f"Permission denied: {file_path}")
+                denied.append(file_path)
             except Exception as e:
                 results['errors'].append(f"Error cleaning {file_path}: {str(e)}")
         
+        if denied and elevate:
+            for result in elevate(denied):
+                if result['success']:
+                    results['cleaned_files'].append(result['path'])
+                    results['freed_space'] += result['freed']
+                else:
+                    results['errors'].append(result['error'] or f"Permission denied: {result['path']}")
+        else:
+            results['errors'].extend(f"Permission denied: {file_path}" for file_path in denied)
+        
         return results
 
     def create_backup(self, file_paths: List[str]) -> str:
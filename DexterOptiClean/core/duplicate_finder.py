@@ -1,15 +1,105 @@
 import os
-import hashlib
+import fnmatch
+import itertools
+import queue
+import shutil
+import stat as stat_module
+import threading
 import time
-from collections import defaultdict
-from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from collections import defaultdict, deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from core.cgroup_stats import available_cpus
+from core.chunk_analyzer import ChunkAnalyzer
+from core.duplicate_tree import DuplicateTree
+from core.hash_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_DISK_ENTRIES, HashCache
+from core.hash_io import HashIO
+from core.media_payload import PARSERS as MEDIA_PARSERS, PAYLOAD_VERSION, Ranges, payload_ranges, slice_ranges
+from core.removal_plan import PlanExecutor, RemovalJournal, RemovalPlan
+from core.scan_checkpoint import ScanCheckpoint
+from core.report_writer import open_report_writer
+
+class _HashPool:
+    """
+    Worker threads running hash jobs for a single consumer thread
+    
+    The consumer keeps at most `capacity` jobs in flight, which bounds both
+    queues and back-pressures job submission. hashlib releases the GIL on
+    large buffers, so reads and hashing overlap across workers.
+    """
+    
+    def __init__(self, workers: int):
+        self.capacity = workers * 4
+        self.in_flight = 0
+        self._tasks = queue.Queue()
+        self._results = queue.Queue()
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+    
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            tag, func, job = task
+            try:
+                result = func(job)
+            except Exception as e:
+                print(f"Error hashing {job}: {e}")
+                result = None
+            self._results.put((tag, func, job, result))
+    
+    def submit(self, tag, func: Callable, job):
+        """Queue func(job); its result comes back from get() with the tag"""
+        self._tasks.put((tag, func, job))
+        self.in_flight += 1
+    
+    def get(self) -> Tuple:
+        """Wait for the next finished job as (tag, func, job, result)"""
+        item = self._results.get()
+        self.in_flight -= 1
+        return item
+    
+    def close(self):
+        """Drop queued jobs and stop the workers after their current job"""
+        try:
+            while True:
+                self._tasks.get_nowait()
+        except queue.Empty:
+            pass
+        for _ in self._threads:
+            self._tasks.put(None)
+
 
 class DuplicateFinder:
     """Find and manage duplicate files based on content comparison"""
     
-    def __init__(self):
-        self.hash_cache = {}
+    def __init__(self, hash_workers: Optional[int] = None,
+                 cache_path: Optional[str] = DEFAULT_CACHE_PATH, cache_memory_mb: float = 32,
+                 hash_algorithm: str = 'blake2b', cache_max_entries: Optional[int] = DEFAULT_MAX_DISK_ENTRIES):
+        self.hash_cache = HashCache(cache_path, max_memory_mb=cache_memory_mb, max_disk_entries=cache_max_entries)
+        self._cache_thread = None
+        self.hardlink_sets = []  # Hardlinked paths found by the last find_duplicates
+        self.hash_workers = hash_workers or min(8, available_cpus())
+        # BLAKE2b with 16-byte digests keeps hashes the same width as MD5
+        self.hash_io = HashIO(hash_algorithm, digest_size=16, max_buffers=self.hash_workers * 2)
+        self.partial_block_size = 16384  # Head/tail block size for the partial hash stage
+        self.large_file_threshold = 100 * 1024 * 1024  # Files above this are sample-hashed first
+        self.verify_large_files = True   # Confirm sampled matches byte by byte
+        self.verify_block_size = 1024 * 1024
+        self.max_open_files = 256        # Larger candidate groups are fully hashed instead
+        self.bytes_read = 0              # File bytes read for hashing over this finder's lifetime
+        self._bytes_lock = threading.Lock()
+        self.exclude_dirs = {'__pycache__', 'node_modules', '.git', '.svn', 'venv', 'env'}
+        # Filesystems the walk never descends into (network and pseudo filesystems)
+        self.skip_fs_types = {
+            'nfs', 'nfs4', 'cifs', 'smbfs', 'smb3', 'sshfs', 'fuse.sshfs', 'fuse.rclone',
+            'afs', 'ceph', 'glusterfs', 'fuse.glusterfs', 'davfs', '9p',
+            'proc', 'sysfs', 'devtmpfs', 'devpts', 'cgroup', 'cgroup2', 'securityfs',
+            'debugfs', 'tracefs', 'pstore', 'bpf', 'configfs', 'fusectl', 'mqueue',
+            'hugetlbfs', 'autofs', 'binfmt_misc', 'efivarfs', 'rpc_pipefs', 'nsfs'
+        }
         self.scan_extensions = {
             '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp',  # Images
             '.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm',   # Videos
@@ -20,60 +110,24 @@ class DuplicateFinder:
             '.iso', '.img'                                            # Disk images
         }
     
-    def find_duplicates(self, directory: str, min_file_size: int = 1024) -> List[Dict]:
+    def find_duplicates(self, directory: Union[str, List[str]], min_file_size: int = 1024,
+                        **search_options) -> List[Dict]:
         """
         Find duplicate files in the specified directory
         
         Args:
-            directory: Directory path to scan
+            directory: Directory path to scan, or a list of paths
             min_file_size: Minimum file size in bytes to consider
+            **search_options: Rules and budgets accepted by iter_duplicates
             
         Returns:
             List of duplicate groups with file information
         """
         try:
-            expanded_dir = os.path.expanduser(directory)
-            if not os.path.exists(expanded_dir):
-                return []
-            
-            # First pass: Group files by size
-            size_groups = self._group_files_by_size(expanded_dir, min_file_size)
-            
-            # Second pass: Hash files with same size
-            duplicate_groups = []
-            
-            for size, file_paths in size_groups.items():
-                if len(file_paths) > 1:  # Only process groups with multiple files
-                    hash_groups = self._group_files_by_hash(file_paths)
-                    
-                    for file_hash, files in hash_groups.items():
-                        if len(files) > 1:  # Found duplicates
-                            duplicate_group = {
-                                'hash': file_hash,
-                                'size': size,
-                                'files': []
-                            }
-                            
-                            for file_path in files:
-                                try:
-                                    stat = os.stat(file_path)
-                                    duplicate_group['files'].append({
-                                        'path': file_path,
-                                        'size': stat.st_size,
-                                        'last_modified': stat.st_mtime,
-                                        'last_accessed': stat.st_atime,
-                                        'directory': os.path.dirname(file_path),
-                                        'filename': os.path.basename(file_path),
-                                        'extension': os.path.splitext(file_path)[1].lower()
-                                    })
-                                except (OSError, PermissionError):
-                                    continue
-                            
-                            if len(duplicate_group['files']) > 1:
-                                duplicate_groups.append(duplicate_group)
+            duplicate_groups = list(self.iter_duplicates(directory, min_file_size, **search_options))
             
             # Sort by potential space savings (largest first)
-            duplicate_groups.sort(key=lambda g: g['size'] * (len(g['files']) - 1), reverse=True)
+            duplicate_groups.sort(key=self._group_savings, reverse=True)
             
             return duplicate_groups
             
@@ -81,120 +135,1039 @@ class DuplicateFinder:
             print(f"Error finding duplicates: {e}")
             return []
     
-    def _group_files_by_size(self, directory: str, min_file_size: int) -> Dict[int, List[str]]:
-        """Group files by their size"""
+    def iter_duplicates(self, directory: Union[str, List[str]], min_file_size: int = 1024,
+                        progress_callback: Optional[Callable] = None,
+                        cancel_event: Optional[threading.Event] = None,
+                        include: Optional[List[str]] = None,
+                        exclude: Optional[List[str]] = None,
+                        max_files: Optional[int] = None,
+                        max_bytes_read: Optional[int] = None,
+                        one_filesystem: bool = False,
+                        media_payload: bool = False,
+                        checkpoint_path: Optional[str] = None,
+                        checkpoint_interval: float = 60.0) -> Iterator[Dict]:
+        """
+        Find duplicate files, yielding each group as soon as it is confirmed
+        
+        Hardlinks to the same inode are hashed once and listed together in a
+        group's 'hardlink_sets'; paths that are only hardlinks of each other
+        are not duplicates and are collected in self.hardlink_sets instead.
+        
+        Args:
+            directory: Directory path to scan, or a list of paths searched together
+            min_file_size: Minimum file size in bytes to consider
+            progress_callback: Optional callback receiving a progress dict
+            cancel_event: Optional event that stops the search when set
+            include: Glob patterns a file path or name must match; replaces
+                the scan_extensions filter when given
+            exclude: Glob patterns for file and directory paths or names to skip
+            max_files: Stop walking after this many candidate files
+            max_bytes_read: Stop starting new hash jobs after reading this many bytes
+            one_filesystem: Stay on the device of each root directory
+            media_payload: Compare supported audio and image files by their
+                media payload only, ignoring tags and metadata blocks; such
+                groups have 'match' set to 'payload' and 'size' is the
+                payload size
+            checkpoint_path: Save the scan state here every checkpoint_interval
+                seconds, and resume from it if it matches this scan and is
+                less than a day old; removed once the scan completes. Hashes done before an interruption
+                come back from the hash cache, so resuming needs a persistent
+                cache_path.
+            checkpoint_interval: Seconds between checkpoints
+            
+        Yields:
+            Duplicate groups with file information, in discovery order
+        """
+        self.hardlink_sets = []
+        
+        roots = self._normalize_roots([directory] if isinstance(directory, str) else directory)
+        if not roots:
+            return
+        
+        progress = {
+            'stage': 'walking',
+            'files_scanned': 0,
+            'files_total': 0,
+            'files_done': 0,
+            'bytes_total': 0,
+            'bytes_done': 0,
+            'bytes_read': 0,
+            'groups_found': 0,
+            'stopped': None
+        }
+        rules = {
+            'include': list(include or []),
+            'exclude': list(exclude or []),
+            'max_files': max_files,
+            'one_filesystem': one_filesystem
+        }
+        bytes_read_start = self.bytes_read
+        
+        def report():
+            if progress_callback:
+                progress_callback(dict(progress))
+        
+        checkpoint = None
+        if checkpoint_path:
+            checkpoint = ScanCheckpoint(checkpoint_path, {
+                'roots': roots, 'min_file_size': min_file_size, 'rules': rules,
+                'scan_extensions': self.scan_extensions, 'exclude_dirs': self.exclude_dirs,
+                'skip_fs_types': self.skip_fs_types
+            }, checkpoint_interval)
+        
+        # First pass: Group files by size, one path per inode
+        inode_links = {}
+        size_groups = self._group_files_by_size(roots, min_file_size, inode_links,
+                                                progress, report, cancel_event, rules, checkpoint)
+        
+        # Media files are grouped by payload size; unparsable ones stay as they are
+        payloads = {}
+        if media_payload:
+            progress['stage'] = 'parsing'
+            report()
+            payloads = self._split_media_files(size_groups, cancel_event)
+            for size, file_paths in self._group_payloads_by_size(payloads).items():
+                if len(file_paths) > 1:
+                    progress['files_total'] += len(file_paths)
+                    progress['bytes_total'] += size * len(file_paths)
+        
+        progress['stage'] = 'hashing'
+        for size, file_paths in size_groups.items():
+            if len(file_paths) > 1:
+                progress['files_total'] += len(file_paths)
+                progress['bytes_total'] += size * len(file_paths)
+        report()
+        
+        # Second pass: Partial, then full hash of files with same size
+        byte_budget = bytes_read_start + max_bytes_read if max_bytes_read else None
+        hash_groups = ((key, files, resolved, None) for key, files, resolved
+                       in self._iter_size_groups_by_hash(size_groups, cancel_event, byte_budget))
+        if payloads:
+            hash_groups = itertools.chain(hash_groups, (
+                (key, files, resolved, 'payload') for key, files, resolved
+                in self._iter_payload_groups(payloads, cancel_event, byte_budget)))
+        
+        for (size, file_hash), files, resolved, match in hash_groups:
+            if checkpoint and checkpoint.due():
+                self.hash_cache.flush()
+                checkpoint.mark()
+            progress['bytes_read'] = self.bytes_read - bytes_read_start
+            if resolved:
+                progress['files_done'] += resolved
+                progress['bytes_done'] += size * resolved
+            
+            if len(files) > 1:  # Found duplicates
+                duplicate_group = {
+                    'hash': file_hash,
+                    'size': size,
+                    'files': [],
+                    'hardlink_sets': []
+                }
+                if match:
+                    duplicate_group['match'] = match
+                
+                for file_path in files:
+                    links = inode_links.pop(self._inode_key(file_path), [file_path])
+                    if len(links) > 1:
+                        duplicate_group['hardlink_sets'].append(links)
+                    for link_path in links:
+                        file_info = self._get_file_info(link_path)
+                        if file_info:
+                            duplicate_group['files'].append(file_info)
+                
+                if self._count_unique_files(duplicate_group) > 1:
+                    progress['groups_found'] += 1
+                    report()
+                    yield duplicate_group
+                    continue
+            
+            report()
+        
+        for links in inode_links.values():
+            if len(links) > 1:
+                self.hardlink_sets.append(links)
+        
+        if byte_budget and self.bytes_read >= byte_budget and progress['files_done'] < progress['files_total']:
+            progress['stopped'] = 'max_bytes_read'
+        progress['bytes_read'] = self.bytes_read - bytes_read_start
+        progress['stage'] = 'cancelled' if cancel_event and cancel_event.is_set() else 'done'
+        if checkpoint and progress['stage'] == 'done' and progress['stopped'] != 'max_bytes_read':
+            checkpoint.clear()
+        if progress['stage'] == 'done':
+            self._maintain_cache()
+        report()
+    
+    def analyze_block_savings(self, directory: Union[str, List[str]], min_file_size: int = 1024 * 1024,
+                              progress_callback: Optional[Callable] = None,
+                              cancel_event: Optional[threading.Event] = None,
+                              include: Optional[List[str]] = None,
+                              exclude: Optional[List[str]] = None,
+                              max_files: Optional[int] = None,
+                              one_filesystem: bool = False,
+                              analyzer: Optional[ChunkAnalyzer] = None) -> Dict:
+        """
+        Estimate what block-level deduplication and compression would save
+        
+        Unlike find_duplicates this also finds files that share only part
+        of their content, such as VM images, archives and database dumps.
+        Files are walked with the same rules as iter_duplicates; each inode
+        is analyzed once.
+        
+        Args:
+            directory: Directory path to scan, or a list of paths
+            min_file_size: Minimum file size in bytes to consider
+            progress_callback: Optional callback receiving a progress dict
+            cancel_event: Optional event that stops the analysis when set
+            include: Glob patterns files must match; all files by default,
+                since images and dumps rarely have a scanned extension
+            exclude, max_files, one_filesystem: As for iter_duplicates
+            analyzer: ChunkAnalyzer to use, for custom chunk sizes or index limits
+            
+        Returns:
+            Report dictionary from ChunkAnalyzer.analyze_files
+        """
+        roots = self._normalize_roots([directory] if isinstance(directory, str) else directory)
+        rules = {
+            'include': list(include or ['*']),
+            'exclude': list(exclude or []),
+            'max_files': max_files,
+            'one_filesystem': one_filesystem
+        }
+        
+        size_groups = self._group_files_by_size(roots, min_file_size, cancel_event=cancel_event, rules=rules)
+        file_paths = [file_path for paths in size_groups.values() for file_path in paths]
+        
+        return (analyzer or ChunkAnalyzer()).analyze_files(file_paths, progress_callback, cancel_event)
+    
+    def find_duplicate_directories(self, directory: Union[str, List[str]], min_file_size: int = 1,
+                                   progress_callback: Optional[Callable] = None,
+                                   cancel_event: Optional[threading.Event] = None,
+                                   include: Optional[List[str]] = None,
+                                   exclude: Optional[List[str]] = None,
+                                   one_filesystem: bool = False) -> List[Dict]:
+        """
+        Find directory trees with identical content
+        
+        Each directory gets a Merkle hash over the names and content hashes
+        of its files and the names and hashes of its subdirectories,
+        computed bottom-up in one pass. File hashes come from the usual
+        staged pipeline and hash cache; a file without a duplicate rules
+        out its directory and every ancestor, so unique files are never
+        fully hashed. Only the topmost directories of identical trees are
+        reported; a copy inside another duplicated directory is left to that
+        directory's group. Files skipped by the walk (hidden, temporary, empty or
+        excluded) do not take part in the comparison.
+        
+        Args:
+            directory: Directory path to scan, or a list of paths
+            min_file_size: Minimum file size in bytes to consider
+            progress_callback: Optional callback receiving a progress dict
+            cancel_event: Optional event that stops the search when set
+            include: Glob patterns files must match; all files by default
+            exclude, one_filesystem: As for iter_duplicates
+            
+        Returns:
+            Directory groups with hash, size and file count of one copy,
+            wasted bytes and the directories, most wasted space first
+        """
+        roots = self._normalize_roots([directory] if isinstance(directory, str) else directory)
+        rules = {
+            'include': list(include or ['*']),
+            'exclude': list(exclude or []),
+            'one_filesystem': one_filesystem
+        }
+        progress = {'stage': 'walking', 'files_scanned': 0, 'directories': 0, 'groups_found': 0}
+        
+        def report():
+            if progress_callback:
+                progress_callback(dict(progress))
+        
+        inode_links = {}
+        size_groups = self._group_files_by_size(roots, min_file_size, inode_links,
+                                                progress, report, cancel_event, rules)
+        
+        progress['stage'] = 'hashing'
+        report()
+        contents = {}  # inode key -> (size, content hash) for files with a duplicate
+        for (size, file_hash), files, _ in self._iter_size_groups_by_hash(size_groups, cancel_event):
+            if len(files) > 1:
+                for file_path in files:
+                    contents[self._inode_key(file_path)] = (size, file_hash)
+        if cancel_event and cancel_event.is_set():
+            return []
+        
+        progress['stage'] = 'directories'
+        report()
+        tree = self._build_directory_tree(roots, inode_links, contents)
+        progress['directories'] = len(tree)
+        
+        by_hash = defaultdict(list)
+        for dir_path, node in tree.items():
+            if node['hash']:
+                by_hash[node['hash']].append(dir_path)
+        duplicated = {dir_path for paths in by_hash.values() if len(paths) > 1 for dir_path in paths}
+        
+        groups = []
+        for dir_hash, paths in by_hash.items():
+            # Copies inside a duplicated parent are covered by the parent's group
+            paths = [p for p in paths if os.path.dirname(p) not in duplicated]
+            if len(paths) < 2:
+                continue
+            
+            node = tree[paths[0]]
+            inodes = {}
+            for dir_path in paths:
+                for inode_key in self._iter_tree_inodes(tree, dir_path):
+                    inodes[inode_key] = contents[inode_key][0]
+            
+            groups.append({
+                'hash': dir_hash,
+                'size': node['size'],
+                'file_count': node['files'],
+                'wasted': max(0, sum(inodes.values()) - node['size']),
+                'directories': sorted(paths)
+            })
+        
+        groups.sort(key=lambda group: group['wasted'], reverse=True)
+        progress['groups_found'] = len(groups)
+        progress['stage'] = 'done'
+        report()
+        return groups
+    
+    def _build_directory_tree(self, roots: List[str], inode_links: Dict, contents: Dict) -> Dict[str, Dict]:
+        """
+        Compute Merkle hashes of every directory holding walked files
+        
+        A directory's hash is None when it, or anything below it, holds a
+        file without a duplicate.
+        """
+        tree = {}
+        
+        def node_for(dir_path):
+            node = tree.get(dir_path)
+            if node is None:
+                node = tree[dir_path] = {'entries': [], 'inodes': [], 'children': [], 'size': 0,
+                                         'files': 0, 'unique': False, 'hash': None}
+                parent = os.path.dirname(dir_path)
+                if dir_path not in roots and parent != dir_path:
+                    node_for(parent)['children'].append(dir_path)
+            return node
+        
+        for inode_key, paths in inode_links.items():
+            content = contents.get(inode_key)
+            for file_path in paths:
+                node = node_for(os.path.dirname(file_path))
+                if content is None:
+                    node['unique'] = True
+                    continue
+                node['entries'].append(f"f\0{os.path.basename(file_path)}\0{content[0]}:{content[1]}")
+                node['inodes'].append(inode_key)
+                node['size'] += content[0]
+                node['files'] += 1
+        
+        # Deepest directories first, so children are done before their parent
+        for dir_path in sorted(tree, key=lambda path: path.count(os.sep), reverse=True):
+            node = tree[dir_path]
+            parent = tree.get(os.path.dirname(dir_path)) if dir_path not in roots else None
+            
+            if not node['unique']:
+                hasher = self._new_hash()
+                for entry in sorted(node['entries']):
+                    hasher.update(entry.encode('utf-8', 'surrogateescape') + b'\n')
+                node['hash'] = hasher.hexdigest()
+            node['entries'] = None
+            
+            if parent is not None and parent is not node:
+                if node['unique']:
+                    parent['unique'] = True
+                else:
+                    parent['entries'].append(f"d\0{os.path.basename(dir_path)}\0{node['hash']}")
+                    parent['size'] += node['size']
+                    parent['files'] += node['files']
+        
+        return tree
+    
+    def _iter_tree_inodes(self, tree: Dict[str, Dict], dir_path: str) -> Iterator:
+        """Inode keys of every file below a directory"""
+        stack = [dir_path]
+        while stack:
+            node = tree[stack.pop()]
+            yield from node['inodes']
+            stack.extend(node['children'])
+    
+    def plan_directory_removal(self, directory_groups: List[Dict], mode: str = 'delete') -> RemovalPlan:
+        """
+        Plan removing all but one directory of each identical tree
+        
+        Every file under a removed copy is paired with the file at the same
+        relative path in the kept directory and re-checked by content hash,
+        mostly from the cache. Files that differ, such as hidden files left
+        out of the comparison, stay where they are, as do emptied directories.
+        
+        Args:
+            directory_groups: Groups from find_duplicate_directories
+            mode: 'delete', 'reflink' or 'hardlink'
+            
+        Returns:
+            RemovalPlan for apply_plan
+        """
+        plan = RemovalPlan(mode)
+        
+        for group in directory_groups:
+            candidates = []
+            for dir_path in group['directories']:
+                try:
+                    candidates.append({'path': dir_path, 'filename': os.path.basename(dir_path),
+                                       'last_modified': os.stat(dir_path).st_mtime})
+                except OSError:
+                    continue
+            keep_dir = self.suggest_files_to_keep({'files': candidates})
+            if not keep_dir:
+                continue
+            plan.kept_files.append(keep_dir)
+            
+            for dir_path in group['directories']:
+                if dir_path == keep_dir:
+                    continue
+                for root, _, files in os.walk(dir_path):
+                    for filename in files:
+                        file_path = os.path.join(root, filename)
+                        keep_file = os.path.join(keep_dir, os.path.relpath(file_path, dir_path))
+                        file_info = self._get_file_info(file_path)
+                        if not file_info or not os.path.isfile(keep_file) or \
+                                self._inode_key(file_path) == self._inode_key(keep_file):
+                            continue
+                        file_hash = self._get_file_hash(file_path)
+                        if file_hash and file_hash == self._get_file_hash(keep_file):
+                            plan.add(keep_file, file_info, group['hash'])
+        
+        return plan
+    
+    def _normalize_roots(self, directories: List[str]) -> List[str]:
+        """Expand and resolve search roots, dropping missing and nested ones"""
+        roots = []
+        for directory in directories:
+            root = os.path.realpath(os.path.expanduser(directory))
+            if os.path.isdir(root) and root not in roots:
+                roots.append(root)
+        
+        return [root for root in roots
+                if not any(other != root and root.startswith(other.rstrip(os.sep) + os.sep)
+                           for other in roots)]
+    
+    def _matches_any(self, path: str, patterns: List[str]) -> bool:
+        """Check a path against glob patterns by full path and by name"""
+        name = os.path.basename(path)
+        return any(fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(name, pattern)
+                   for pattern in patterns)
+    
+    def _read_mounts(self) -> List[Tuple[str, str]]:
+        """Mount points and filesystem types, longest mount point first"""
+        mounts = []
+        try:
+            with open('/proc/self/mounts', 'r') as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) >= 3:
+                        mounts.append((fields[1].replace('\\040', ' '), fields[2]))
+        except OSError:
+            return []  # No mount table (e.g. Windows, macOS): no type filtering
+        
+        mounts.sort(key=lambda mount: len(mount[0]), reverse=True)
+        return mounts
+    
+    def _is_allowed_filesystem(self, path: str, mounts: List[Tuple[str, str]]) -> bool:
+        """Check that the filesystem holding path is not a network or pseudo filesystem"""
+        real_path = os.path.realpath(path)
+        for mount_point, fs_type in mounts:
+            if real_path == mount_point or real_path.startswith(mount_point.rstrip('/') + '/'):
+                return fs_type not in self.skip_fs_types
+        return True
+    
+    def _count_bytes_read(self, byte_count: int):
+        with self._bytes_lock:
+            self.bytes_read += byte_count
+    
+    def _get_file_info(self, file_path: str) -> Optional[Dict]:
+        """Collect the per-file details reported in a duplicate group"""
+        try:
+            stat = os.stat(file_path)
+        except (OSError, PermissionError):
+            return None
+        
+        return {
+            'path': file_path,
+            'size': stat.st_size,
+            'last_modified': stat.st_mtime,
+            'last_accessed': stat.st_atime,
+            'directory': os.path.dirname(file_path),
+            'filename': os.path.basename(file_path),
+            'extension': os.path.splitext(file_path)[1].lower(),
+            'inode': f"{stat.st_dev}:{stat.st_ino}" if stat.st_ino else file_path,
+            'links': stat.st_nlink
+        }
+    
+    def _inode_key(self, file_path: str, stat: Optional[os.stat_result] = None):
+        """Identity of the data behind a path: (st_dev, st_ino), or the path if unknown"""
+        try:
+            stat = stat or os.stat(file_path)
+        except OSError:
+            return file_path
+        return (stat.st_dev, stat.st_ino) if stat.st_ino else file_path
+    
+    def _group_files_by_size(self, directory: Union[str, List[str]], min_file_size: int,
+                             inode_links: Optional[Dict] = None,
+                             progress: Optional[Dict] = None,
+                             report: Optional[Callable] = None,
+                             cancel_event: Optional[threading.Event] = None,
+                             rules: Optional[Dict] = None,
+                             checkpoint: Optional[ScanCheckpoint] = None) -> Dict[int, List[str]]:
+        """
+        Group files by their size
+        
+        Only the first path seen for each inode is grouped. If inode_links
+        is given, it is filled with every path found for each inode.
+        progress['files_scanned'] is updated and report called once per
+        directory. Symlinks are never followed, and the walk does not enter
+        filesystems listed in skip_fs_types. With a checkpoint, the walk
+        state is saved periodically and a matching earlier walk is picked up
+        where it stopped: every directory is still listed, but the files of
+        directories already recorded and unchanged since (same mtime) are
+        not looked at again. A completed walk is reused as is only if none
+        of its directories changed.
+        """
         size_groups = defaultdict(list)
+        if inode_links is None:
+            inode_links = {}
+        rules = rules or {}
+        include = rules.get('include') or []
+        exclude = rules.get('exclude') or []
+        max_files = rules.get('max_files')
+        
+        roots = [directory] if isinstance(directory, str) else directory
+        mounts = self._read_mounts()
+        allowed_devices = {}
+        done_dirs = {}  # Directory -> mtime_ns when its files were recorded
+        
+        if checkpoint:
+            state = checkpoint.load()
+            if state:
+                size_groups = state['size_groups']
+                inode_links.update(state['inode_links'])
+                done_dirs = state['done_dirs']
+                if progress is not None:
+                    progress['files_scanned'] = state['files_scanned']
+                    progress['resumed'] = True
+                if state['walk_complete'] and self._dirs_unchanged(done_dirs):
+                    return size_groups
+        candidates = len(inode_links)
+        
+        def save_checkpoint(walk_complete: bool):
+            if checkpoint:
+                checkpoint.save(size_groups, inode_links, done_dirs, walk_complete,
+                                progress['files_scanned'] if progress is not None else 0)
         
         try:
-            for root, dirs, files in os.walk(directory):
-                # Skip hidden directories and common system directories
-                dirs[:] = [d for d in dirs if not d.startswith('.') and d not in {
-                    '__pycache__', 'node_modules', '.git', '.svn', 'venv', 'env'
-                }]
+            for root_dir in roots:
+                try:
+                    root_device = os.stat(root_dir).st_dev
+                except OSError:
+                    continue
+                allowed_devices.setdefault(root_device, True)  # Roots are always searched
                 
-                for filename in files:
-                    # Skip hidden files and temporary files
-                    if filename.startswith('.') or filename.endswith(('.tmp', '.temp', '.swp')):
-                        continue
+                for root, dirs, files in os.walk(root_dir):
+                    if cancel_event and cancel_event.is_set():
+                        save_checkpoint(False)
+                        return size_groups
+                    try:
+                        dir_mtime = os.stat(root).st_mtime_ns
+                    except OSError:
+                        dir_mtime = None
+                    if root in done_dirs and done_dirs[root] == dir_mtime:
+                        files = []  # Recorded before the scan was interrupted
+                    elif checkpoint and checkpoint.due():
+                        save_checkpoint(False)
+                    done_dirs[root] = dir_mtime
+                    if progress is not None:
+                        progress['files_scanned'] += len(files)
+                        if report:
+                            report()
                     
-                    file_path = os.path.join(root, filename)
+                    # Skip hidden directories, configured directories and other filesystems
+                    kept_dirs = []
+                    for d in dirs:
+                        if d.startswith('.') or d in self.exclude_dirs:
+                            continue
+                        dir_path = os.path.join(root, d)
+                        if exclude and self._matches_any(dir_path, exclude):
+                            continue
+                        try:
+                            dir_device = os.lstat(dir_path).st_dev
+                        except OSError:
+                            continue
+                        if dir_device != root_device:
+                            if rules.get('one_filesystem'):
+                                continue
+                            if dir_device not in allowed_devices:
+                                allowed_devices[dir_device] = self._is_allowed_filesystem(dir_path, mounts)
+                            if not allowed_devices[dir_device]:
+                                continue
+                        kept_dirs.append(d)
+                    dirs[:] = kept_dirs
                     
-                    try:
-                        stat = os.stat(file_path)
-                        file_size = stat.st_size
+                    for filename in files:
+                        # Skip hidden files and temporary files
+                        if filename.startswith('.') or filename.endswith(('.tmp', '.temp', '.swp')):
+                            continue
+                        
+                        file_path = os.path.join(root, filename)
+                        
+                        if exclude and self._matches_any(file_path, exclude):
+                            continue
+                        
+                        if include:
+                            if not self._matches_any(file_path, include):
+                                continue
+                        else:
+                            # Check if file extension should be processed
+                            file_ext = os.path.splitext(filename)[1].lower()
+                            if file_ext and file_ext not in self.scan_extensions:
+                                continue
+                        
+                        try:
+                            stat = os.lstat(file_path)
+                        except (OSError, PermissionError):
+                            continue
                         
-                        # Skip files smaller than minimum size
-                        if file_size < min_file_size:
+                        # Skip symlinks, devices and other special files
+                        if not stat_module.S_ISREG(stat.st_mode):
                             continue
                         
-                        # Skip empty files
-                        if file_size == 0:
+                        file_size = stat.st_size
+                        
+                        # Skip empty files and files smaller than minimum size
+                        if file_size == 0 or file_size < min_file_size:
                             continue
                         
-                        # Check if file extension should be processed
-                        file_ext = os.path.splitext(filename)[1].lower()
-                        if file_ext and file_ext not in self.scan_extensions:
+                        inode_key = self._inode_key(file_path, stat)
+                        if inode_key in inode_links:
+                            if file_path not in inode_links[inode_key]:  # Re-listed after a change
+                                inode_links[inode_key].append(file_path)
                             continue
+                        inode_links[inode_key] = [file_path]
                         
                         size_groups[file_size].append(file_path)
                         
-                    except (OSError, PermissionError):
-                        continue
+                        candidates += 1
+                        if max_files and candidates >= max_files:
+                            if progress is not None:
+                                progress['stopped'] = 'max_files'
+                            save_checkpoint(True)
+                            return size_groups
         
         except Exception as e:
             print(f"Error grouping files by size: {e}")
+            return size_groups
         
+        save_checkpoint(True)
         return size_groups
     
+    @staticmethod
+    def _dirs_unchanged(done_dirs: Dict[str, Optional[int]]) -> bool:
+        """Whether every recorded directory still has the mtime it was recorded with"""
+        for dir_path, mtime_ns in done_dirs.items():
+            try:
+                if os.stat(dir_path).st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
+    
     def _group_files_by_hash(self, file_paths: List[str]) -> Dict[str, List[str]]:
-        """Group files by their MD5 hash"""
+        """Group same-size files by their content hash"""
+        size = os.path.getsize(file_paths[0]) if file_paths else 0
+        hash_groups = self._group_size_groups_by_hash({size: file_paths})
+        return {file_hash: files for (_, file_hash), files in hash_groups.items()}
+    
+    def _group_size_groups_by_hash(self, size_groups: Dict[int, List[str]]) -> Dict[Tuple[int, str], List[str]]:
+        """Group files of all size groups by content hash"""
         hash_groups = defaultdict(list)
+        for key, files, _ in self._iter_size_groups_by_hash(size_groups):
+            if len(files) > 1:
+                hash_groups[key].extend(files)
+        return hash_groups
+    
+    def _iter_size_groups_by_hash(self, size_groups: Dict[int, List[str]],
+                                  cancel_event: Optional[threading.Event] = None,
+                                  byte_budget: Optional[int] = None
+                                  ) -> Iterator[Tuple[Tuple[int, str], List[str], int]]:
+        """
+        Resolve every size group to content-hash groups on one worker pool
         
-        for file_path in file_paths:
-            try:
-                file_hash = self._get_file_hash(file_path)
-                if file_hash:
-                    hash_groups[file_hash].append(file_path)
-            except Exception as e:
-                print(f"Error hashing file {file_path}: {e}")
-                continue
+        Each size group moves through its stages independently:
         
-        return hash_groups
+        1. partial: hash of the head and tail blocks (files no larger than
+           two blocks are read whole, so this is already the full hash)
+        2. sample: sampled hash of large files when verify_large_files is on
+        3. confirm: full hash, or side-by-side verification of large files
+        
+        Jobs from all size groups share the pool, and a size group's
+        results are yielded as soon as its last job finishes, so the first
+        duplicates appear long before the whole tree is hashed. Only a
+        bounded number of jobs are in flight at once.
+        
+        Args:
+            size_groups: Mapping of file size to file paths
+            cancel_event: Optional event that stops submitting new jobs
+            byte_budget: Stop submitting new jobs once self.bytes_read reaches this
+            
+        Yields:
+            ((size, hash), files, resolved) tuples, files in walk order;
+            resolved counts files of the size group settled by this item
+        """
+        buckets = {}
+        ready = deque()
+        
+        for size, file_paths in size_groups.items():
+            if len(file_paths) > 1:  # Only process groups with multiple files
+                buckets[size] = {'files': file_paths, 'stage': 'partial', 'pending': len(file_paths),
+                                 'hashes': {}, 'verified': []}
+                ready.extend((size, self._get_partial_hash, file_path) for file_path in file_paths)
+        
+        if not buckets:
+            return
+        
+        pool = _HashPool(max(1, self.hash_workers))
+        try:
+            while ready or pool.in_flight:
+                while ready and pool.in_flight < pool.capacity:
+                    if ((cancel_event and cancel_event.is_set()) or
+                            (byte_budget and self.bytes_read >= byte_budget)):
+                        ready.clear()
+                        break
+                    pool.submit(*ready.popleft())
+                
+                if not pool.in_flight:
+                    break
+                
+                size, hash_func, job, result = pool.get()
+                bucket = buckets[size]
+                if hash_func == self._verify_candidates:
+                    bucket['verified'].extend((result or {}).items())
+                elif result:
+                    bucket['hashes'][job] = result
+                
+                bucket['pending'] -= 1
+                if bucket['pending'] > 0:
+                    continue
+                
+                for item in self._advance_bucket(size, bucket, ready):
+                    yield item
+                
+                if bucket['pending'] == 0:
+                    del buckets[size]
+        finally:
+            pool.close()
+            self.hash_cache.flush()
+    
+    def _advance_bucket(self, size: int, bucket: Dict, ready: deque
+                        ) -> Iterator[Tuple[Tuple[int, str], List[str], int]]:
+        """Move a size group whose jobs have all finished to its next stage"""
+        groups = defaultdict(list)
+        for file_path in bucket['files']:
+            file_hash = bucket['hashes'].get(file_path)
+            if file_hash:
+                groups[file_hash].append(file_path)
+        bucket['hashes'] = {}
+        
+        survivors = [files for files in groups.values() if len(files) > 1]
+        stage = bucket['stage']
+        jobs = []
+        
+        if survivors and stage == 'partial' and size > self.partial_block_size * 2:
+            if size > self.large_file_threshold and self.verify_large_files:
+                next_stage, hash_func = 'sample', self._get_sample_hash
+            else:
+                next_stage, hash_func = 'confirm', self._get_file_hash
+            jobs = [(size, hash_func, file_path) for files in survivors for file_path in files]
+        elif survivors and stage == 'sample':
+            next_stage = 'confirm'
+            for files in survivors:
+                if len(files) > self.max_open_files:
+                    jobs.extend((size, self._get_file_hash, file_path) for file_path in files)
+                else:
+                    jobs.append((size, self._verify_candidates, files))
+        
+        if jobs:
+            in_play = [file_path for files in survivors for file_path in files]
+            settled = len(bucket['files']) - len(in_play)
+            bucket.update(stage=next_stage, files=in_play, pending=len(jobs))
+            # Next-stage jobs go first so started size groups finish quickly
+            ready.extendleft(reversed(jobs))
+            if settled:
+                yield (size, ''), [], settled
+            return
+        
+        # Final stage: remaining hashes are full content hashes (small files
+        # were read whole by the partial stage)
+        confirmed = [(file_hash, files) for file_hash, files in groups.items() if len(files) > 1]
+        confirmed.extend((file_hash, files) for file_hash, files in bucket['verified'] if len(files) > 1)
+        
+        remaining = len(bucket['files'])
+        if not confirmed:
+            yield (size, ''), [], remaining
+            return
+        for file_hash, files in confirmed:
+            yield (size, file_hash), files, remaining
+            remaining = 0
+    
+    def _split_media_files(self, size_groups: Dict[int, List[str]],
+                           cancel_event: Optional[threading.Event] = None) -> Dict[str, Ranges]:
+        """
+        Move parsable media files out of size_groups
+        
+        Headers are parsed on the hash pool. Files that are not a supported
+        format, or fail to parse, stay in their size group.
+        
+        Returns:
+            Mapping of file path to its payload ranges
+        """
+        media_files = [file_path for file_paths in size_groups.values() for file_path in file_paths
+                       if os.path.splitext(file_path)[1].lower() in MEDIA_PARSERS]
+        
+        payloads = {}
+        pool = _HashPool(max(1, self.hash_workers))
+        try:
+            for file_path, ranges in self._run_jobs(pool, self._get_payload_ranges, media_files, cancel_event):
+                if ranges:
+                    payloads[file_path] = ranges
+        finally:
+            pool.close()
+        
+        for size in list(size_groups):
+            remaining = [file_path for file_path in size_groups[size] if file_path not in payloads]
+            if remaining:
+                size_groups[size] = remaining
+            else:
+                del size_groups[size]
+        
+        return payloads
+    
+    def _group_payloads_by_size(self, payloads: Dict[str, Ranges]) -> Dict[int, List[str]]:
+        """Group media files by the total length of their payload ranges"""
+        size_groups = defaultdict(list)
+        for file_path, ranges in payloads.items():
+            size_groups[sum(length for _, length in ranges)].append(file_path)
+        return size_groups
+    
+    def _iter_payload_groups(self, payloads: Dict[str, Ranges],
+                             cancel_event: Optional[threading.Event] = None,
+                             byte_budget: Optional[int] = None
+                             ) -> Iterator[Tuple[Tuple[int, str], List[str], int]]:
+        """
+        Resolve media files to groups with identical payloads
+        
+        Same staging as _iter_size_groups_by_hash, applied to the payload
+        ranges: payload size, then the payload's head and tail blocks, then
+        the whole payload.
+        
+        Yields:
+            ((payload size, hash), files, resolved) tuples like _iter_size_groups_by_hash
+        """
+        block_size = self.partial_block_size
+        size_groups = self._group_payloads_by_size(payloads)
+        candidates = [file_path for file_paths in size_groups.values() if len(file_paths) > 1
+                      for file_path in file_paths]
+        
+        pool = _HashPool(max(1, self.hash_workers))
+        try:
+            stage = 'payload-partial'
+            hashes = {}
+            while candidates:
+                jobs = [(file_path, payloads[file_path], stage) for file_path in candidates]
+                for (file_path, _, _), file_hash in self._run_jobs(pool, self._get_payload_hash, jobs,
+                                                                    cancel_event, byte_budget):
+                    if file_hash:
+                        hashes[file_path] = file_hash
+                
+                groups = defaultdict(list)
+                for file_path in candidates:
+                    if file_path in hashes:
+                        size = sum(length for _, length in payloads[file_path])
+                        groups[(size, hashes[file_path])].append(file_path)
+                hashes = {}
+                
+                # Payloads up to two blocks were hashed whole by the first stage
+                pending = {key for key, files in groups.items()
+                           if len(files) > 1 and stage == 'payload-partial' and key[0] > block_size * 2}
+                for key, files in groups.items():
+                    if key not in pending:
+                        yield key, (files if len(files) > 1 else []), len(files)
+                
+                candidates = [file_path for key in pending for file_path in groups[key]]
+                stage = 'payload'
+        finally:
+            pool.close()
+            self.hash_cache.flush()
     
-    def _get_file_hash(self, file_path: str, chunk_size: int = 8192) -> Optional[str]:
+    def _run_jobs(self, pool: _HashPool, func: Callable, jobs: List,
+                  cancel_event: Optional[threading.Event] = None,
+                  byte_budget: Optional[int] = None) -> Iterator[Tuple]:
+        """Run func over jobs on the pool, yielding (job, result) as they finish"""
+        jobs = deque(jobs)
+        while jobs or pool.in_flight:
+            while jobs and pool.in_flight < pool.capacity:
+                if ((cancel_event and cancel_event.is_set()) or
+                        (byte_budget and self.bytes_read >= byte_budget)):
+                    jobs.clear()
+                    break
+                pool.submit(None, func, jobs.popleft())
+            
+            if not pool.in_flight:
+                break
+            _, _, job, result = pool.get()
+            yield job, result
+    
+    def _get_payload_ranges(self, file_path: str) -> Optional[Ranges]:
+        """Payload ranges of a media file, cached alongside its hashes"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        
+        cache_key = HashCache.make_key(f"payload-ranges{PAYLOAD_VERSION}", stat)
+        cached = self.hash_cache.get(cache_key)
+        if cached:
+            if cached == '-':
+                return None
+            return [tuple(int(value) for value in item.split(':')) for item in cached.split(',')]
+        
+        ranges = payload_ranges(file_path)
+        self.hash_cache.put(cache_key, file_path,
+                            ','.join(f"{offset}:{length}" for offset, length in ranges) if ranges else '-')
+        return ranges
+    
+    def _get_payload_hash(self, job: Tuple[str, Ranges, str]) -> Optional[str]:
+        """
+        Hash a media payload, or its first and last blocks
+        
+        Args:
+            job: (file path, payload ranges, 'payload-partial' or 'payload')
+            
+        Returns:
+            Hex digest string or None if error
         """
-        Calculate MD5 hash of a file
+        file_path, ranges, stage = job
+        block_size = self.partial_block_size
+        
+        try:
+            stat = os.stat(file_path)
+            cache_key = HashCache.make_key(self._hash_kind(stage), stat)
+            cached = self.hash_cache.get(cache_key)
+            if cached:
+                return cached
+            
+            payload_size = sum(length for _, length in ranges)
+            if stage == 'payload-partial' and payload_size > block_size * 2:
+                read_ranges = (slice_ranges(ranges, 0, block_size) +
+                               slice_ranges(ranges, payload_size - block_size, block_size))
+            else:
+                read_ranges = ranges
+            
+            payload_hash, bytes_read = self.hash_io.hash_ranges(file_path, read_ranges)
+            self._count_bytes_read(bytes_read)
+            self.hash_cache.put(cache_key, file_path, payload_hash)
+            
+            return payload_hash
+            
+        except (OSError, PermissionError, IOError) as e:
+            print(f"Error reading file {file_path}: {e}")
+            return None
+    
+    def _new_hash(self):
+        """Create a new content hash object"""
+        return self.hash_io.new_hash()
+    
+    def _hash_kind(self, stage: str) -> str:
+        """Cache namespace for a hash stage, so parameter changes never mix"""
+        if stage.startswith('payload'):
+            stage = f"{stage}{PAYLOAD_VERSION}"
+        if stage in ('partial', 'payload-partial'):
+            return f"{stage}{self.partial_block_size}:{self.hash_io.name}"
+        return f"{stage}:{self.hash_io.name}"
+    
+    def _get_partial_hash(self, file_path: str) -> Optional[str]:
+        """
+        Hash the first and last blocks of a file
+        
+        Files no larger than two blocks are read whole, in which case the
+        result equals the full content hash and is cached as such.
+        
+        Args:
+            file_path: Path to the file
+            
+        Returns:
+            Hex digest string or None if error
+        """
+        block_size = self.partial_block_size
+        
+        try:
+            stat = os.stat(file_path)
+            file_size = stat.st_size
+            
+            if file_size <= block_size * 2:
+                return self._get_file_hash(file_path)
+            
+            cache_key = HashCache.make_key(self._hash_kind('partial'), stat)
+            cached = self.hash_cache.get(cache_key)
+            if cached:
+                return cached
+            
+            partial_hash, bytes_read = self.hash_io.hash_ranges(
+                file_path, [(0, block_size), (file_size - block_size, block_size)]
+            )
+            self._count_bytes_read(bytes_read)
+
+            self.hash_cache.put(cache_key, file_path, partial_hash)
+            
+            return partial_hash
+            
+        except (OSError, PermissionError, IOError) as e:
+            print(f"Error reading file {file_path}: {e}")
+            return None
+    
+    def _get_file_hash(self, file_path: str) -> Optional[str]:
+        """
+        Calculate the BLAKE2b content hash of a file
+        
+        With verify_large_files disabled, files above large_file_threshold
+        fall back to the sampled hash, which can miss differences.
         
         Args:
             file_path: Path to the file
-            chunk_size: Size of chunks to read at a time
             
         Returns:
-            MD5 hash string or None if error
+            Hex digest string or None if error
         """
         # Check cache first
         try:
             stat = os.stat(file_path)
-            cache_key = f"{file_path}:{stat.st_size}:{stat.st_mtime}"
+            if stat.st_size > self.large_file_threshold and not self.verify_large_files:
+                return self._get_sample_hash(file_path)
             
-            if cache_key in self.hash_cache:
-                return self.hash_cache[cache_key]
+            cache_key = HashCache.make_key(self._hash_kind('full'), stat)
+            cached = self.hash_cache.get(cache_key)
+            if cached:
+                return cached
         except (OSError, PermissionError):
             return None
         
         try:
-            hash_md5 = hashlib.md5()
-            
-            with open(file_path, 'rb') as f:
-                # For large files, use a progressive hashing approach
-                file_size = stat.st_size
-                
-                if file_size > 100 * 1024 * 1024:  # Files larger than 100MB
-                    # Sample-based hashing for very large files
-                    # Hash beginning, middle, and end chunks
-                    chunks_to_hash = [
-                        (0, min(chunk_size * 10, file_size // 3)),  # Beginning
-                        (file_size // 2 - chunk_size * 5, chunk_size * 10),  # Middle
-                        (max(0, file_size - chunk_size * 10), chunk_size * 10)  # End
-                    ]
-                    
-                    for start_pos, read_size in chunks_to_hash:
-                        f.seek(start_pos)
-                        chunk = f.read(read_size)
-                        if chunk:
-                            hash_md5.update(chunk)
-                else:
-                    # Full file hashing for smaller files
-                    while True:
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        hash_md5.update(chunk)
-            
-            file_hash = hash_md5.hexdigest()
+            file_hash, bytes_read = self.hash_io.hash_file(file_path)
+            self._count_bytes_read(bytes_read)
             
             # Cache the result
-            self.hash_cache[cache_key] = file_hash
+            self.hash_cache.put(cache_key, file_path, file_hash)
             
             return file_hash
             
@@ -202,6 +1175,171 @@ class DuplicateFinder:
             print(f"Error reading file {file_path}: {e}")
             return None
     
+    def _get_sample_hash(self, file_path: str, chunk_size: int = 8192) -> Optional[str]:
+        """
+        Hash the beginning, middle and end of a large file
+        
+        Only suitable as a prefilter: files that differ elsewhere produce
+        the same sampled hash.
+        
+        Args:
+            file_path: Path to the file
+            chunk_size: Unit for the sampled window sizes
+            
+        Returns:
+            Hex digest string or None if error
+        """
+        try:
+            stat = os.stat(file_path)
+            cache_key = HashCache.make_key(self._hash_kind('sampled'), stat)
+            
+            cached = self.hash_cache.get(cache_key)
+            if cached:
+                return cached
+            
+            file_size = stat.st_size
+            chunks_to_hash = [
+                (0, min(chunk_size * 10, file_size // 3)),  # Beginning
+                (file_size // 2 - chunk_size * 5, chunk_size * 10),  # Middle
+                (max(0, file_size - chunk_size * 10), chunk_size * 10)  # End
+            ]
+            
+            sample_hash, bytes_read = self.hash_io.hash_ranges(file_path, chunks_to_hash)
+            self._count_bytes_read(bytes_read)
+            self.hash_cache.put(cache_key, file_path, sample_hash)
+            
+            return sample_hash
+            
+        except (OSError, PermissionError, IOError) as e:
+            print(f"Error reading file {file_path}: {e}")
+            return None
+    
+    def _verify_candidates(self, file_paths: List[str]) -> Dict[str, List[str]]:
+        """
+        Split candidate files into groups with byte-identical content
+        
+        Members with a cached full hash are grouped without reading; the
+        rest are compared side by side with one member of each cached group.
+        
+        Args:
+            file_paths: Same-size files whose sampled hashes match
+            
+        Returns:
+            Mapping of full content hash to identical files, in input order
+        """
+        kind = self._hash_kind('full')
+        order = {file_path: idx for idx, file_path in enumerate(file_paths)}
+        
+        # Files hashed in full by an earlier scan need no reading; one
+        # representative per cached hash is compared against the rest
+        cached_groups = defaultdict(list)
+        uncached = []
+        for file_path in file_paths:
+            try:
+                file_hash = self.hash_cache.get(HashCache.make_key(kind, os.stat(file_path)))
+            except OSError:
+                continue
+            if file_hash:
+                cached_groups[file_hash].append(file_path)
+            else:
+                uncached.append(file_path)
+        
+        verified = defaultdict(list)
+        for file_hash, files in cached_groups.items():
+            verified[file_hash].extend(files)
+        
+        if uncached:
+            to_compare = uncached + [files[0] for files in cached_groups.values()]
+            to_compare.sort(key=order.get)
+            for file_hash, files in self._compare_side_by_side(to_compare).items():
+                verified[file_hash].extend(f for f in files if f not in verified[file_hash])
+        
+        return {
+            file_hash: sorted(files, key=order.get)
+            for file_hash, files in verified.items() if len(files) > 1
+        }
+    
+    def _compare_side_by_side(self, file_paths: List[str]) -> Dict[str, List[str]]:
+        """
+        Read files block by block in lockstep, splitting on divergence
+        
+        Members left on their own are closed and dropped immediately, so
+        most non-matches stop reading early. Surviving groups get a full
+        content hash computed from one member's blocks, which is also
+        cached for every member.
+        
+        Args:
+            file_paths: Same-size files to compare
+            
+        Returns:
+            Mapping of full content hash to byte-identical files
+        """
+        kind = self._hash_kind('full')
+        verified = defaultdict(list)
+        
+        # One reusable buffer per member, shrunk so a wide group stays
+        # within ~64 MB; comparing bytearrays is a plain memcmp
+        block_size = max(64 * 1024, min(self.verify_block_size, (64 * 1024 * 1024) // max(1, len(file_paths))))
+        
+        members = []  # [path, stat, file, buffer]
+        try:
+            for file_path in file_paths:
+                try:
+                    stat = os.stat(file_path)
+                    handle = os.fdopen(self.hash_io.open(file_path), 'rb', buffering=0)
+                    members.append((file_path, stat, handle, bytearray(block_size)))
+                except (OSError, PermissionError) as e:
+                    print(f"Error reading file {file_path}: {e}")
+            
+            groups = [(self._new_hash(), members)]
+            
+            while groups:
+                next_groups = []
+                
+                for hasher, group in groups:
+                    splits = []  # [block, members] per distinct block content
+                    for member in group:
+                        try:
+                            n = member[2].readinto(member[3])
+                            self._count_bytes_read(n)
+                        except (OSError, IOError) as e:
+                            print(f"Error reading file {member[0]}: {e}")
+                            member[2].close()
+                            continue
+                        block = member[3] if n == block_size else member[3][:n]
+                        for split in splits:
+                            if split[0] == block:
+                                split[1].append(member)
+                                break
+                        else:
+                            splits.append([block, [member]])
+                    
+                    for block, split_members in splits:
+                        if len(split_members) < 2:
+                            for member in split_members:
+                                member[2].close()
+                            continue
+                        
+                        split_hasher = hasher.copy() if len(splits) > 1 else hasher
+                        if block:
+                            split_hasher.update(block)
+                            next_groups.append((split_hasher, split_members))
+                            continue
+                        
+                        # All members reached end of file together
+                        file_hash = split_hasher.hexdigest()
+                        for file_path, stat, handle, _ in split_members:
+                            handle.close()
+                            verified[file_hash].append(file_path)
+                            self.hash_cache.put(HashCache.make_key(kind, stat), file_path, file_hash)
+                
+                groups = next_groups
+        finally:
+            for _, _, handle, _ in members:
+                handle.close()
+        
+        return dict(verified)
+    
     def calculate_savings(self, duplicate_groups: List[Dict]) -> int:
         """
         Calculate potential space savings from removing duplicates
@@ -212,51 +1350,31 @@ class DuplicateFinder:
         Returns:
             Total bytes that could be saved
         """
-        total_savings = 0
-        
-        for group in duplicate_groups:
-            # Keep one file, remove the rest
-            files_to_remove = len(group['files']) - 1
-            file_size = group['size']
-            total_savings += files_to_remove * file_size
-        
-        return total_savings
+        return sum(self._group_savings(group) for group in duplicate_groups)
+    
+    def _count_unique_files(self, duplicate_group: Dict) -> int:
+        """Count distinct inodes in a group; hardlinks share their data"""
+        return len({f.get('inode', f['path']) for f in duplicate_group['files']})
+    
+    def _group_savings(self, duplicate_group: Dict) -> int:
+        """Bytes freed by keeping one inode of a group and removing the rest"""
+        return max(0, self._count_unique_files(duplicate_group) - 1) * duplicate_group['size']
     
-    def get_duplicate_tree(self, duplicate_groups: List[Dict]) -> Dict:
+    def get_duplicate_tree(self, duplicate_groups: List[Dict], tree: Optional[DuplicateTree] = None) -> DuplicateTree:
         """
-        Create a directory tree structure showing duplicates
+        Build a browsable directory tree of duplicates
         
         Args:
             duplicate_groups: List of duplicate groups
+            tree: Existing tree to extend, so groups can be added as they are found
             
         Returns:
-            Nested dictionary representing directory tree
+            DuplicateTree with wasted bytes and group counts on every directory
         """
-        tree = {}
+        tree = tree if tree is not None else DuplicateTree()
         
-        for group_idx, group in enumerate(duplicate_groups):
-            for file_info in group['files']:
-                path_parts = Path(file_info['path']).parts
-                current_node = tree
-                
-                # Build tree structure
-                for part in path_parts[:-1]:  # Exclude filename
-                    if part not in current_node:
-                        current_node[part] = {}
-                    current_node = current_node[part]
-                
-                # Add file info
-                filename = path_parts[-1]
-                if filename not in current_node:
-                    current_node[filename] = []
-                
-                current_node[filename].append({
-                    'group_id': group_idx,
-                    'hash': group['hash'],
-                    'size': file_info['size'],
-                    'last_modified': file_info['last_modified'],
-                    'full_path': file_info['path']
-                })
+        for group in duplicate_groups:
+            tree.add_group(group, self.suggest_files_to_keep(group))
         
         return tree
     
@@ -318,16 +1436,86 @@ class DuplicateFinder:
             
         Returns:
             List of file paths to remove
+            
+        Hardlinks of the kept file share its data, so they are left alone.
         """
         keep_file = self.suggest_files_to_keep(duplicate_group)
+        keep_inode = next((f.get('inode', f['path']) for f in duplicate_group['files']
+                           if f['path'] == keep_file), keep_file)
         
         files_to_remove = []
         for file_info in duplicate_group['files']:
-            if file_info['path'] != keep_file:
+            if file_info.get('inode', file_info['path']) != keep_inode:
                 files_to_remove.append(file_info['path'])
         
         return files_to_remove
     
+    def plan_removal(self, duplicate_groups: List[Dict], mode: str = 'delete',
+                     confirm_callback: Optional[callable] = None) -> RemovalPlan:
+        """
+        Decide once which file of each group to keep and what to do with the rest
+        
+        Args:
+            duplicate_groups: List of duplicate groups
+            mode: 'delete', 'reflink' or 'hardlink'
+            confirm_callback: Optional callback for user confirmation per group
+            
+        Returns:
+            RemovalPlan that can be saved, reviewed and applied later
+        """
+        plan = RemovalPlan(mode)
+        
+        for group in duplicate_groups:
+            keep_file = self.suggest_files_to_keep(group)
+            files_to_remove = set(self.get_files_to_remove(group))
+            
+            if confirm_callback:
+                if not confirm_callback(group, keep_file, sorted(files_to_remove)):
+                    continue
+            
+            plan.kept_files.append(keep_file)
+            keep_size = next((f['size'] for f in group['files'] if f['path'] == keep_file), None)
+            for file_info in group['files']:
+                if file_info['path'] in files_to_remove:
+                    plan.add(keep_file, file_info, group['hash'], keep_size)
+        
+        return plan
+    
+    def apply_plan(self, plan: RemovalPlan, journal_path: Optional[str] = None,
+                   workers: Optional[int] = None, progress_callback: Optional[Callable] = None,
+                   cancel_event: Optional[threading.Event] = None) -> Dict:
+        """
+        Execute a removal plan on a worker pool, journaling every step
+        
+        Args:
+            plan: Plan from plan_removal or RemovalPlan.load
+            journal_path: New journal file; defaults to one under the data directory
+            workers: Worker threads
+            progress_callback: Optional callback receiving a progress dict per batch
+            cancel_event: Optional event that stops the run between batches
+            
+        Returns:
+            Results dictionary with removed or linked files, errors, space freed
+            and the journal path to resume or undo from
+        """
+        journal = RemovalJournal(journal_path or RemovalJournal.default_path())
+        return PlanExecutor(self._replace_with_link, workers).apply(
+            plan, journal, progress_callback, cancel_event)
+    
+    def resume_plan(self, journal_path: str, workers: Optional[int] = None,
+                    progress_callback: Optional[Callable] = None,
+                    cancel_event: Optional[threading.Event] = None) -> Dict:
+        """Continue an interrupted or cancelled apply_plan run from its journal"""
+        return PlanExecutor(self._replace_with_link, workers).resume(
+            RemovalJournal(journal_path), progress_callback, cancel_event)
+    
+    def undo_plan(self, journal_path: str, workers: Optional[int] = None,
+                  progress_callback: Optional[Callable] = None,
+                  cancel_event: Optional[threading.Event] = None) -> Dict:
+        """Restore the files removed or linked by a journaled run from their kept copies"""
+        return PlanExecutor(self._replace_with_link, workers).undo(
+            RemovalJournal(journal_path), progress_callback, cancel_event)
+    
     def remove_duplicates(self, duplicate_groups: List[Dict], 
                          confirm_callback: Optional[callable] = None) -> Dict:
         """
@@ -340,41 +1528,84 @@ class DuplicateFinder:
         Returns:
             Results dictionary with removed files and errors
         """
-        results = {
-            'removed_files': [],
-            'kept_files': [],
-            'errors': [],
-            'space_freed': 0
-        }
+        try:
+            plan = self.plan_removal(duplicate_groups, 'delete', confirm_callback)
+            return self.apply_plan(plan)
+        except Exception as e:
+            return {'removed_files': [], 'kept_files': [], 'space_freed': 0,
+                    'errors': [f"Error removing duplicates: {e}"]}
+    
+    def link_duplicates(self, duplicate_groups: List[Dict], mode: str = 'reflink',
+                        confirm_callback: Optional[callable] = None) -> Dict:
+        """
+        Replace duplicate files with links to the kept copy
         
-        for group in duplicate_groups:
+        Every path stays in place. 'reflink' makes copy-on-write clones
+        (FICLONE, e.g. Btrfs or XFS), which stay independent files;
+        'hardlink' makes the paths share one inode, so later writes through
+        any of them change them all. Each replacement is made under a
+        temporary name in the same directory and renamed over the
+        duplicate, so a path never appears missing or half-written.
+        
+        Args:
+            duplicate_groups: List of duplicate groups
+            mode: 'reflink' or 'hardlink'
+            confirm_callback: Optional callback for user confirmation
+            
+        Returns:
+            Results dictionary with linked files and errors
+        """
+        if mode not in ('reflink', 'hardlink'):
+            return {'linked_files': [], 'kept_files': [], 'space_freed': 0,
+                    'errors': [f"Unknown link mode: {mode}"]}
+        
+        try:
+            plan = self.plan_removal(duplicate_groups, mode, confirm_callback)
+            return self.apply_plan(plan)
+        except Exception as e:
+            return {'linked_files': [], 'kept_files': [], 'space_freed': 0,
+                    'errors': [f"Error linking duplicates: {e}"]}
+    
+    def _replace_with_link(self, source: str, target: str, mode: str):
+        """Atomically replace target with a reflink or hardlink of source"""
+        directory, name = os.path.split(target)
+        temp_path = os.path.join(directory, f".{name}.dexter-{os.urandom(6).hex()}")
+        
+        if mode == 'hardlink':
+            os.link(source, temp_path)
+        else:
             try:
-                keep_file = self.suggest_files_to_keep(group)
-                files_to_remove = self.get_files_to_remove(group)
-                
-                # Confirm removal if callback provided
-                if confirm_callback:
-                    if not confirm_callback(group, keep_file, files_to_remove):
-                        continue
-                
-                results['kept_files'].append(keep_file)
-                
-                # Remove duplicate files
-                for file_path in files_to_remove:
-                    try:
-                        file_size = os.path.getsize(file_path)
-                        os.remove(file_path)
-                        
-                        results['removed_files'].append(file_path)
-                        results['space_freed'] += file_size
-                        
-                    except (OSError, PermissionError) as e:
-                        results['errors'].append(f"Failed to remove {file_path}: {e}")
-                        
-            except Exception as e:
-                results['errors'].append(f"Error processing duplicate group: {e}")
+                import fcntl
+            except ImportError:
+                raise OSError("Reflinks are not supported on this platform")
+            
+            FICLONE = 0x40049409
+            src_fd = os.open(source, os.O_RDONLY)
+            try:
+                dst_fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                try:
+                    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+                except OSError:
+                    os.close(dst_fd)
+                    os.remove(temp_path)
+                    raise
+                os.close(dst_fd)
+            finally:
+                os.close(src_fd)
+            
+            # A clone is a new file, so carry over the duplicate's own metadata
+            target_stat = os.stat(target)
+            shutil.copystat(target, temp_path)
+            try:
+                os.chown(temp_path, target_stat.st_uid, target_stat.st_gid)
+            except (OSError, AttributeError):
+                pass
         
-        return results
+        try:
+            os.replace(temp_path, target)
+        except OSError:
+            os.remove(temp_path)
+            raise
     
     def export_duplicate_report(self, duplicate_groups: List[Dict], 
                               output_path: str = "duplicate_report.txt") -> bool:
@@ -418,6 +1649,32 @@ class DuplicateFinder:
             print(f"Error exporting report: {e}")
             return False
     
+    def export_duplicates(self, duplicate_groups: Iterable[Dict], output_path: str,
+                          fmt: Optional[str] = None) -> Optional[Dict]:
+        """
+        Stream duplicate groups to a machine-readable report
+        
+        Groups are written one at a time, so iter_duplicates can be passed
+        straight in and the report grows while the search runs.
+        
+        Args:
+            duplicate_groups: Groups, or a generator of them
+            output_path: Path for output file
+            fmt: 'csv', 'jsonl' or 'bin'; taken from the extension if omitted
+            
+        Returns:
+            Summary with group, file and savings totals, or None on error
+        """
+        try:
+            with open_report_writer(output_path, fmt) as writer:
+                for group in duplicate_groups:
+                    writer.write_group(group, self.suggest_files_to_keep(group), self._group_savings(group))
+            return writer.summary()
+            
+        except Exception as e:
+            print(f"Error exporting report: {e}")
+            return None
+    
     def _format_bytes(self, bytes_value: int) -> str:
         """Format bytes into human readable format"""
         for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
@@ -430,9 +1687,17 @@ class DuplicateFinder:
         """Clear the hash cache"""
         self.hash_cache.clear()
     
+    def prune_cache(self) -> int:
+        """Drop cached hashes of files that were deleted or changed"""
+        return self.hash_cache.prune()
+    
+    def _maintain_cache(self):
+        """Prune the persistent cache in the background once a prune is due"""
+        if self.hash_cache.path and not (self._cache_thread and self._cache_thread.is_alive()):
+            self._cache_thread = threading.Thread(target=self.hash_cache.prune_if_due,
+                                                  name='hash-cache-prune', daemon=True)
+            self._cache_thread.start()
+    
     def get_cache_stats(self) -> Dict:
         """Get cache statistics"""
-        return {
-            'cached_files': len(self.hash_cache),
-            'cache_size_mb': sum(len(k) + len(v) for k, v in self.hash_cache.items()) / (1024 * 1024)
-        }
+        return self.hash_cache.get_stats()
@@ -0,0 +1,200 @@
+import os
+import sys
+import threading
+from array import array
+from typing import Dict, List, Optional
+
+
+class DuplicateTree:
+    """
+    Path trie over duplicate files with per-node aggregates
+
+    Nodes are integer ids into parallel arrays, so a node costs one
+    interned name, a few machine ints and, for directories only, a dict of
+    children. Every node carries the totals of its subtree, updated as
+    groups are added, so any directory can be listed without walking it.
+    Node 0 is the root above every path.
+    """
+
+    ROOT = 0
+
+    def __init__(self):
+        self._names: List[str] = ['']
+        self._parents = array('q', [-1])
+        self._children: List[Optional[Dict[str, int]]] = [{}]
+        self._group_ids = array('q', [-1])        # Group of a file node, -1 for directories
+        self._wasted = array('q', [0])            # Bytes freed by removing the extra copies below
+        self._duplicate_bytes = array('q', [0])   # Bytes of all duplicate files below
+        self._file_counts = array('q', [0])
+        self._group_counts = array('q', [0])      # Distinct groups with a file below
+        self._sorted = {}                         # node -> children ordered by wasted bytes
+        self._lock = threading.Lock()
+        self.group_count = 0
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add_group(self, duplicate_group: Dict, keep_path: Optional[str] = None) -> int:
+        """
+        Add a duplicate group and update the totals of every ancestor
+
+        Each extra copy wastes the group's size, which for media matched
+        by payload is the payload size rather than the file size. The kept
+        file and further hardlinks of an inode already counted add no
+        wasted bytes, so the root total matches calculate_savings.
+
+        Args:
+            duplicate_group: Group as produced by DuplicateFinder
+            keep_path: File that would be kept; defaults to the first file
+
+        Returns:
+            Id of the group within the tree
+        """
+        files = duplicate_group['files']
+        if keep_path is None and files:
+            keep_path = files[0]['path']
+        keep_inode = next((f.get('inode') for f in files if f['path'] == keep_path), None)
+        group_size = duplicate_group['size']
+
+        with self._lock:
+            group_id = self.group_count
+            self.group_count += 1
+
+            seen_inodes = {keep_inode} if keep_inode is not None else set()
+            touched = set()
+            for file_info in files:
+                inode = file_info.get('inode')
+                size = file_info['size']
+                wasted = 0
+                if file_info['path'] != keep_path and (inode is None or inode not in seen_inodes):
+                    wasted = group_size
+                if inode is not None:
+                    seen_inodes.add(inode)
+
+                node = self._insert(file_info['path'], group_id)
+                while node >= 0:
+                    self._wasted[node] += wasted
+                    self._duplicate_bytes[node] += size
+                    self._file_counts[node] += 1
+                    touched.add(node)
+                    node = self._parents[node]
+
+            for node in touched:
+                self._group_counts[node] += 1
+            self._sorted.clear()
+
+        return group_id
+
+    def _insert(self, path: str, group_id: int) -> int:
+        """Create the nodes of a path and return the file's node id"""
+        parts = self._split_path(path)
+        node = self.ROOT
+        for depth, part in enumerate(parts):
+            children = self._children[node]
+            child = children.get(part)
+            if child is None:
+                is_file = depth == len(parts) - 1
+                child = len(self._names)
+                children[part] = child
+                self._names.append(sys.intern(part))
+                self._parents.append(node)
+                self._children.append(None if is_file else {})
+                self._group_ids.append(group_id if is_file else -1)
+                self._wasted.append(0)
+                self._duplicate_bytes.append(0)
+                self._file_counts.append(0)
+                self._group_counts.append(0)
+            node = child
+        return node
+
+    @staticmethod
+    def _split_path(path: str) -> List[str]:
+        """Split a path like Path.parts, without building a Path object"""
+        drive, rest = os.path.splitdrive(os.path.normpath(path))
+        parts = [part for part in rest.split(os.sep) if part]
+        anchor = drive + os.sep if rest.startswith(os.sep) else drive
+        return [anchor] + parts if anchor else parts
+
+    def find(self, path: str) -> Optional[int]:
+        """Get the node id of a path, or None if no duplicates live there"""
+        node = self.ROOT
+        with self._lock:
+            for part in self._split_path(path):
+                children = self._children[node]
+                if not children or part not in children:
+                    return None
+                node = children[part]
+        return node
+
+    def get_path(self, node: int) -> str:
+        """Rebuild the full path of a node"""
+        parts = []
+        while node > self.ROOT:
+            parts.append(self._names[node])
+            node = self._parents[node]
+        return os.path.join(*reversed(parts)) if parts else ''
+
+    def get_node(self, node: int) -> Dict:
+        """
+        Describe one node
+
+        Returns:
+            Node id, name, path, subtree totals and, for files, the group id
+        """
+        children = self._children[node]
+        info = {
+            'id': node,
+            'name': self._names[node],
+            'path': self.get_path(node),
+            'is_file': children is None,
+            'wasted_bytes': self._wasted[node],
+            'duplicate_bytes': self._duplicate_bytes[node],
+            'files': self._file_counts[node],
+            'groups': self._group_counts[node],
+            'children': len(children) if children else 0
+        }
+        if children is None:
+            info['group_id'] = self._group_ids[node]
+        return info
+
+    def list_children(self, node: int = ROOT, offset: int = 0, limit: int = 100) -> Dict:
+        """
+        List one page of a node's children, largest wasted space first
+
+        The sorted order of a node is computed once and reused until the
+        next group is added.
+
+        Args:
+            node: Node id to list
+            offset: Number of children to skip
+            limit: Maximum number of children to return
+
+        Returns:
+            The node itself, its total child count and the requested page
+        """
+        with self._lock:
+            if not 0 <= node < len(self._names):
+                raise KeyError(f"Unknown node {node}")
+
+            ordered = self._sorted.get(node)
+            if ordered is None:
+                children = self._children[node] or {}
+                ordered = sorted(children.values(), key=lambda child: (-self._wasted[child], self._names[child]))
+                self._sorted[node] = ordered
+
+            return {
+                'node': self.get_node(node),
+                'total': len(ordered),
+                'offset': offset,
+                'children': [self.get_node(child) for child in ordered[offset:offset + limit]]
+            }
+
+    def get_summary(self) -> Dict:
+        """Totals for the whole tree"""
+        return {
+            'nodes': len(self._names),
+            'groups': self.group_count,
+            'files': self._file_counts[self.ROOT],
+            'wasted_bytes': self._wasted[self.ROOT],
+            'duplicate_bytes': self._duplicate_bytes[self.ROOT]
+        }
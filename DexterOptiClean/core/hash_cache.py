@@ -0,0 +1,382 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# (kind, st_dev, st_ino, st_size, st_mtime_ns)
+CacheKey = Tuple[str, int, int, int, int]
+
+DEFAULT_CACHE_PATH = '~/.local/share/dexter_optimizer/hash_cache.db'
+
+# Rows kept on disk; the least recently used are dropped beyond this
+DEFAULT_MAX_DISK_ENTRIES = 1_000_000
+
+# Seconds between background prunes of entries for deleted or changed files
+PRUNE_INTERVAL = 7 * 24 * 3600
+
+# Rows read, checked and deleted per step of a prune
+PRUNE_CHUNK = 5000
+
+KEY_COLUMNS = 'kind, dev, ino, size, mtime_ns'
+
+
+class HashCache:
+    """
+    Persistent file hash cache with a size-bounded in-memory LRU front
+
+    The database is bounded too: each row records when it was last
+    written or read from disk, and the least recently used rows are
+    dropped once it holds more than max_disk_entries. Entries for files
+    that were deleted or changed are removed by prune, which works
+    through the table in chunks and can pick up where it stopped.
+    """
+
+    # Rough per-entry cost of the key tuple and OrderedDict bookkeeping
+    ENTRY_OVERHEAD = 240
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH,
+                 max_memory_mb: float = 32, flush_every: int = 1000,
+                 max_disk_entries: Optional[int] = DEFAULT_MAX_DISK_ENTRIES):
+        """
+        Args:
+            path: SQLite database path, or None for a memory-only cache
+            max_memory_mb: Memory cap for the in-memory LRU front
+            flush_every: Number of new entries to buffer before writing to disk
+            max_disk_entries: Row cap for the database, or None for no cap
+        """
+        self.max_memory = int(max_memory_mb * 1024 * 1024)
+        self.flush_every = flush_every
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._pending = []
+        self._touched = []  # (used, key...) of rows read from disk, to refresh on flush
+        self._disk_rows = 0  # Row count, approximate between evictions
+        self._pruning = False
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+        self.path = None
+
+        if path:
+            try:
+                self.path = os.path.expanduser(path)
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS hashes ("
+                    " kind TEXT, dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER,"
+                    " path BLOB, hash TEXT, used INTEGER NOT NULL DEFAULT 0,"
+                    " PRIMARY KEY (kind, dev, ino, size, mtime_ns)) WITHOUT ROWID"
+                )
+                columns = [row[1] for row in self._db.execute("PRAGMA table_info(hashes)")]
+                if 'used' not in columns:  # Caches created before the row cap
+                    self._db.execute("ALTER TABLE hashes ADD COLUMN used INTEGER NOT NULL DEFAULT 0")
+                self._db.execute("CREATE INDEX IF NOT EXISTS hashes_used ON hashes (used)")
+                self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                self._db.commit()
+                self._disk_rows = self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+            except (OSError, sqlite3.Error) as e:
+                print(f"Hash cache disabled persistence ({path}): {e}")
+                self._db = None
+                self.path = None
+
+    @staticmethod
+    def make_key(kind: str, stat: os.stat_result) -> CacheKey:
+        """Build a cache key that changes whenever the file content may have"""
+        return (kind, stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        """Look up a hash, checking memory first and then the database"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT hash FROM hashes WHERE kind=? AND dev=? AND ino=? AND size=? AND mtime_ns=?",
+                        key
+                    ).fetchone()
+                except sqlite3.Error:
+                    row = None
+                if row:
+                    self._remember(key, row[0])
+                    self._touched.append((int(time.time()),) + key)
+                    self._flush_if_full()
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: CacheKey, path: str, value: str):
+        """Store a hash in memory and queue it for the database"""
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                # Stored as bytes: names that are not valid UTF-8 reach here
+                # surrogate-escaped and cannot be written as TEXT
+                self._pending.append(key + (os.fsencode(path), value, int(time.time())))
+                self._flush_if_full()
+
+    def _flush_if_full(self):
+        if len(self._pending) + len(self._touched) >= self.flush_every:
+            self._flush_locked()
+
+    def _remember(self, key: CacheKey, value: str):
+        """Insert into the LRU front, evicting the oldest entries past the cap"""
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= self._entry_size(old)
+        self._memory[key] = value
+        self._memory_bytes += self._entry_size(value)
+
+        while self._memory_bytes > self.max_memory and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= self._entry_size(evicted)
+
+    def _entry_size(self, value: str) -> int:
+        return self.ENTRY_OVERHEAD + sys.getsizeof(value)
+
+    def flush(self):
+        """Write buffered entries to the database"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._db is None or not (self._pending or self._touched):
+            return
+        try:
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO hashes ({KEY_COLUMNS}, path, hash, used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                self._pending
+            )
+            self._db.executemany(
+                "UPDATE hashes SET used=? WHERE kind=? AND dev=? AND ino=? AND size=? AND mtime_ns=?",
+                self._touched
+            )
+            self._db.commit()
+            self._disk_rows += len(self._pending)  # Replaced rows count twice until the next eviction
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Error writing hash cache: {e}")
+            self._db.rollback()
+        finally:
+            # Drop the batch even on failure so one bad row cannot block every later write
+            self._pending = []
+            self._touched = []
+
+        if self.max_disk_entries and self._disk_rows > self.max_disk_entries:
+            # Evict down to 90% so the next eviction is many flushes away
+            self._evict_locked(int(self.max_disk_entries * 0.9))
+
+    def _evict_locked(self, target: int) -> int:
+        """Drop the least recently used rows until at most target remain"""
+        try:
+            self._disk_rows = self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+            excess = self._disk_rows - target
+            if excess <= 0:
+                return 0
+            self._db.execute(
+                f"DELETE FROM hashes WHERE ({KEY_COLUMNS}) IN"
+                f" (SELECT {KEY_COLUMNS} FROM hashes ORDER BY used LIMIT ?)",
+                (excess,)
+            )
+            self._db.commit()
+            self._disk_rows -= excess
+            return excess
+        except sqlite3.Error as e:
+            print(f"Error trimming hash cache: {e}")
+            return 0
+
+    def trim(self) -> int:
+        """
+        Apply max_disk_entries now instead of at the next flush
+
+        Returns:
+            Number of entries removed
+        """
+        self.flush()
+        with self._lock:
+            if self._db is None or not self.max_disk_entries:
+                return 0
+            return self._evict_locked(self.max_disk_entries)
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: Optional[str]):
+        if value is None:
+            self._db.execute("DELETE FROM meta WHERE key=?", (key,))
+        else:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def prune(self) -> int:
+        """
+        Drop entries for files that no longer exist or have changed
+
+        Only persisted entries record their path, so a memory-only cache
+        relies on its size cap instead.
+
+        Returns:
+            Number of entries removed
+        """
+        self.flush()
+        return self._prune_from(None)
+
+    def prune_if_due(self, interval: float = PRUNE_INTERVAL) -> int:
+        """
+        Prune when the last full prune is older than interval seconds
+
+        A prune that was interrupted, for example because the process
+        exited, is continued from where it stopped instead.
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            if self._db is None or self._pruning:
+                return 0
+            try:
+                last = self._get_meta('last_prune')
+                cursor = self._get_meta('prune_cursor')
+                if last is None:  # New cache; nothing can be stale yet
+                    self._set_meta('last_prune', str(time.time()))
+                    self._db.commit()
+                    return 0
+            except sqlite3.Error as e:
+                print(f"Error reading hash cache state: {e}")
+                return 0
+            if cursor is None and time.time() - float(last) < interval:
+                return 0
+            self._pruning = True
+
+        try:
+            self.flush()
+            return self._prune_from(tuple(json.loads(cursor)) if cursor else None)
+        finally:
+            self._pruning = False
+
+    def _prune_from(self, after: Optional[CacheKey]) -> int:
+        """
+        Check the rows after a key in primary key order, a chunk at a time
+
+        The lock is only held to read and delete each chunk, so lookups and
+        writes carry on while files are stat'ed. The position is saved
+        after every chunk for prune_if_due.
+        """
+        removed = 0
+        while True:
+            with self._lock:
+                if self._db is None:
+                    return removed
+                try:
+                    if after is None:
+                        rows = self._db.execute(
+                            f"SELECT {KEY_COLUMNS}, path FROM hashes ORDER BY {KEY_COLUMNS} LIMIT ?",
+                            (PRUNE_CHUNK,)
+                        ).fetchall()
+                    else:
+                        rows = self._db.execute(
+                            f"SELECT {KEY_COLUMNS}, path FROM hashes WHERE ({KEY_COLUMNS}) > (?, ?, ?, ?, ?)"
+                            f" ORDER BY {KEY_COLUMNS} LIMIT ?",
+                            after + (PRUNE_CHUNK,)
+                        ).fetchall()
+                except sqlite3.Error as e:
+                    print(f"Error pruning hash cache: {e}")
+                    return removed
+            if not rows:
+                break
+
+            stale = []
+            for kind, dev, ino, size, mtime_ns, path in rows:
+                key = (kind, dev, ino, size, mtime_ns)
+                try:
+                    if self.make_key(kind, os.stat(path)) == key:
+                        continue
+                except OSError:
+                    pass
+                stale.append(key)
+            after = tuple(rows[-1][:5])
+
+            with self._lock:
+                if self._db is None:
+                    return removed
+                try:
+                    self._db.executemany(
+                        "DELETE FROM hashes WHERE kind=? AND dev=? AND ino=? AND size=? AND mtime_ns=?", stale
+                    )
+                    self._set_meta('prune_cursor', json.dumps(after))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Error pruning hash cache: {e}")
+                    return removed
+
+                for key in stale:
+                    value = self._memory.pop(key, None)
+                    if value is not None:
+                        self._memory_bytes -= self._entry_size(value)
+                self._disk_rows -= len(stale)
+            removed += len(stale)
+
+        with self._lock:
+            if self._db is not None:
+                try:
+                    self._set_meta('prune_cursor', None)
+                    self._set_meta('last_prune', str(time.time()))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Error pruning hash cache: {e}")
+        return removed
+
+    def clear(self):
+        """Remove all entries from memory and disk"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._pending = []
+            self._touched = []
+            self.hits = 0
+            self.misses = 0
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM hashes")
+                    self._set_meta('prune_cursor', None)
+                    self._db.commit()
+                    self._disk_rows = 0
+                except sqlite3.Error as e:
+                    print(f"Error clearing hash cache: {e}")
+
+    def close(self):
+        """Flush pending entries and close the database"""
+        self.flush()
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics without walking the entries"""
+        return {
+            'cached_files': len(self._memory),
+            'cache_size_mb': self._memory_bytes / (1024 * 1024),
+            'max_memory_mb': self.max_memory / (1024 * 1024),
+            'hits': self.hits,
+            'misses': self.misses,
+            'pending_writes': len(self._pending),
+            'disk_entries': self._disk_rows,
+            'max_disk_entries': self.max_disk_entries,
+            'persistent_path': self.path
+        }
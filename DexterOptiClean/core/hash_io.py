@@ -0,0 +1,168 @@
+import os
+import hashlib
+import mmap
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+
+
+class BufferPool:
+    """Reusable, preallocated read buffers shared by hashing threads"""
+
+    def __init__(self, buffer_size: int = 1024 * 1024, max_buffers: int = 32):
+        self.buffer_size = buffer_size
+        self.max_buffers = max_buffers
+        self._free = queue.LifoQueue()  # Most recently used buffer is likely still in cache
+        self._allocated = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def buffer(self) -> Iterator[memoryview]:
+        """Borrow a buffer; blocks while max_buffers are all in use"""
+        try:
+            buf = self._free.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                allocate = self._allocated < self.max_buffers
+                if allocate:
+                    self._allocated += 1
+            buf = bytearray(self.buffer_size) if allocate else self._free.get()
+
+        view = memoryview(buf)
+        try:
+            yield view
+        finally:
+            view.release()
+            self._free.put(buf)
+
+
+class HashIO:
+    """
+    File hashing without per-chunk allocations
+
+    Reads go through readinto() on pooled buffers, starting small and
+    doubling up to the buffer size so small files stay cheap. Files are
+    opened with a sequential read-ahead hint where posix_fadvise exists,
+    and files above mmap_threshold are hashed straight from an mmap. The
+    hash algorithm is any hashlib name or a factory returning a hash object.
+    """
+
+    INITIAL_READ_SIZE = 64 * 1024
+
+    def __init__(self, algorithm: Union[str, Callable] = 'blake2b', digest_size: Optional[int] = 16,
+                 buffer_size: int = 1024 * 1024, max_buffers: int = 32,
+                 mmap_threshold: Optional[int] = 64 * 1024 * 1024):
+        """
+        Args:
+            algorithm: hashlib algorithm name, or a callable returning a new hash object
+            digest_size: Digest bytes for algorithms that support it (BLAKE2)
+            buffer_size: Largest single read, and size of the pooled buffers
+            max_buffers: Buffers kept in the pool
+            mmap_threshold: Files at least this large are hashed via mmap; None disables it
+        """
+        self.algorithm = algorithm
+        self.digest_size = digest_size
+        self.mmap_threshold = mmap_threshold
+        self.pool = BufferPool(buffer_size, max_buffers)
+
+    @property
+    def name(self) -> str:
+        """Algorithm tag used to keep cached hashes of different algorithms apart"""
+        if callable(self.algorithm):
+            return getattr(self.algorithm, '__name__', 'custom')
+        if self.algorithm.startswith('blake2') and self.digest_size:
+            return f"{self.algorithm}{self.digest_size}"
+        return self.algorithm
+
+    def new_hash(self):
+        """Create a new hash object"""
+        if callable(self.algorithm):
+            return self.algorithm()
+        if self.algorithm.startswith('blake2') and self.digest_size:
+            return hashlib.new(self.algorithm, digest_size=self.digest_size)
+        return hashlib.new(self.algorithm)
+
+    def open(self, file_path: str) -> int:
+        """Open a file for reading with a sequential access hint"""
+        fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        return fd
+
+    def hash_file(self, file_path: str, hasher=None) -> Tuple[str, int]:
+        """
+        Hash a whole file
+
+        Args:
+            file_path: Path to the file
+            hasher: Optional hash object to feed instead of a new one
+
+        Returns:
+            (hex digest, bytes read)
+        """
+        hasher = hasher or self.new_hash()
+        fd = self.open(file_path)
+        try:
+            file_size = os.fstat(fd).st_size
+            if self.mmap_threshold is not None and file_size >= self.mmap_threshold:
+                bytes_read = self._hash_mmap(fd, file_size, hasher)
+            else:
+                bytes_read = self._hash_reads(fd, hasher)
+        finally:
+            os.close(fd)
+
+        return hasher.hexdigest(), bytes_read
+
+    def _hash_reads(self, fd: int, hasher) -> int:
+        bytes_read = 0
+        read_size = self.INITIAL_READ_SIZE
+        with self.pool.buffer() as buf, os.fdopen(fd, 'rb', buffering=0, closefd=False) as f:
+            while True:
+                n = f.readinto(buf[:read_size])
+                if not n:
+                    break
+                hasher.update(buf[:n])
+                bytes_read += n
+                read_size = min(read_size * 2, len(buf))
+        return bytes_read
+
+    def _hash_mmap(self, fd: int, file_size: int, hasher) -> int:
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            step = self.pool.buffer_size * 8
+            with memoryview(mm) as view:
+                for offset in range(0, file_size, step):
+                    with view[offset:offset + step] as piece:
+                        hasher.update(piece)
+        return file_size
+
+    def hash_ranges(self, file_path: str, ranges: List[Tuple[int, int]]) -> Tuple[str, int]:
+        """
+        Hash selected (offset, length) ranges of a file, in order
+
+        Returns:
+            (hex digest, bytes read)
+        """
+        hasher = self.new_hash()
+        bytes_read = 0
+        fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            with self.pool.buffer() as buf, os.fdopen(fd, 'rb', buffering=0, closefd=False) as f:
+                for offset, length in ranges:
+                    f.seek(max(0, offset))
+                    while length > 0:
+                        n = f.readinto(buf[:min(length, len(buf))])
+                        if not n:
+                            break
+                        hasher.update(buf[:n])
+                        bytes_read += n
+                        length -= n
+        finally:
+            os.close(fd)
+
+        return hasher.hexdigest(), bytes_read
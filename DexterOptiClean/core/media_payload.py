@@ -0,0 +1,304 @@
+import os
+import struct
+from typing import BinaryIO, List, Optional, Tuple
+
+# (offset, length) byte ranges of a file
+Ranges = List[Tuple[int, int]]
+
+# Read when looking for the JPEG end-of-image marker before trailer data
+JPEG_TAIL_WINDOW = 64 * 1024
+
+# Bumped whenever the ranges a parser returns change, so cached payload
+# ranges and hashes from older versions are not reused
+PAYLOAD_VERSION = 2
+
+
+def payload_ranges(file_path: str) -> Optional[Ranges]:
+    """
+    Find the media payload of a file, leaving out tags and metadata blocks
+
+    Only known tag and metadata structures are left out, so anything that
+    can change the decoded output (colour profiles, animation frames,
+    codec setup) stays in. Only headers are read. Left out are:
+    ID3v2/ID3v1/APEv2 tags around MP3 and FLAC data, FLAC padding, Vorbis
+    comment and picture blocks, JPEG EXIF, XMP, Photoshop/IPTC and comment
+    segments, PNG text, time and EXIF chunks, RIFF/WAVE LIST, ID3, bext,
+    iXML and padding chunks, and MP4/MOV udta, meta, XMP and free space
+    boxes, including those directly inside moov.
+
+    Args:
+        file_path: Path to the file
+
+    Returns:
+        Payload byte ranges in file order, or None if the file is not a
+        supported format or its structure could not be parsed
+    """
+    parser = PARSERS.get(os.path.splitext(file_path)[1].lower())
+    if parser is None:
+        return None
+
+    try:
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            ranges = parser(f, size)
+    except (OSError, ValueError, struct.error):
+        return None
+
+    ranges = _merge([(offset, length) for offset, length in ranges or [] if length > 0])
+    if not ranges or ranges[-1][0] + ranges[-1][1] > size:
+        return None
+    return ranges
+
+
+def _merge(ranges: Ranges) -> Ranges:
+    """Join adjacent ranges"""
+    merged = []
+    for offset, length in ranges:
+        if merged and merged[-1][0] + merged[-1][1] == offset:
+            merged[-1] = (merged[-1][0], merged[-1][1] + length)
+        else:
+            merged.append((offset, length))
+    return merged
+
+
+def _skip_id3v2(f: BinaryIO, start: int) -> int:
+    """Offset after any ID3v2 tags starting at start"""
+    while True:
+        f.seek(start)
+        header = f.read(10)
+        if len(header) < 10 or header[:3] != b'ID3':
+            return start
+        tag_size = 0
+        for byte in header[6:10]:  # Synchsafe integer: 7 bits per byte
+            tag_size = (tag_size << 7) | (byte & 0x7f)
+        start += 10 + tag_size + (10 if header[5] & 0x10 else 0)  # Optional footer
+
+
+def _strip_trailing_tags(f: BinaryIO, start: int, end: int) -> int:
+    """End offset before any ID3v1 and APEv2 tags, in either order"""
+    while end > start:
+        if end - 128 >= start:
+            f.seek(end - 128)
+            if f.read(3) == b'TAG':
+                end -= 128
+                continue
+        if end - 32 >= start:
+            f.seek(end - 32)
+            footer = f.read(32)
+            if footer[:8] == b'APETAGEX':
+                tag_size, _, flags = struct.unpack('<III', footer[12:24])
+                end -= tag_size + (32 if flags & 0x80000000 else 0)  # Header present
+                continue
+        return end
+    return end
+
+
+def _parse_mp3(f: BinaryIO, size: int) -> Ranges:
+    start = _skip_id3v2(f, 0)
+    end = _strip_trailing_tags(f, start, size)
+    return [(start, end - start)]
+
+
+FLAC_METADATA_BLOCKS = {1, 4, 6}  # PADDING, VORBIS_COMMENT, PICTURE
+
+
+def _parse_flac(f: BinaryIO, size: int) -> Ranges:
+    start = _skip_id3v2(f, 0)
+    f.seek(start)
+    if f.read(4) != b'fLaC':
+        raise ValueError("Not a FLAC stream")
+
+    ranges = []
+    pos = start + 4
+    while True:
+        f.seek(pos)
+        header = f.read(4)
+        if len(header) < 4:
+            raise ValueError("Truncated FLAC metadata")
+        block_type = header[0] & 0x7f
+        length = int.from_bytes(header[1:4], 'big')
+        # Block bodies only: the header's last-block flag moves with the tags
+        if block_type not in FLAC_METADATA_BLOCKS:
+            ranges.append((pos + 4, length))
+        pos += 4 + length
+        if header[0] & 0x80:  # Last metadata block
+            break
+
+    end = _strip_trailing_tags(f, pos, size)
+    ranges.append((pos, end - pos))
+    return ranges
+
+
+# (marker, signature at the start of the segment) of metadata segments;
+# other APPn segments such as ICC profiles (APP2) and Adobe colour
+# transforms (APP14) change how the image decodes and are kept
+JPEG_METADATA_SEGMENTS = (
+    (0xe1, b'Exif\x00'),
+    (0xe1, b'http://ns.adobe.com/xap/1.0/\x00'),
+    (0xe1, b'http://ns.adobe.com/xmp/extension/\x00'),
+    (0xed, b'Photoshop 3.0\x00'),
+)
+JPEG_SIGNATURE_LENGTH = max(len(signature) for _, signature in JPEG_METADATA_SEGMENTS)
+
+
+def _is_jpeg_metadata(marker: int, head: bytes) -> bool:
+    if marker == 0xfe:  # COM
+        return True
+    return any(marker == metadata_marker and head.startswith(signature)
+               for metadata_marker, signature in JPEG_METADATA_SEGMENTS)
+
+
+def _parse_jpeg(f: BinaryIO, size: int) -> Ranges:
+    if f.read(2) != b'\xff\xd8':
+        raise ValueError("Not a JPEG")
+
+    ranges = []
+    pos = 2
+    while pos < size:
+        f.seek(pos)
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xff:
+            raise ValueError("Bad JPEG marker")
+        if marker[1] == 0xff:  # Fill byte
+            pos += 1
+            continue
+        if marker[1] == 0xd9:  # End of image without scan data
+            ranges.append((pos, 2))
+            break
+        if 0xd0 <= marker[1] <= 0xd7 or marker[1] == 0x01:  # Markers without a length
+            ranges.append((pos, 2))
+            pos += 2
+            continue
+
+        length = struct.unpack('>H', f.read(2))[0]
+        if marker[1] == 0xda:
+            # Entropy-coded data runs to the end-of-image marker; anything
+            # after it is trailer metadata added by cameras and editors
+            window = min(JPEG_TAIL_WINDOW, size - pos)
+            f.seek(size - window)
+            eoi = f.read(window).rfind(b'\xff\xd9')
+            end = size - window + eoi + 2 if eoi >= 0 else size
+            ranges.append((pos, end - pos))
+            break
+        if not _is_jpeg_metadata(marker[1], f.read(min(max(length - 2, 0), JPEG_SIGNATURE_LENGTH))):
+            ranges.append((pos, 2 + length))
+        pos += 2 + length
+
+    return ranges
+
+
+# Text, timestamp and EXIF chunks; everything else, including colour
+# (iCCP, gAMA, sRGB, cHRM) and APNG animation chunks, is payload
+PNG_METADATA_CHUNKS = {b'tEXt', b'zTXt', b'iTXt', b'tIME', b'eXIf'}
+
+
+def _parse_png(f: BinaryIO, size: int) -> Ranges:
+    if f.read(8) != b'\x89PNG\r\n\x1a\n':
+        raise ValueError("Not a PNG")
+
+    ranges = []
+    pos = 8
+    while pos < size:
+        f.seek(pos)
+        length, chunk_type = struct.unpack('>I4s', f.read(8))
+        if chunk_type not in PNG_METADATA_CHUNKS:
+            ranges.append((pos, 12 + length))
+        pos += 12 + length
+        if chunk_type == b'IEND':
+            break
+    return ranges
+
+
+WAV_METADATA_CHUNKS = {b'LIST', b'id3 ', b'ID3 ', b'bext', b'iXML', b'_PMX', b'JUNK', b'junk', b'PAD '}
+
+
+def _parse_wav(f: BinaryIO, size: int) -> Ranges:
+    header = f.read(12)
+    if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        raise ValueError("Not a WAVE file")
+
+    ranges = []
+    pos = 12
+    while pos + 8 <= size:
+        f.seek(pos)
+        chunk_id, length = struct.unpack('<4sI', f.read(8))
+        if chunk_id not in WAV_METADATA_CHUNKS:
+            ranges.append((pos, 8 + min(length, size - pos - 8)))
+        pos += 8 + length + (length & 1)  # Chunks are word aligned
+    return ranges
+
+
+MP4_METADATA_BOXES = {b'udta', b'meta', b'free', b'skip'}
+MP4_XMP_UUID = bytes.fromhex('be7acfcb97a942e89c71999491e3afac')
+
+
+def _iter_mp4_boxes(f: BinaryIO, start: int, end: int):
+    """Yield (offset, header length, box length, type) of the boxes in a span"""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        length, box_type = struct.unpack('>I4s', f.read(8))
+        header = 8
+        if length == 1:  # 64-bit size follows
+            length = struct.unpack('>Q', f.read(8))[0]
+            header = 16
+        elif length == 0:  # Box runs to the end of the span
+            length = end - pos
+        if length < header or pos + length > end:
+            raise ValueError("Bad MP4 box")
+        yield pos, header, length, box_type
+        pos += length
+
+
+def _is_mp4_metadata(f: BinaryIO, pos: int, header: int, box_type: bytes) -> bool:
+    if box_type in MP4_METADATA_BOXES:
+        return True
+    if box_type == b'uuid':
+        f.seek(pos + header)
+        return f.read(16) == MP4_XMP_UUID
+    return False
+
+
+def _parse_mp4(f: BinaryIO, size: int) -> Ranges:
+    ranges = []
+    for pos, header, length, box_type in _iter_mp4_boxes(f, 0, size):
+        if _is_mp4_metadata(f, pos, header, box_type):
+            continue
+        if box_type != b'moov':
+            ranges.append((pos, length))
+            continue
+        # Tags live in moov/udta and moov/meta; keep the rest of moov but
+        # not its header, whose size covers the tags
+        for child_pos, child_header, child_length, child_type in _iter_mp4_boxes(f, pos + header, pos + length):
+            if not _is_mp4_metadata(f, child_pos, child_header, child_type):
+                ranges.append((child_pos, child_length))
+    return ranges
+
+
+PARSERS = {
+    '.mp3': _parse_mp3,
+    '.flac': _parse_flac,
+    '.jpg': _parse_jpeg,
+    '.jpeg': _parse_jpeg,
+    '.png': _parse_png,
+    '.wav': _parse_wav,
+    '.mp4': _parse_mp4,
+    '.m4a': _parse_mp4,
+    '.mov': _parse_mp4,
+}
+
+
+def slice_ranges(ranges: Ranges, start: int, length: int) -> Ranges:
+    """Map a span of the concatenated payload back to file ranges"""
+    sliced = []
+    for offset, range_length in ranges:
+        if length <= 0:
+            break
+        if start >= range_length:
+            start -= range_length
+            continue
+        take = min(range_length - start, length)
+        sliced.append((offset + start, take))
+        length -= take
+        start = 0
+    return sliced
@@ -0,0 +1,203 @@
+import math
+import re
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# Metrics kept in the history, taken from SystemMonitor snapshots
+HISTORY_METRICS = ('cpu_usage', 'memory_usage', 'disk_usage', 'temperature', 'load_average')
+
+# (name, seconds per point, points kept): one hour of seconds, one day of
+# minutes and thirty days of hours
+HISTORY_TIERS = (
+    ('1s', 1, 3600),
+    ('1m', 60, 1440),
+    ('1h', 3600, 720),
+)
+
+_RANGE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_range(value: str) -> int:
+    """
+    Parse a range like '90s', '15m', '6h' or '7d' into seconds
+
+    Raises:
+        ValueError: For anything else
+    """
+    match = re.fullmatch(r'\s*(\d+)\s*([smhd]?)\s*', str(value).lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Invalid range '{value}', expected e.g. 15m, 6h or 7d")
+    return int(match.group(1)) * _RANGE_UNITS[match.group(2) or 's']
+
+
+class _Tier:
+    """Ring buffers of min/avg/max per metric at one resolution"""
+
+    def __init__(self, name: str, step: int, capacity: int, metrics: Tuple[str, ...]):
+        self.name = name
+        self.step = step
+        self.capacity = capacity
+        self.times = array('d', [0.0]) * capacity
+        self.series = {metric: tuple(array('d', [math.nan]) * capacity for _ in range(3)) for metric in metrics}
+        self.head = 0
+        self.count = 0
+        # Bucket being rolled up from the finer tier: start time and
+        # [min, weighted sum, max, weight] per metric
+        self.bucket_start = None
+        self.bucket = {}
+
+    def append(self, timestamp: float, values: Dict[str, Tuple[float, float, float]]):
+        index = self.head
+        self.times[index] = timestamp
+        for metric, (mins, avgs, maxs) in self.series.items():
+            low, mean, high = values.get(metric, (math.nan, math.nan, math.nan))
+            mins[index] = low
+            avgs[index] = mean
+            maxs[index] = high
+        self.head = (index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def accumulate(self, timestamp: float, values: Dict[str, Tuple[float, float, float, float]]):
+        """
+        Add finer points to the current bucket
+
+        Returns:
+            (bucket start, rolled-up values with weights) of the bucket that
+            was closed by this point, or None
+        """
+        start = timestamp - timestamp % self.step
+        closed = None
+        if self.bucket_start is not None and start != self.bucket_start:
+            closed = (self.bucket_start, self._rollup())
+            self.append(closed[0], {metric: value[:3] for metric, value in closed[1].items()})
+            self.bucket = {}
+        self.bucket_start = start
+
+        for metric, (low, mean, high, weight) in values.items():
+            current = self.bucket.get(metric)
+            if current is None:
+                self.bucket[metric] = [low, mean * weight, high, weight]
+            else:
+                current[0] = min(current[0], low)
+                current[1] += mean * weight
+                current[2] = max(current[2], high)
+                current[3] += weight
+        return closed
+
+    def _rollup(self) -> Dict[str, Tuple[float, float, float, float]]:
+        return {metric: (low, total / weight, high, weight)
+                for metric, (low, total, high, weight) in self.bucket.items()}
+
+    def points(self, metric: str, since: float) -> List[Tuple[float, float, float, float]]:
+        """Points newer than since, oldest first, including the open bucket"""
+        mins, avgs, maxs = self.series[metric]
+        points = []
+        for offset in range(self.count):
+            index = (self.head - self.count + offset) % self.capacity
+            if self.times[index] >= since and not math.isnan(avgs[index]):
+                points.append((self.times[index], mins[index], avgs[index], maxs[index]))
+
+        open_bucket = self._rollup().get(metric) if self.bucket_start is not None else None
+        if open_bucket and self.bucket_start >= since:
+            points.append((self.bucket_start,) + open_bucket[:3])
+        return points
+
+
+class MetricsHistory:
+    """
+    Fixed-memory history of system metrics at several resolutions
+
+    Every tier keeps one point per step of wall-clock time: the finest
+    holds the min, average and max of the raw samples in each of its
+    steps, and each coarser tier those of the points of the tier below.
+    Points are bucketed by timestamp rather than counted, so a tier covers
+    step times capacity seconds whatever the sampling interval. All
+    buffers are allocated up front, so memory use does not grow with
+    uptime: roughly 32 bytes per point per metric.
+    """
+
+    def __init__(self, metrics: Tuple[str, ...] = HISTORY_METRICS,
+                 tiers: Tuple[Tuple[str, int, int], ...] = HISTORY_TIERS):
+        """
+        Args:
+            metrics: Snapshot keys to record
+            tiers: (name, seconds per point, points kept), finest first
+        """
+        self.metrics = tuple(metrics)
+        self._tiers = [_Tier(name, step, capacity, self.metrics) for name, step, capacity in tiers]
+        self._latest = None
+        self._lock = threading.Lock()
+
+    def add(self, snapshot: Dict):
+        """
+        Record one sample
+
+        Args:
+            snapshot: SystemMonitor snapshot with a 'timestamp'; missing
+                values are skipped and the 1 minute load is used for
+                load_average
+        """
+        timestamp = snapshot.get('timestamp')
+        if timestamp is None:
+            return
+
+        values = {}
+        for metric in self.metrics:
+            value = snapshot.get(metric)
+            if isinstance(value, (tuple, list)):
+                value = value[0] if value else None
+            if value is None:
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            if not math.isnan(value):
+                values[metric] = (value, value, value, 1)
+
+        with self._lock:
+            self._latest = timestamp
+            point = (timestamp, values)
+            for tier in self._tiers:
+                point = tier.accumulate(*point)
+                if point is None:
+                    break
+
+    def query(self, metric: str, range_seconds: int, now: Optional[float] = None) -> Dict:
+        """
+        Get the history of one metric
+
+        Uses the finest tier that still covers the whole range.
+
+        Args:
+            metric: One of the recorded metrics
+            range_seconds: How far back to go
+            now: End of the range; defaults to the newest sample
+
+        Returns:
+            Dict with metric, resolution, step and parallel timestamps,
+            min, avg and max lists, oldest first
+
+        Raises:
+            KeyError: For metrics that are not recorded
+        """
+        if metric not in self.metrics:
+            raise KeyError(f"Unknown metric '{metric}', expected one of {', '.join(self.metrics)}")
+
+        with self._lock:
+            tier = next((tier for tier in self._tiers if tier.step * tier.capacity >= range_seconds),
+                        self._tiers[-1])
+            if now is None:
+                now = self._latest or 0.0
+            points = tier.points(metric, now - range_seconds)
+
+        return {
+            'metric': metric,
+            'resolution': tier.name,
+            'step': tier.step,
+            'timestamps': [point[0] for point in points],
+            'min': [point[1] for point in points],
+            'avg': [point[2] for point in points],
+            'max': [point[3] for point in points]
+        }
@@ -0,0 +1,410 @@
+"""
+Long-lived privileged helper for batched file operations
+
+The CLI (clean --elevate) starts this file once under sudo and sends it
+batches of delete/move/copy operations over its stdin; results come back
+per batch on its stdout. Only paths strictly inside the roots given on its command
+line are touched, so the unprivileged side cannot widen what it may do.
+Only the standard library is used, so it runs under any interpreter.
+
+Protocol (all integers big-endian):
+  helper -> client once:  READY
+  client -> helper batch: u32 batch id, u32 op count, then per op
+                          u8 opcode, u16 source length, source,
+                          u16 destination length, destination
+  helper -> client reply: u32 batch id, u32 op count, then per op
+                          u8 status, u64 bytes freed, u16 message length,
+                          message
+A batch with no operations, or end of input, stops the helper.
+"""
+
+import os
+import shutil
+import stat
+import struct
+import subprocess
+import sys
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+READY = b'DXPH\x00\x01\n'
+OPCODES = {'delete': 1, 'move': 2, 'copy': 3}
+STATUS_OK, STATUS_NOT_ALLOWED, STATUS_NOT_FOUND, STATUS_PERMISSION, STATUS_ERROR = range(5)
+STATUS_NAMES = {STATUS_NOT_ALLOWED: 'Not allowed', STATUS_NOT_FOUND: 'Not found',
+                STATUS_PERMISSION: 'Permission denied', STATUS_ERROR: 'Error'}
+MAX_BATCH = 4096
+
+_BATCH = struct.Struct('>II')
+_RESULT = struct.Struct('>BQ')
+
+# (operation, source, destination or None)
+Operation = Tuple[str, str, Optional[str]]
+
+
+def _read_exact(stream, length: int) -> bytes:
+    data = stream.read(length)
+    if len(data) != length:
+        raise EOFError("Helper pipe closed")
+    return data
+
+
+def _read_string(stream) -> bytes:
+    length, = struct.unpack('>H', _read_exact(stream, 2))
+    return _read_exact(stream, length)
+
+
+def _write_string(buf: bytearray, value: bytes):
+    if len(value) > 0xffff:
+        raise ValueError("Path too long")
+    buf += struct.pack('>H', len(value))
+    buf += value
+
+
+# Every directory on the way to a target is opened with these, so no
+# symlink is ever followed
+_DIR_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW
+
+
+class _Executor:
+    """Helper side: checks paths against the allowlist and runs operations"""
+
+    def __init__(self, roots: Sequence[str], owner_uid: int):
+        """
+        Args:
+            roots: Directories operations may touch
+            owner_uid: User the helper acts for; in world-writable or sticky
+                directories only that user's files may be touched
+        """
+        # The filesystem root would allow everything
+        self.roots = [root for root in (os.path.realpath(root) for root in roots) if root != os.sep]
+        self.owner_uid = owner_uid
+
+    def _components(self, path: bytes) -> Optional[List[str]]:
+        """
+        Split a path that lies strictly inside an allowed root
+
+        The check is purely lexical: the path must be absolute and free of
+        '.', '..' and empty components. It holds on disk because _open_parent
+        then refuses to follow any symlink.
+
+        Returns:
+            The path's components below '/', or None if it is not allowed
+        """
+        path = os.fsdecode(path)
+        if not path.startswith(os.sep):
+            return None
+        components = path[1:].split(os.sep)
+        if any(component in ('', '.', '..') for component in components):
+            return None
+        for root in self.roots:
+            if path.startswith(root + os.sep):
+                return components
+        return None
+
+    @staticmethod
+    def _open_parent(components: List[str]) -> int:
+        """
+        Open the directory holding a path by walking down from '/'
+
+        Each directory is opened relative to the previous one with
+        O_NOFOLLOW, so replacing any of them with a symlink, before or
+        during the walk, makes it fail instead of leading elsewhere.
+
+        Returns:
+            Descriptor of the parent directory; the caller closes it
+
+        Raises:
+            OSError: If a directory is missing or is a symlink
+        """
+        fd = os.open(os.sep, _DIR_FLAGS)
+        try:
+            for component in components[:-1]:
+                next_fd = os.open(component, _DIR_FLAGS, dir_fd=fd)
+                os.close(fd)
+                fd = next_fd
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    def _shared_and_foreign(self, dir_fd: int, name: str) -> bool:
+        """
+        Whether name lives in a world-writable or sticky directory and
+        belongs to someone else
+
+        Root ignores the sticky bit, so without this check the helper
+        would let its user delete or overwrite other users' files in
+        places like /tmp.
+        """
+        if not os.fstat(dir_fd).st_mode & (stat.S_IWOTH | stat.S_ISVTX):
+            return False
+        try:
+            return os.lstat(name, dir_fd=dir_fd).st_uid != self.owner_uid
+        except FileNotFoundError:
+            return False
+
+    def run(self, opcode: int, source: bytes, destination: bytes) -> Tuple[int, int, str]:
+        """Run one operation; returns (status, bytes freed, message)"""
+        source_parts = self._components(source)
+        target_parts = self._components(destination) if opcode != OPCODES['delete'] else None
+        if source_parts is None or (opcode != OPCODES['delete'] and target_parts is None):
+            return STATUS_NOT_ALLOWED, 0, 'Outside the allowed paths'
+
+        dir_fd = target_fd = None
+        try:
+            dir_fd = self._open_parent(source_parts)
+            name = source_parts[-1]
+            info = os.lstat(name, dir_fd=dir_fd)
+            if self._shared_and_foreign(dir_fd, name):
+                return STATUS_NOT_ALLOWED, 0, 'Owned by another user in a shared directory'
+            if opcode == OPCODES['delete']:
+                if stat.S_ISDIR(info.st_mode):
+                    return STATUS_OK, self._remove_tree(dir_fd, name), ''
+                os.unlink(name, dir_fd=dir_fd)
+                return STATUS_OK, info.st_size if stat.S_ISREG(info.st_mode) else 0, ''
+
+            target_fd = self._open_parent(target_parts)
+            target_name = target_parts[-1]
+            if self._shared_and_foreign(target_fd, target_name):
+                return STATUS_NOT_ALLOWED, 0, 'Target owned by another user in a shared directory'
+            if opcode == OPCODES['move']:
+                os.rename(name, target_name, src_dir_fd=dir_fd, dst_dir_fd=target_fd)
+                return STATUS_OK, 0, ''
+            if opcode == OPCODES['copy'] and stat.S_ISREG(info.st_mode):
+                self._copy(dir_fd, name, target_fd, target_name, info)
+                return STATUS_OK, 0, ''
+            return STATUS_ERROR, 0, 'Unsupported operation'
+        except FileNotFoundError:
+            return STATUS_NOT_FOUND, 0, ''
+        except PermissionError as e:
+            return STATUS_PERMISSION, 0, str(e)
+        except OSError as e:
+            return STATUS_ERROR, 0, str(e)
+        finally:
+            for fd in (dir_fd, target_fd):
+                if fd is not None:
+                    os.close(fd)
+
+    @staticmethod
+    def _remove_tree(dir_fd: int, name: str) -> int:
+        """
+        Delete a directory tree without following symlinks
+
+        Entries are removed relative to descriptors of their directories,
+        as shutil.rmtree does, while adding up the sizes of the regular
+        files removed; the size of the directory itself says nothing
+        about its contents.
+
+        Returns:
+            Bytes of the regular files removed
+        """
+        def raise_error(error):
+            raise error
+
+        freed = 0
+        for _, dirs, files, root_fd in os.fwalk(name, topdown=False, onerror=raise_error,
+                                                follow_symlinks=False, dir_fd=dir_fd):
+            for entry in files + dirs:
+                info = os.lstat(entry, dir_fd=root_fd)
+                if stat.S_ISDIR(info.st_mode):
+                    os.rmdir(entry, dir_fd=root_fd)
+                    continue
+                os.unlink(entry, dir_fd=root_fd)  # Files, and symlinks listed among dirs
+                if stat.S_ISREG(info.st_mode):
+                    freed += info.st_size
+        os.rmdir(name, dir_fd=dir_fd)
+        return freed
+
+    @staticmethod
+    def _copy(dir_fd: int, name: str, target_fd: int, target_name: str, info: os.stat_result):
+        """Copy a regular file between open directories without following symlinks"""
+        source_fd = os.open(name, os.O_RDONLY | os.O_NOFOLLOW, dir_fd=dir_fd)
+        try:
+            copy_fd = os.open(target_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW,
+                              stat.S_IMODE(info.st_mode), dir_fd=target_fd)
+            try:
+                with open(source_fd, 'rb', closefd=False) as src, open(copy_fd, 'wb', closefd=False) as dst:
+                    shutil.copyfileobj(src, dst)
+                os.utime(copy_fd, ns=(info.st_atime_ns, info.st_mtime_ns))
+            finally:
+                os.close(copy_fd)
+        finally:
+            os.close(source_fd)
+
+
+def serve(roots: Sequence[str], stdin=None, stdout=None):
+    """Helper main loop: answer batches until an empty batch or end of input"""
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+    # sudo records who ran it; without sudo the helper acts for its own user
+    executor = _Executor(roots, int(os.environ.get('SUDO_UID', os.getuid())))
+    stdout.write(READY)
+    stdout.flush()
+
+    try:
+        while True:
+            batch_id, count = _BATCH.unpack(_read_exact(stdin, _BATCH.size))
+            if count == 0 or count > MAX_BATCH:
+                return
+
+            reply = bytearray(_BATCH.pack(batch_id, count))
+            for _ in range(count):
+                opcode = _read_exact(stdin, 1)[0]
+                source = _read_string(stdin)
+                destination = _read_string(stdin)
+                status, freed, message = executor.run(opcode, source, destination)
+                reply += _RESULT.pack(status, freed)
+                _write_string(reply, message.encode('utf-8', 'replace')[:1024])
+            stdout.write(reply)
+            stdout.flush()
+    except (EOFError, BrokenPipeError):
+        return  # The app went away
+
+
+class PrivilegedHelper:
+    """
+    Client for the helper process
+
+    The helper is started once, through sudo unless already root, and
+    reused for every batch, so elevated cleaning pays for one process
+    launch instead of one per file.
+    """
+
+    def __init__(self, allowed_roots: Sequence[str], batch_size: int = 512):
+        """
+        Args:
+            allowed_roots: Directories the helper may change files under
+            batch_size: Operations sent per round trip
+        """
+        self.allowed_roots = [os.path.realpath(os.path.expanduser(root)) for root in allowed_roots]
+        self.batch_size = min(batch_size, MAX_BATCH)
+        self._process = None
+        self._lock = threading.Lock()
+        self._batch_id = 0
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self) -> bool:
+        """
+        Launch the helper if it is not running
+
+        sudo always runs non-interactively, since callers such as request
+        threads must never block on a password prompt. This therefore only
+        succeeds when sudo credentials are cached (see
+        AdminUtils.request_elevation) or not needed.
+
+        Returns:
+            True if the helper is ready
+        """
+        with self._lock:
+            if self.running:
+                return True
+            if not hasattr(os, 'getuid'):
+                return False
+
+            command = [sys.executable, os.path.abspath(__file__)]
+            for root in self.allowed_roots:
+                command += ['--allow', root]
+            if os.getuid() != 0:
+                command = ['sudo', '-n', '--'] + command
+
+            try:
+                self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+                if self._process.stdout.read(len(READY)) == READY:
+                    return True
+            except OSError as e:
+                print(f"Error starting privileged helper: {e}")
+            self._stop_process()
+            return False
+
+    def run(self, operations: Sequence[Operation]) -> List[Dict]:
+        """
+        Run operations in batches through the helper
+
+        Args:
+            operations: (operation, source, destination) tuples; operation
+                is 'delete', 'move' or 'copy', destination None for delete
+
+        Returns:
+            One dict per operation with path, success, freed bytes and error
+        """
+        if not self.start():
+            return [{'path': source, 'success': False, 'freed': 0,
+                     'error': f"Permission denied: {source} (privileged helper unavailable)"}
+                    for _, source, _ in operations]
+
+        results = []
+        for start in range(0, len(operations), self.batch_size):
+            batch = operations[start:start + self.batch_size]
+            try:
+                results.extend(self._run_batch(batch))
+            except (OSError, EOFError, ValueError) as e:
+                print(f"Error in privileged helper: {e}")
+                with self._lock:
+                    self._stop_process()
+                results.extend({'path': source, 'success': False, 'freed': 0, 'error': str(e)}
+                               for _, source, _ in operations[start:])
+                break
+        return results
+
+    def _run_batch(self, batch: Sequence[Operation]) -> List[Dict]:
+        with self._lock:
+            self._batch_id += 1
+            buf = bytearray(_BATCH.pack(self._batch_id, len(batch)))
+            for operation, source, destination in batch:
+                if operation not in OPCODES:
+                    raise ValueError(f"Unknown operation '{operation}'")
+                buf.append(OPCODES[operation])
+                _write_string(buf, os.fsencode(os.path.abspath(source)))
+                _write_string(buf, os.fsencode(os.path.abspath(destination)) if destination else b'')
+            self._process.stdin.write(buf)
+            self._process.stdin.flush()
+
+            stdout = self._process.stdout
+            batch_id, count = _BATCH.unpack(_read_exact(stdout, _BATCH.size))
+            if batch_id != self._batch_id or count != len(batch):
+                raise ValueError("Privileged helper reply out of sync")
+
+            results = []
+            for _, source, _ in batch:
+                status, freed = _RESULT.unpack(_read_exact(stdout, _RESULT.size))
+                message = _read_string(stdout).decode('utf-8', 'replace')
+                error = None
+                if status != STATUS_OK:
+                    error = f"{STATUS_NAMES.get(status, 'Error')}: {source}" + (f" ({message})" if message else '')
+                results.append({'path': source, 'success': status == STATUS_OK, 'freed': freed, 'error': error})
+            return results
+
+    def close(self):
+        """Ask the helper to exit"""
+        with self._lock:
+            if self.running:
+                try:
+                    self._process.stdin.write(_BATCH.pack(0, 0))
+                    self._process.stdin.flush()
+                except OSError:
+                    pass
+            self._stop_process()
+
+    def _stop_process(self):
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+            self._process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+        self._process = None
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Privileged file operation helper')
+    parser.add_argument('--allow', action='append', default=[], help='Directory operations may touch')
+    args = parser.parse_args()
+    if not args.allow:
+        sys.exit("No allowed paths given")
+    serve(args.allow)
@@ -0,0 +1,401 @@
+import os
+import json
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from core.cgroup_stats import available_cpus
+
+PLAN_MODES = ('delete', 'reflink', 'hardlink')
+
+DEFAULT_JOURNAL_DIR = '~/.local/share/dexter_optimizer/journals'
+
+
+class RemovalPlan:
+    """
+    Keep/remove decisions for a set of duplicate groups
+
+    Each action replaces one duplicate 'path' (deleted, or turned into a
+    link of 'keep'). The size and mtime seen at scan time are recorded so
+    files changed since then are skipped rather than lost, along with the
+    kept file's mtime and inode when the plan is made, so a duplicate is
+    never removed in favour of, or restored from, a kept file that has
+    since been edited or replaced.
+    """
+
+    def __init__(self, mode: str = 'delete', actions: Optional[List[Dict]] = None,
+                 kept_files: Optional[List[str]] = None, created: Optional[float] = None):
+        if mode not in PLAN_MODES:
+            raise ValueError(f"Unknown plan mode: {mode}")
+        self.mode = mode
+        self.actions = actions or []
+        self.kept_files = kept_files or []
+        self.created = created or time.time()
+        self._keep_stat = None  # (path, stat) of the last kept file, shared by its group
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    def add(self, keep_file: str, file_info: Dict, group_hash: str, keep_size: Optional[int] = None):
+        """
+        Queue one duplicate for removal in favour of keep_file
+
+        keep_size is only needed when the kept file's size differs, as with
+        media files matched by payload.
+        """
+        if self._keep_stat is None or self._keep_stat[0] != keep_file:
+            try:
+                self._keep_stat = (keep_file, os.stat(keep_file))
+            except OSError:
+                self._keep_stat = (keep_file, None)  # Fails when the plan is applied
+        keep_stat = self._keep_stat[1]
+
+        action = {
+            'id': len(self.actions),
+            'hash': group_hash,
+            'keep': keep_file,
+            'path': file_info['path'],
+            'size': file_info['size'],
+            'mtime': file_info['last_modified']
+        }
+        if keep_size is not None and keep_size != file_info['size']:
+            action['keep_size'] = keep_size
+        if keep_stat is not None:
+            action['keep_mtime_ns'] = keep_stat.st_mtime_ns
+            action['keep_ino'] = keep_stat.st_ino
+        self.actions.append(action)
+
+    def total_bytes(self) -> int:
+        return sum(action['size'] for action in self.actions)
+
+    def to_dict(self) -> Dict:
+        return {'mode': self.mode, 'created': self.created,
+                'kept_files': self.kept_files, 'actions': self.actions}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RemovalPlan':
+        return cls(data['mode'], data['actions'], data.get('kept_files'), data.get('created'))
+
+    def save(self, path: str):
+        """Write the plan as JSON, replacing any file atomically"""
+        path = os.path.expanduser(path)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'RemovalPlan':
+        with open(os.path.expanduser(path), 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+class RemovalJournal:
+    """
+    Append-only JSON-lines record of a plan being applied
+
+    The first line holds the whole plan. Every batch writes a 'begin'
+    record per action, with the metadata needed to undo it, and is
+    fsynced before any file is touched; outcomes are fsynced after the
+    batch. After a crash, actions begun but never finished are checked
+    against the filesystem when the run is resumed.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        self._file = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default_path(cls) -> str:
+        """New journal path; the random suffix keeps runs started in the same second apart"""
+        directory = os.path.expanduser(DEFAULT_JOURNAL_DIR)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"removal-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-"
+                                       f"{os.urandom(4).hex()}.jsonl")
+
+    def create(self, plan: RemovalPlan):
+        """Start a new journal holding the plan"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'x', encoding='utf-8')
+        self.write([{'type': 'plan', **plan.to_dict()}])
+
+    def open(self):
+        """Reopen an existing journal for appending, dropping a torn last line"""
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def write(self, records: List[Dict]):
+        """Append records and make them durable before returning"""
+        with self._lock:
+            self._file.write(''.join(json.dumps(record) + '\n' for record in records))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def records(self) -> Iterator[Dict]:
+        """Read the journal, ignoring a line torn by a crash mid-write"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    break
+
+    def replay(self) -> Dict:
+        """
+        Rebuild the state of a run from its journal
+
+        Returns:
+            The plan, the begin record of each started action and the ids
+            that completed, failed or were undone
+        """
+        state = {'plan': None, 'begun': {}, 'done': {}, 'failed': set(), 'undone': set()}
+        for record in self.records():
+            kind = record.get('type')
+            if kind == 'plan':
+                state['plan'] = RemovalPlan.from_dict(record)
+            elif kind == 'begin':
+                state['begun'][record['id']] = record
+            elif kind == 'done':
+                state['done'][record['id']] = record.get('freed', 0)
+                state['failed'].discard(record['id'])
+            elif kind == 'error':
+                state['failed'].add(record['id'])
+            elif kind == 'undone':
+                state['undone'].add(record['id'])
+
+        if state['plan'] is None:
+            raise ValueError(f"Not a removal journal: {self.path}")
+        return state
+
+
+class PlanExecutor:
+    """Apply, resume or undo a RemovalPlan on a thread pool with a journal"""
+
+    def __init__(self, link_func: Callable[[str, str, str], None], workers: Optional[int] = None,
+                 batch_size: int = 256):
+        """
+        Args:
+            link_func: Called as link_func(source, target, mode) to replace target with a link
+            workers: Worker threads; file operations wait on the kernel, not the GIL
+            batch_size: Actions journaled and fsynced together
+        """
+        self.link_func = link_func
+        self.workers = workers or min(8, available_cpus() * 2)
+        self.batch_size = batch_size
+
+    def apply(self, plan: RemovalPlan, journal: RemovalJournal,
+              progress_callback: Optional[Callable] = None,
+              cancel_event: Optional[threading.Event] = None) -> Dict:
+        """Run a new plan, creating its journal"""
+        journal.create(plan)
+        try:
+            return self._run(plan, journal, {}, set(), progress_callback, cancel_event)
+        finally:
+            journal.close()
+
+    def resume(self, journal: RemovalJournal,
+               progress_callback: Optional[Callable] = None,
+               cancel_event: Optional[threading.Event] = None) -> Dict:
+        """Finish an interrupted run, skipping actions already completed"""
+        state = journal.replay()
+        journal.open()
+        try:
+            return self._run(state['plan'], journal, state['begun'], set(state['done']),
+                             progress_callback, cancel_event, previously_freed=sum(state['done'].values()))
+        finally:
+            journal.close()
+
+    def _run(self, plan: RemovalPlan, journal: RemovalJournal, begun: Dict, done: Set[int],
+             progress_callback: Optional[Callable], cancel_event: Optional[threading.Event],
+             previously_freed: int = 0) -> Dict:
+        done_key = 'removed_files' if plan.mode == 'delete' else 'linked_files'
+        results = {
+            done_key: [],
+            'kept_files': list(plan.kept_files),
+            'errors': [],
+            'space_freed': previously_freed,
+            'skipped': len(done),
+            'journal': journal.path,
+            'cancelled': False
+        }
+        pending = [action for action in plan.actions if action['id'] not in done]
+        progress = {'actions_total': len(plan.actions), 'actions_done': len(done)}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for start in range(0, len(pending), self.batch_size):
+                if cancel_event and cancel_event.is_set():
+                    results['cancelled'] = True
+                    break
+
+                batch = pending[start:start + self.batch_size]
+                journal.write([self._begin_record(action) for action in batch
+                               if action['id'] not in begun])
+
+                records = []
+                for action, (freed, error) in zip(batch, pool.map(
+                        lambda action: self._execute(plan.mode, action, action['id'] in begun), batch)):
+                    if error:
+                        results['errors'].append(error)
+                        records.append({'type': 'error', 'id': action['id'], 'error': error})
+                    else:
+                        results[done_key].append(action['path'])
+                        results['space_freed'] += freed
+                        records.append({'type': 'done', 'id': action['id'], 'freed': freed})
+                journal.write(records)
+
+                progress['actions_done'] += len(batch)
+                if progress_callback:
+                    progress_callback(dict(progress))
+
+        return results
+
+    def _begin_record(self, action: Dict) -> Dict:
+        """Intent record with the metadata needed to recreate the file"""
+        record = {'type': 'begin', 'id': action['id']}
+        try:
+            stat = os.stat(action['path'])
+            record['stat'] = [stat.st_mode, stat.st_uid, stat.st_gid,
+                              stat.st_atime_ns, stat.st_mtime_ns, stat.st_nlink]
+        except OSError:
+            pass
+        return record
+
+    def _execute(self, mode: str, action: Dict, resuming: bool):
+        """
+        Carry out one action
+
+        Returns:
+            (bytes freed, error message or None)
+        """
+        path, keep = action['path'], action['keep']
+        try:
+            keep_stat = os.stat(keep)
+            if self._keep_changed(action, keep_stat):
+                return 0, f"Skipped {path}: kept file {keep} changed since scan"
+
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                if resuming and mode == 'delete':
+                    return 0, None  # Removed before the crash; its freed space is unknown
+                raise
+
+            if os.path.samestat(stat, keep_stat):
+                if resuming:
+                    return 0, None  # Hardlinked before the crash
+                return 0, f"Skipped {path}: already a hardlink of {keep}"
+            if stat.st_size != action['size'] or stat.st_mtime != action['mtime']:
+                return 0, f"Skipped {path}: changed since scan"
+
+            if mode == 'delete':
+                os.remove(path)
+            else:
+                self.link_func(keep, path, mode)
+
+            # Data is only freed once its last hardlink is gone
+            return (stat.st_size if stat.st_nlink <= 1 else 0), None
+
+        except (OSError, PermissionError) as e:
+            return 0, f"Failed to {mode} {path}: {e}"
+
+    @staticmethod
+    def _keep_changed(action: Dict, keep_stat: os.stat_result) -> bool:
+        """Whether the kept file is no longer the one the plan was made with"""
+        # Plans saved before the mtime and inode were recorded only have the size
+        return (keep_stat.st_size != action.get('keep_size', action['size'])
+                or keep_stat.st_mtime_ns != action.get('keep_mtime_ns', keep_stat.st_mtime_ns)
+                or keep_stat.st_ino != action.get('keep_ino', keep_stat.st_ino))
+
+    def undo(self, journal: RemovalJournal,
+             progress_callback: Optional[Callable] = None,
+             cancel_event: Optional[threading.Event] = None) -> Dict:
+        """
+        Restore every completed action of a journal
+
+        Duplicates are byte-identical to their kept file, so each one is
+        recreated as an independent copy of it, with the mode, owner and
+        times recorded before it was removed. Media matched by payload
+        only comes back with the kept file's tags.
+        """
+        state = journal.replay()
+        plan = state['plan']
+        to_undo = [action for action in plan.actions
+                   if action['id'] in state['done'] and action['id'] not in state['undone']]
+        results = {'restored_files': [], 'errors': [], 'journal': journal.path, 'cancelled': False}
+        progress = {'actions_total': len(to_undo), 'actions_done': 0}
+
+        journal.open()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for start in range(0, len(to_undo), self.batch_size):
+                    if cancel_event and cancel_event.is_set():
+                        results['cancelled'] = True
+                        break
+
+                    batch = to_undo[start:start + self.batch_size]
+                    records = []
+                    for action, error in zip(batch, pool.map(
+                            lambda action: self._restore(plan.mode, action, state['begun'].get(action['id'], {})),
+                            batch)):
+                        if error:
+                            results['errors'].append(error)
+                        else:
+                            results['restored_files'].append(action['path'])
+                            records.append({'type': 'undone', 'id': action['id']})
+                    journal.write(records)
+
+                    progress['actions_done'] += len(batch)
+                    if progress_callback:
+                        progress_callback(dict(progress))
+        finally:
+            journal.close()
+
+        return results
+
+    def _restore(self, mode: str, action: Dict, begin: Dict) -> Optional[str]:
+        """Recreate one removed or linked path from the kept file"""
+        path, keep = action['path'], action['keep']
+        if mode == 'delete' and os.path.lexists(path):
+            return f"Skipped {path}: a file exists there again"
+
+        try:
+            if self._keep_changed(action, os.stat(keep)):
+                return f"Skipped {path}: kept file {keep} changed since the plan was made"
+        except OSError as e:
+            return f"Failed to restore {path}: {e}"
+
+        directory, name = os.path.split(path)
+        temp_path = os.path.join(directory, f".{name}.dexter-{os.urandom(6).hex()}")
+        try:
+            shutil.copyfile(keep, temp_path)
+            if 'stat' in begin:
+                st_mode, uid, gid, atime_ns, mtime_ns = begin['stat'][:5]
+                os.chmod(temp_path, st_mode & 0o7777)
+                try:
+                    os.chown(temp_path, uid, gid)
+                except (OSError, AttributeError):
+                    pass
+                os.utime(temp_path, ns=(atime_ns, mtime_ns))
+            else:
+                shutil.copystat(keep, temp_path)
+            os.replace(temp_path, path)
+            return None
+        except (OSError, PermissionError) as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return f"Failed to restore {path}: {e}"
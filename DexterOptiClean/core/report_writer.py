@@ -0,0 +1,234 @@
+import os
+import csv
+import json
+import struct
+from typing import BinaryIO, Dict, Iterator, Optional
+
+REPORT_FORMATS = ('csv', 'jsonl', 'bin')
+
+
+class ReportWriter:
+    """
+    Base class for streaming duplicate reports
+
+    Groups are written as they arrive and nothing is kept besides running
+    totals, so reports of any size are written in constant memory.
+    Timestamps are written as raw epoch seconds. Paths that are not valid
+    UTF-8 are written as their original bytes, as in the binary format,
+    so text reports are read back with errors='surrogateescape'.
+    """
+
+    binary = False
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self._file = open(output_path, 'wb' if self.binary else 'w',
+                          **({} if self.binary else {'encoding': 'utf-8', 'errors': 'surrogateescape',
+                                                     'newline': ''}))
+        self.groups = 0
+        self.files = 0
+        self.savings = 0
+        self._write_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write_group(self, duplicate_group: Dict, keep_path: str, savings: int):
+        """
+        Append one duplicate group
+
+        Args:
+            duplicate_group: Group as produced by DuplicateFinder
+            keep_path: File suggested to keep
+            savings: Bytes freed by removing the group's other copies
+        """
+        self._write_group(self.groups, duplicate_group, keep_path)
+        self.groups += 1
+        self.files += len(duplicate_group['files'])
+        self.savings += savings
+
+    def summary(self) -> Dict:
+        return {'groups': self.groups, 'files': self.files, 'potential_savings': self.savings}
+
+    def close(self):
+        if self._file:
+            self._write_footer()
+            self._file.close()
+            self._file = None
+
+    def _write_header(self):
+        pass
+
+    def _write_group(self, index: int, duplicate_group: Dict, keep_path: str):
+        raise NotImplementedError
+
+    def _write_footer(self):
+        pass
+
+
+class CsvReportWriter(ReportWriter):
+    """One row per file: group, hash, size, path, last_modified, inode, keep"""
+
+    def _write_header(self):
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(['group', 'hash', 'size', 'path', 'last_modified', 'inode', 'keep'])
+
+    def _write_group(self, index: int, duplicate_group: Dict, keep_path: str):
+        group_hash = duplicate_group['hash']
+        size = duplicate_group['size']
+        self._writer.writerows(
+            (index, group_hash, size, f['path'], f['last_modified'], f.get('inode', ''),
+             1 if f['path'] == keep_path else 0)
+            for f in duplicate_group['files']
+        )
+
+
+class JsonlReportWriter(ReportWriter):
+    """One JSON object per group, followed by a summary object"""
+
+    def _write_group(self, index: int, duplicate_group: Dict, keep_path: str):
+        self._file.write(json.dumps({
+            'type': 'group',
+            'group': index,
+            'hash': duplicate_group['hash'],
+            'size': duplicate_group['size'],
+            'keep': keep_path,
+            'files': [{'path': f['path'], 'last_modified': f['last_modified'], 'inode': f.get('inode')}
+                      for f in duplicate_group['files']]
+        }) + '\n')
+
+    def _write_footer(self):
+        self._file.write(json.dumps({'type': 'summary', **self.summary()}) + '\n')
+
+
+def _write_varint(buf: bytearray, value: int):
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _read_varint(f: BinaryIO) -> int:
+    value = shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise EOFError("Truncated duplicate report")
+        value |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+
+class BinaryReportWriter(ReportWriter):
+    """
+    Compact binary report
+
+    Layout: MAGIC, then one record per group and an end record.
+      group:  0x01, varint size, u8 hash length, hash bytes,
+              varint file count, varint index of the kept file,
+              per file: varint shared prefix with the previous path,
+              varint suffix length, UTF-8 suffix, f64 last_modified
+      end:    0x00, varint groups, varint files, varint potential savings
+    Paths are front-coded against the previous path in the stream, which
+    removes most of their bytes since neighbours share directories.
+    Read it back with iter_binary_report.
+    """
+
+    binary = True
+    MAGIC = b'DXDUP\x00\x01\n'
+
+    def _write_header(self):
+        self._file.write(self.MAGIC)
+        self._previous_path = b''
+
+    def _write_group(self, index: int, duplicate_group: Dict, keep_path: str):
+        files = duplicate_group['files']
+        hash_bytes = bytes.fromhex(duplicate_group['hash'])
+        keep_index = next((i for i, f in enumerate(files) if f['path'] == keep_path), 0)
+
+        buf = bytearray(b'\x01')
+        _write_varint(buf, duplicate_group['size'])
+        buf.append(len(hash_bytes))
+        buf += hash_bytes
+        _write_varint(buf, len(files))
+        _write_varint(buf, keep_index)
+
+        previous = self._previous_path
+        for file_info in files:
+            path = os.fsencode(file_info['path'])
+            shared = 0
+            limit = min(len(path), len(previous))
+            while shared < limit and path[shared] == previous[shared]:
+                shared += 1
+            _write_varint(buf, shared)
+            _write_varint(buf, len(path) - shared)
+            buf += path[shared:]
+            buf += struct.pack('<d', file_info['last_modified'])
+            previous = path
+
+        self._previous_path = previous
+        self._file.write(buf)
+
+    def _write_footer(self):
+        buf = bytearray(b'\x00')
+        for value in (self.groups, self.files, self.savings):
+            _write_varint(buf, value)
+        self._file.write(buf)
+
+
+def iter_binary_report(input_path: str) -> Iterator[Dict]:
+    """
+    Read a binary report one group at a time
+
+    Yields:
+        Group dicts with hash, size, keep and files (path, last_modified),
+        then a final {'type': 'summary', ...} dict
+    """
+    with open(input_path, 'rb') as f:
+        if f.read(len(BinaryReportWriter.MAGIC)) != BinaryReportWriter.MAGIC:
+            raise ValueError(f"Not a duplicate report: {input_path}")
+
+        previous = b''
+        index = 0
+        while True:
+            tag = f.read(1)
+            if tag == b'\x00':
+                yield {'type': 'summary', 'groups': _read_varint(f), 'files': _read_varint(f),
+                       'potential_savings': _read_varint(f)}
+                return
+            if tag != b'\x01':
+                raise EOFError("Truncated duplicate report")
+
+            size = _read_varint(f)
+            group_hash = f.read(f.read(1)[0]).hex()
+            file_count = _read_varint(f)
+            keep_index = _read_varint(f)
+
+            files = []
+            for _ in range(file_count):
+                shared = _read_varint(f)
+                previous = previous[:shared] + f.read(_read_varint(f))
+                last_modified, = struct.unpack('<d', f.read(8))
+                files.append({'path': os.fsdecode(previous), 'last_modified': last_modified})
+
+            yield {'type': 'group', 'group': index, 'hash': group_hash, 'size': size,
+                   'keep': files[keep_index]['path'] if files else None, 'files': files}
+            index += 1
+
+
+def open_report_writer(output_path: str, fmt: Optional[str] = None) -> ReportWriter:
+    """
+    Create a writer for a format, taken from the file extension if not given
+
+    Raises:
+        ValueError: For unknown formats
+    """
+    fmt = fmt or os.path.splitext(output_path)[1].lstrip('.').lower()
+    writers = {'csv': CsvReportWriter, 'jsonl': JsonlReportWriter, 'bin': BinaryReportWriter}
+    if fmt not in writers:
+        raise ValueError(f"Unknown report format '{fmt}', expected one of {', '.join(REPORT_FORMATS)}")
+    return writers[fmt](output_path)
@@ -0,0 +1,126 @@
+import os
+import gzip
+import hashlib
+import json
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+DEFAULT_CHECKPOINT_PATH = '~/.local/share/dexter_optimizer/duplicate_scan.ckpt'
+
+# Checkpoints older than this are ignored; the tree has likely changed since
+DEFAULT_MAX_AGE = 24 * 3600
+
+
+class ScanCheckpoint:
+    """
+    Periodic on-disk snapshot of a duplicate scan, for resuming it
+
+    The snapshot holds the walk: every file found so far, grouped by inode
+    with its size, and the directories whose files are all recorded, with
+    their mtimes so directories changed since can be listed again.
+    Completed hashes are not copied here; they live in the persistent
+    hash cache, which is flushed at every checkpoint. A checkpoint only
+    resumes a scan with the same roots and walk options, and only within
+    max_age seconds of being saved.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_PATH, scan_options: Optional[Dict] = None,
+                 interval: float = 60.0, max_age: float = DEFAULT_MAX_AGE):
+        """
+        Args:
+            path: Checkpoint file
+            scan_options: Everything that decides which files the walk finds
+            interval: Minimum seconds between checkpoints
+            max_age: Seconds after which a saved checkpoint is ignored
+        """
+        self.path = os.path.expanduser(path)
+        self.interval = interval
+        self.max_age = max_age
+        self.fingerprint = hashlib.sha1(
+            json.dumps(scan_options or {}, sort_keys=True, default=sorted).encode('utf-8')
+        ).hexdigest()
+        self._last = time.monotonic()
+
+    def due(self) -> bool:
+        """Whether the interval has passed since the last checkpoint"""
+        return time.monotonic() - self._last >= self.interval
+
+    def mark(self):
+        """Restart the interval"""
+        self._last = time.monotonic()
+
+    def save(self, size_groups: Dict[int, list], inode_links: Dict, done_dirs: Dict[str, int],
+             walk_complete: bool, files_scanned: int = 0):
+        """Write the walk state atomically; done_dirs maps directories to their mtime_ns"""
+        sizes = {file_path: size for size, file_paths in size_groups.items() for file_path in file_paths}
+        state = {
+            'version': self.VERSION,
+            'fingerprint': self.fingerprint,
+            'saved': time.time(),
+            'walk_complete': walk_complete,
+            'files_scanned': files_scanned,
+            'done_dirs': done_dirs,
+            # [inode key, size, paths] in walk order; size groups are rebuilt from it
+            'inodes': [[list(key) if isinstance(key, tuple) else key, sizes[paths[0]], paths]
+                       for key, paths in inode_links.items() if paths[0] in sizes]
+        }
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        try:
+            with gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=1) as f:
+                json.dump(state, f)
+            with open(temp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Error writing scan checkpoint: {e}")
+        self.mark()
+
+    def load(self) -> Optional[Dict]:
+        """
+        Read the walk state of a matching earlier scan
+
+        Returns:
+            Dict with size_groups, inode_links, done_dirs (directory to
+            mtime_ns), walk_complete and files_scanned, or None if there is
+            no usable checkpoint
+        """
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError, EOFError):
+            return None
+
+        if state.get('version') != self.VERSION or state.get('fingerprint') != self.fingerprint:
+            return None
+        if not 0 <= time.time() - state.get('saved', 0) <= self.max_age:
+            return None
+
+        size_groups = defaultdict(list)
+        inode_links = {}
+        for key, size, paths in state['inodes']:
+            inode_links[tuple(key) if isinstance(key, list) else key] = paths
+            size_groups[size].append(paths[0])
+
+        return {
+            'size_groups': size_groups,
+            'inode_links': inode_links,
+            'done_dirs': state['done_dirs'],
+            'walk_complete': state['walk_complete'],
+            'files_scanned': state.get('files_scanned', 0)
+        }
+
+    def clear(self):
+        """Remove the checkpoint once its scan has finished"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing scan checkpoint: {e}")
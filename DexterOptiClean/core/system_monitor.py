@@ -1,15 +1,142 @@
 import os
 import time
 import platform
+import queue
 import subprocess
+import threading
 import psutil
 from typing import Dict, Optional
+from core.cgroup_stats import CgroupStats
+from core.metrics_history import MetricsHistory
 
 class SystemMonitor:
     """System monitoring and statistics"""
     
-    def __init__(self):
+    def __init__(self, sample_interval: float = 1.0):
         self.platform = platform.system().lower()
+        self.sample_interval = sample_interval
+        # Inside a cgroup v2 (e.g. a container) usage is reported against its limits
+        self.cgroup = CgroupStats.detect() if self.platform == 'linux' else None
+        self._snapshot = {}
+        self.history = MetricsHistory()
+        self._sampler = None
+        self._stop_sampler = threading.Event()
+        self._io_lock = threading.Lock()
+        self._io_previous = {}  # kind -> (monotonic time, per-device counters)
+        self._io_rates = {'disk_io': {}, 'network_io': {}}
+        self._subscribers = set()
+        self._subscribers_lock = threading.Lock()
+        self._process_lock = threading.Lock()
+        self._process_previous = {}  # pid -> (create_time, cpu seconds, read bytes, write bytes)
+        self._process_sample = None  # (monotonic time, elapsed, rows)
+    
+    def start_sampler(self, interval: Optional[float] = None):
+        """
+        Start a background thread that refreshes the shared snapshot
+        
+        Every reader of get_snapshot gets the same sample, so requests no
+        longer pay for measuring. CPU usage is the average over the whole
+        sampling interval. Calling this again only changes the interval.
+        
+        Args:
+            interval: Seconds between samples
+        """
+        if interval:
+            self.sample_interval = interval
+        if self._sampler and self._sampler.is_alive():
+            return
+        
+        self._stop_sampler.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name='system-sampler', daemon=True)
+        self._sampler.start()
+    
+    def stop_sampler(self):
+        """Stop the background sampler after its current sample"""
+        self._stop_sampler.set()
+        if self._sampler:
+            self._sampler.join(timeout=5)
+            self._sampler = None
+    
+    def _sample_loop(self):
+        psutil.cpu_percent(interval=None)  # Start the first measuring interval
+        while not self._stop_sampler.wait(self.sample_interval):
+            try:
+                snapshot = self._collect_stats()
+                self._snapshot = snapshot
+                self.history.add(snapshot)
+                self._publish(snapshot)
+            except Exception as e:
+                print(f"Error sampling system stats: {e}")
+    
+    def subscribe(self) -> queue.Queue:
+        """
+        Receive every new snapshot from the background sampler
+        
+        Each subscriber gets a queue holding at most the newest snapshot;
+        a slow reader skips samples instead of making the sampler wait or
+        the queue grow. Starts the sampler if needed.
+        
+        Returns:
+            Queue to read snapshots from; pass it to unsubscribe when done
+        """
+        subscriber = queue.Queue(maxsize=1)
+        with self._subscribers_lock:
+            self._subscribers.add(subscriber)
+        self.start_sampler()
+        return subscriber
+    
+    def unsubscribe(self, subscriber: queue.Queue):
+        """Stop sending snapshots to a queue from subscribe"""
+        with self._subscribers_lock:
+            self._subscribers.discard(subscriber)
+    
+    def _publish(self, snapshot: Dict):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.get_nowait()  # Drop a sample the reader has not taken yet
+            except queue.Empty:
+                pass
+            try:
+                subscriber.put_nowait(snapshot)
+            except queue.Full:
+                pass
+    
+    def _collect_stats(self) -> Dict:
+        """Gather one sample without blocking; CPU covers the time since the last call"""
+        cgroup = self.cgroup.refresh() if self.cgroup else None
+        stats = {
+            'cpu_usage': self.get_cpu_usage(interval=None),
+            'memory_usage': self.get_memory_usage(),
+            'temperature': self.get_temperature(),
+            'uptime': self.get_uptime(),
+            'load_average': self.get_load_average()
+        }
+        stats.update(self.get_root_disk_usage())
+        stats.update(self.get_io_rates(refresh=True))
+        if cgroup:
+            stats['cgroup'] = cgroup
+        stats['timestamp'] = time.time()
+        return stats
+    
+    def get_snapshot(self) -> Dict:
+        """
+        Latest sample from the background sampler
+        
+        Starts the sampler on first use; until its first sample is ready a
+        non-blocking sample is taken directly.
+        
+        Returns:
+            Dictionary with the get_system_stats keys plus 'timestamp'
+        """
+        snapshot = self._snapshot
+        if snapshot:
+            return snapshot
+        
+        self.start_sampler()
+        self._snapshot = snapshot = self._collect_stats()
+        return snapshot
     
     def get_system_stats(self) -> Dict:
         """Get comprehensive system statistics"""
@@ -26,13 +153,30 @@ class SystemMonitor:
         
         return stats
     
-    def get_cpu_usage(self) -> float:
-        """Get current CPU usage percentage with improved accuracy"""
+    def get_cpu_usage(self, interval: Optional[float] = 0.1) -> float:
+        """
+        Get current CPU usage percentage with improved accuracy
+        
+        Args:
+            interval: Seconds per measurement, or None to return usage since
+                the previous call without blocking
+        """
         try:
+            if self.cgroup and self.cgroup.cpu_limit():
+                # Relative to the container's CPU quota rather than the host
+                if interval is not None:
+                    return self.cgroup.measure_cpu_percent(interval * 3)
+                cgroup = self.cgroup.stats or self.cgroup.refresh()
+                if cgroup['cpu']['percent'] is not None:
+                    return cgroup['cpu']['percent']
+            
+            if interval is None:
+                return psutil.cpu_percent(interval=None)
+            
             # Take multiple samples for better accuracy
             samples = []
             for _ in range(3):
-                samples.append(psutil.cpu_percent(interval=0.1))
+                samples.append(psutil.cpu_percent(interval=interval))
             
             # Return the average of samples
             return sum(samples) / len(samples)
@@ -43,6 +187,12 @@ class SystemMonitor:
     def get_memory_usage(self) -> float:
         """Get current memory usage percentage with detailed information"""
         try:
+            if self.cgroup:
+                # Relative to the container's memory limit, if it has one
+                percent = self.cgroup.memory()['percent']
+                if percent is not None:
+                    return percent
+            
             mem = psutil.virtual_memory()
             
             # Calculate actual used memory (excluding cached/buffers on Linux)
@@ -97,6 +247,17 @@ class SystemMonitor:
                 print(f"Error getting total space: {e2}")
                 return 0
     
+    def get_root_disk_usage(self) -> Dict:
+        """Disk usage, free and total space of the root partition from one call"""
+        for root in ('/', 'C:\\'):
+            try:
+                usage = psutil.disk_usage(root)
+                return {'disk_usage': usage.percent, 'free_space': usage.free, 'total_space': usage.total}
+            except Exception:
+                continue
+        print("Error getting disk usage: no root partition")
+        return {'disk_usage': 0.0, 'free_space': 0, 'total_space': 0}
+    
     def get_temperature(self) -> Optional[float]:
         """Get system temperature if available"""
         try:
@@ -151,6 +312,101 @@ class SystemMonitor:
             print(f"Error getting process count: {e}")
             return 0
     
+    PROCESS_ATTRS = ['pid', 'name', 'username', 'create_time', 'cpu_times', 'memory_info', 'io_counters']
+    PROCESS_SORT_KEYS = {
+        'cpu': lambda row: row['cpu_percent'],
+        'memory': lambda row: row['memory_rss'],
+        'io': lambda row: row['read_bytes_per_sec'] + row['write_bytes_per_sec']
+    }
+    
+    def get_top_processes(self, limit: int = 10, sort_by: str = 'cpu', max_age: float = 2.0) -> Dict:
+        """
+        Get the processes using the most CPU, memory or disk I/O
+        
+        One pass over process_iter reads a fixed attribute set per process
+        (psutil batches those reads like oneshot), and CPU and I/O rates
+        are deltas against the previous pass. A pass is reused by every
+        caller for max_age seconds, so polling clients do not multiply the
+        work on hosts with thousands of processes. The first pass has no
+        previous values and reports zero rates.
+        
+        Args:
+            limit: Number of processes to return
+            sort_by: 'cpu', 'memory' or 'io'
+            max_age: Seconds a pass is reused
+        
+        Returns:
+            Dictionary with the top 'processes', 'total' process count,
+            'interval' the rates cover (None on the first pass) and 'sort_by'
+        
+        Raises:
+            ValueError: For an unknown sort_by
+        """
+        if sort_by not in self.PROCESS_SORT_KEYS:
+            raise ValueError(f"Unknown sort '{sort_by}', expected one of {', '.join(self.PROCESS_SORT_KEYS)}")
+        
+        with self._process_lock:
+            now = time.monotonic()
+            if self._process_sample is None or now - self._process_sample[0] >= max_age:
+                self._process_sample = self._sample_processes(now)
+            _, elapsed, rows = self._process_sample
+        
+        return {
+            'processes': sorted(rows, key=self.PROCESS_SORT_KEYS[sort_by], reverse=True)[:limit],
+            'total': len(rows),
+            'interval': elapsed,
+            'sort_by': sort_by
+        }
+    
+    def _sample_processes(self, now: float) -> tuple:
+        """One pass over all processes; rates are relative to the previous pass"""
+        elapsed = now - self._process_sample[0] if self._process_sample else None
+        try:
+            total_memory = psutil.virtual_memory().total or 1
+        except Exception:
+            total_memory = 1
+        
+        previous = self._process_previous
+        current = {}
+        rows = []
+        try:
+            processes = psutil.process_iter(self.PROCESS_ATTRS, ad_value=None)
+            for process in processes:
+                info = process.info
+                cpu_times = info['cpu_times']
+                memory = info['memory_info']
+                io = info['io_counters']
+                cpu_seconds = cpu_times.user + cpu_times.system if cpu_times else 0.0
+                read_bytes = io.read_bytes if io else 0
+                write_bytes = io.write_bytes if io else 0
+                current[info['pid']] = (info['create_time'], cpu_seconds, read_bytes, write_bytes)
+                
+                cpu_percent = read_rate = write_rate = 0.0
+                before = previous.get(info['pid'])
+                # Same pid and start time: the same process, not a reused pid
+                if elapsed and before and before[0] == info['create_time']:
+                    cpu_percent = max(cpu_seconds - before[1], 0.0) / elapsed * 100
+                    read_rate = max(read_bytes - before[2], 0) / elapsed
+                    write_rate = max(write_bytes - before[3], 0) / elapsed
+                
+                rss = memory.rss if memory else 0
+                rows.append({
+                    'pid': info['pid'],
+                    'name': info['name'] or '',
+                    'username': info['username'],
+                    'cpu_percent': cpu_percent,
+                    'memory_rss': rss,
+                    'memory_percent': rss / total_memory * 100,
+                    'read_bytes_per_sec': read_rate,
+                    'write_bytes_per_sec': write_rate,
+                    'io_available': io is not None
+                })
+        except Exception as e:
+            print(f"Error listing processes: {e}")
+        
+        self._process_previous = current  # Exited processes drop out here
+        return now, elapsed, rows
+    
     def get_disk_io_stats(self) -> Dict:
         """Get disk I/O statistics"""
         try:
@@ -161,4 +417,147 @@ class SystemMonitor:
             }
         except Exception as e:
             print(f"Error getting disk I/O stats: {e}")
-            return {'bytes_read': 0, 'bytes_written': 0}
\ No newline at end of file
+            return {'bytes_read': 0, 'bytes_written': 0}
+    
+    def get_io_rates(self, refresh: bool = False) -> Dict:
+        """
+        Get per-device disk and per-interface network throughput
+        
+        Rates are the counter deltas since the previous refresh divided by
+        the time between them; the first refresh has nothing to compare
+        with and returns empty dicts. While the background sampler runs it
+        refreshes every interval and callers should read without refresh.
+        
+        Args:
+            refresh: Read the counters now instead of returning the rates
+                of the last refresh
+        
+        Returns:
+            Dictionary with 'disk_io' (device -> read/write bytes per second,
+            IOPS, average wait, queue depth and busy percent) and
+            'network_io' (interface -> bytes, packets, errors and drops per
+            second)
+        """
+        if not refresh:
+            with self._io_lock:
+                return dict(self._io_rates)
+        
+        try:
+            disks = psutil.disk_io_counters(perdisk=True) or {}
+        except Exception as e:
+            print(f"Error getting disk I/O counters: {e}")
+            disks = {}
+        try:
+            nics = psutil.net_io_counters(pernic=True) or {}
+        except Exception as e:
+            print(f"Error getting network I/O counters: {e}")
+            nics = {}
+        
+        now = time.monotonic()
+        with self._io_lock:
+            self._io_rates = {
+                'disk_io': self._rates('disk_io', now, disks, self._disk_rates),
+                'network_io': self._rates('network_io', now, nics, self._network_rates)
+            }
+            return dict(self._io_rates)
+    
+    def _rates(self, kind: str, now: float, counters: Dict, compute) -> Dict:
+        """Compare counters with the previous sample of the same kind and keep them for the next"""
+        previous_time, previous = self._io_previous.get(kind, (None, {}))
+        self._io_previous[kind] = (now, counters)
+        if previous_time is None or now <= previous_time:
+            return {}
+        
+        elapsed = now - previous_time
+        rates = {}
+        for name, current in counters.items():
+            before = previous.get(name)
+            if before is not None:
+                rates[name] = compute(before, current, elapsed)
+        return rates
+    
+    @staticmethod
+    def _delta(before, current, field: str) -> float:
+        """Counter increase, treating counters that went backwards as reset"""
+        return max(getattr(current, field, 0) - getattr(before, field, 0), 0)
+    
+    def _disk_rates(self, before, current, elapsed: float) -> Dict:
+        reads = self._delta(before, current, 'read_count')
+        writes = self._delta(before, current, 'write_count')
+        io_time_ms = self._delta(before, current, 'read_time') + self._delta(before, current, 'write_time')
+        rates = {
+            'read_bytes_per_sec': self._delta(before, current, 'read_bytes') / elapsed,
+            'write_bytes_per_sec': self._delta(before, current, 'write_bytes') / elapsed,
+            'read_iops': reads / elapsed,
+            'write_iops': writes / elapsed,
+            'await_ms': io_time_ms / (reads + writes) if reads + writes else 0.0,
+            'queue_depth': io_time_ms / (elapsed * 1000)  # Average requests in flight
+        }
+        if hasattr(current, 'busy_time'):  # Linux and FreeBSD only
+            rates['busy_percent'] = min(self._delta(before, current, 'busy_time') / (elapsed * 10), 100.0)
+        return rates
+    
+    def _network_rates(self, before, current, elapsed: float) -> Dict:
+        return {
+            'bytes_received_per_sec': self._delta(before, current, 'bytes_recv') / elapsed,
+            'bytes_sent_per_sec': self._delta(before, current, 'bytes_sent') / elapsed,
+            'packets_received_per_sec': self._delta(before, current, 'packets_recv') / elapsed,
+            'packets_sent_per_sec': self._delta(before, current, 'packets_sent') / elapsed,
+            'errors_per_sec': (self._delta(before, current, 'errin') + self._delta(before, current, 'errout')) / elapsed,
+            'drops_per_sec': (self._delta(before, current, 'dropin') + self._delta(before, current, 'dropout')) / elapsed
+        }
+    
+    def get_device_for_path(self, path: str) -> Optional[str]:
+        """
+        Get the disk device name holding a path, as used in disk_io rates
+        
+        Args:
+            path: Any file or directory
+        
+        Returns:
+            Device name such as 'sda1' or 'nvme0n1p2', or None if the
+            path's partition is not a block device
+        """
+        try:
+            path = os.path.realpath(path)
+            best = None
+            for partition in psutil.disk_partitions(all=False):
+                mountpoint = partition.mountpoint
+                if path == mountpoint or path.startswith(mountpoint.rstrip(os.sep) + os.sep):
+                    if best is None or len(mountpoint) > len(best.mountpoint):
+                        best = partition
+            if best is None or not best.device:
+                return None
+            return os.path.basename(os.path.realpath(best.device)) if best.device.startswith('/dev/') else best.device
+        except Exception as e:
+            print(f"Error finding device for {path}: {e}")
+            return None
+    
+    def get_path_io_rates(self, path: str) -> Optional[Dict]:
+        """
+        Get the current disk rates of the device a path lives on
+        
+        Lets long scans and cleans check whether they are saturating the
+        disk they work on, e.g. busy_percent close to 100.
+        
+        Returns:
+            The device's disk_io rates plus its 'device' name, or None if
+            unknown or not sampled yet
+        """
+        device = self.get_device_for_path(path)
+        if device is None:
+            return None
+        rates = self.get_io_rates()['disk_io'].get(device)
+        if not rates:
+            return None
+        rates = dict(rates, device=device)
+        
+        # The cgroup's own traffic and io.max limits for the whole disk, if any
+        if self.cgroup and self.cgroup.stats:
+            disk = device.rstrip('0123456789')
+            if disk.endswith('p') and disk[:-1][-1:].isdigit():  # nvme0n1p2 -> nvme0n1
+                disk = disk[:-1]
+            cgroup_io = self.cgroup.stats['io'].get(device) or self.cgroup.stats['io'].get(disk)
+            if cgroup_io:
+                rates['cgroup'] = cgroup_io
+        return rates
@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import psutil
+
+# Writers kept per root; the longest idle are dropped beyond this
+MAX_WRITERS_PER_ROOT = 200
+
+
+class DiskWriterTracker:
+    """
+    Attribute process disk writes to the directories the cleaner empties
+
+    Each sample reads every process's cumulative write bytes in one
+    process_iter pass. Only processes that wrote since the previous
+    sample have their open files and working directory inspected, which
+    is the expensive part, so an idle machine costs one pass per
+    interval. A process's new bytes are split between the roots its open
+    files live under, or charged to the root of its working directory if
+    none are.
+
+    The attribution is a heuristic: bytes written to files that were
+    closed between samples, or written elsewhere by a process that also
+    holds a file under a root, are charged by what is open at sample time.
+    """
+
+    def __init__(self, roots: Dict[str, List[str]], interval: float = 10.0):
+        """
+        Args:
+            roots: Category name to directories, e.g. from
+                PCCleaner.get_category_roots
+            interval: Seconds between samples
+        """
+        self.interval = interval
+        by_path = {}
+        for category, paths in roots.items():
+            for path in paths:
+                by_path.setdefault(os.path.realpath(os.path.expanduser(path)), []).append(category)
+        # (real root path, categories), most specific first
+        self._roots = sorted(by_path.items(), key=lambda item: len(item[0]), reverse=True)
+
+        self._previous = {}  # pid -> (create_time, write bytes)
+        self._totals = {root: {} for root, _ in self._roots}  # root -> name -> writer stats
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.started = None
+        self.samples = 0
+
+    def start(self):
+        """Sample in a background thread until stop is called"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name='disk-writer-tracker', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        self.sample()  # Baseline counters; nothing is charged for writes before start
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Error sampling disk writers: {e}")
+
+    def _root_for(self, path: str) -> Optional[str]:
+        for root, _ in self._roots:
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return root
+        return None
+
+    def sample(self):
+        """Charge the writes since the previous sample to the roots being written"""
+        current = {}
+        writers = []
+        for process in psutil.process_iter(['pid', 'name', 'create_time', 'io_counters'], ad_value=None):
+            info = process.info
+            io = info['io_counters']
+            if io is None:  # Exited, not permitted, or no per-process I/O on this platform
+                continue
+            current[info['pid']] = (info['create_time'], io.write_bytes)
+            before = self._previous.get(info['pid'])
+            if before and before[0] == info['create_time'] and io.write_bytes > before[1]:
+                writers.append((process, info['name'] or '', io.write_bytes - before[1]))
+        self._previous = current
+
+        charges = []
+        for process, name, written in writers:
+            try:
+                roots = {self._root_for(f.path) for f in process.open_files()}
+                roots.discard(None)
+                if not roots:
+                    cwd_root = self._root_for(process.cwd())
+                    roots = {cwd_root} if cwd_root else set()
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess, OSError):
+                continue
+            for root in roots:
+                charges.append((root, name, process.pid, written / len(roots)))
+
+        now = time.time()
+        with self._lock:
+            for root, name, pid, written in charges:
+                writers_by_name = self._totals[root]
+                stats = writers_by_name.get(name)
+                if stats is None:
+                    if len(writers_by_name) >= MAX_WRITERS_PER_ROOT:
+                        # Make room before inserting, dropping the writer idle the longest,
+                        # so a new heavy writer is kept rather than evicted at once
+                        idle = min(writers_by_name.values(), key=lambda s: (s['last_seen'], s['bytes_written']))
+                        del writers_by_name[idle['name']]
+                    stats = writers_by_name[name] = {'name': name, 'bytes_written': 0.0, 'samples': 0,
+                                                     'last_pid': pid, 'last_seen': now}
+                stats['bytes_written'] += written
+                stats['samples'] += 1
+                stats['last_pid'] = pid
+                stats['last_seen'] = now
+            self.samples += 1
+
+    def get_report(self, limit: int = 10) -> Dict:
+        """
+        Rank who has been writing into each root since start
+
+        Args:
+            limit: Writers listed per root
+
+        Returns:
+            Dictionary with 'roots' (path, categories, total bytes written
+            and the top 'writers' by bytes) for roots that were written to,
+            ordered by bytes written, plus 'since', 'samples' and 'interval'
+        """
+        with self._lock:
+            roots = []
+            for root, categories in self._roots:
+                if not self._totals[root]:
+                    continue
+                writers = sorted(self._totals[root].values(), key=lambda s: s['bytes_written'], reverse=True)
+                roots.append({
+                    'path': root,
+                    'categories': categories,
+                    'bytes_written': int(sum(s['bytes_written'] for s in writers)),
+                    'writers': [dict(s, bytes_written=int(s['bytes_written'])) for s in writers[:limit]]
+                })
+            samples = self.samples
+
+        roots.sort(key=lambda r: r['bytes_written'], reverse=True)
+        return {'roots': roots, 'since': self.started, 'samples': samples, 'interval': self.interval}
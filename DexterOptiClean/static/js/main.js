@@ -53,6 +53,7 @@ class DexterOptimizer {
 
         // Duplicate finder
         document.getElementById('find-duplicates-btn').addEventListener('click', () => this.findDuplicates());
+        document.getElementById('cancel-duplicates-btn').addEventListener('click', () => this.cancelDuplicateSearch());
 
         // Settings
         document.getElementById('sound-toggle').addEventListener('change', (e) => {
@@ -443,7 +444,7 @@ class DexterOptimizer {
     }
 
     async findDuplicates() {
-        const directory = document.getElementById('scan-directory').value || '/';
+        const directory = document.getElementById('scan-directory').value || '~';
         document.getElementById('find-duplicates-btn').disabled = true;
         document.getElementById('find-duplicates-btn').innerHTML = '<i class="fas fa-spinner fa-spin"></i> Scanning...';
 
@@ -461,28 +462,103 @@ class DexterOptimizer {
             const result = await response.json();
 
             if (result.success) {
-                this.displayDuplicateResults(result.data);
+                this.duplicateGroups = [];
+                document.getElementById('cancel-duplicates-btn').classList.remove('d-none');
+                this.monitorDuplicateSearch();
             } else {
                 this.showError('Duplicate scan failed: ' + result.error);
+                this.resetDuplicateUI();
             }
         } catch (error) {
             this.showError('Network error: ' + error.message);
-        } finally {
-            document.getElementById('find-duplicates-btn').disabled = false;
-            document.getElementById('find-duplicates-btn').innerHTML = '<i class="fas fa-search"></i> Find Duplicates';
+            this.resetDuplicateUI();
         }
     }
 
+    monitorDuplicateSearch() {
+        const poll = async () => {
+            try {
+                const response = await fetch(`/api/duplicate-progress?since=${this.duplicateGroups.length}`);
+                const result = await response.json();
+
+                if (!result.success) {
+                    throw new Error(result.error);
+                }
+
+                const data = result.data;
+                this.duplicateGroups.push(...data.duplicates);
+                this.displayDuplicateResults({
+                    duplicates: this.duplicateGroups,
+                    total_groups: data.total_groups,
+                    potential_savings: data.potential_savings,
+                    progress: data.progress,
+                    status: data.status
+                });
+
+                if (data.status === 'scanning') {
+                    setTimeout(poll, 1000);
+                    return;
+                }
+
+                if (data.status === 'error') {
+                    this.showError('Duplicate scan failed: ' + (data.error || 'Unknown error'));
+                }
+            } catch (error) {
+                this.showError('Failed to get duplicate scan progress: ' + error.message);
+            }
+
+            this.resetDuplicateUI();
+        };
+
+        poll();
+    }
+
+    async cancelDuplicateSearch() {
+        try {
+            await fetch('/api/cancel-duplicates', { method: 'POST' });
+        } catch (error) {
+            this.showError('Network error: ' + error.message);
+        }
+    }
+
+    resetDuplicateUI() {
+        document.getElementById('cancel-duplicates-btn').classList.add('d-none');
+        document.getElementById('find-duplicates-btn').disabled = false;
+        document.getElementById('find-duplicates-btn').innerHTML = '<i class="fas fa-search"></i> Find Duplicates';
+    }
+
+    formatDuplicateProgress(data) {
+        const progress = data.progress || {};
+
+        if (progress.stage === 'walking') {
+            return `Scanning files... ${progress.files_scanned || 0} found`;
+        }
+
+        if (data.status === 'scanning') {
+            const percent = progress.bytes_total ? Math.floor(progress.bytes_done / progress.bytes_total * 100) : 0;
+            return `Comparing candidates... ${progress.files_done || 0}/${progress.files_total || 0} files ` +
+                `(${this.formatFileSize(progress.bytes_done || 0)} of ${this.formatFileSize(progress.bytes_total || 0)}, ${percent}%)`;
+        }
+
+        return data.status === 'cancelled' ? 'Search cancelled' : '';
+    }
+
     displayDuplicateResults(data) {
         const container = document.getElementById('duplicates-results');
         container.classList.remove('d-none');
-        
+
+        const progressText = data.status ? this.formatDuplicateProgress(data) : '';
+        let html = progressText ? `<p class="text-muted">${progressText}</p>` : '';
+
         if (data.duplicates.length === 0) {
-            container.innerHTML = '<p class="text-center text-muted">No duplicate files found.</p>';
+            if (data.status !== 'scanning') {
+                html += '<p class="text-center text-muted">No duplicate files found.</p>';
+            }
+            container.innerHTML = html;
             return;
         }
 
-        let html = `<h5>Found ${data.total_groups} duplicate groups</h5>`;
+        html += `<h5>Found ${data.total_groups} duplicate groups</h5>`;
         html += `<p>Potential space savings: ${this.formatFileSize(data.potential_savings)}</p>`;
         html += '<div class="duplicate-groups">';
 
@@ -534,16 +610,35 @@ class DexterOptimizer {
     }
 
     startSystemMonitoring() {
-        // Update system stats every 5 seconds
-        setInterval(() => {
+        if (this.statsStream || this.statsPollTimer) {
+            return;
+        }
+
+        if (!window.EventSource) {
+            // No server-sent events: fall back to a single polling loop
+            this.statsPollTimer = setInterval(() => this.updateSystemStats(), 5000);
             this.updateSystemStats();
-        }, 5000);
+            return;
+        }
 
-        // Initial update
-        this.updateSystemStats();
+        // The server pushes a full snapshot, then only the fields that changed;
+        // EventSource reconnects by itself and gets a fresh snapshot
+        this.statsStream = new EventSource('/api/system-stream');
+        this.statsStream.addEventListener('snapshot', (event) => {
+            this.systemStats = JSON.parse(event.data);
+            this.updateSystemDashboard();
+        });
+        this.statsStream.addEventListener('delta', (event) => {
+            Object.assign(this.systemStats, JSON.parse(event.data));
+            this.updateSystemDashboard();
+        });
+        this.statsStream.onerror = () => {
+            console.error('System stats stream interrupted, reconnecting');
+        };
     }
 
     async updateSystemStats() {
+        // One-off refresh, e.g. right after cleaning; the stream keeps it current
         try {
             const response = await fetch('/api/system-status');
             const result = await response.json();
@@ -551,19 +646,9 @@ class DexterOptimizer {
             if (result.success) {
                 this.systemStats = result.data;
                 this.updateSystemDashboard();
-                
-                // Update more frequently when system is under load
-                const updateInterval = this.systemStats.cpu_usage > 70 ? 2000 : 5000;
-                
-                // Schedule next update
-                clearTimeout(this.statsUpdateTimer);
-                this.statsUpdateTimer = setTimeout(() => this.updateSystemStats(), updateInterval);
             }
         } catch (error) {
             console.error('Failed to update system stats:', error);
-            // Retry after error with backoff
-            clearTimeout(this.statsUpdateTimer);
-            this.statsUpdateTimer = setTimeout(() => this.updateSystemStats(), 10000);
         }
     }
 
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+import cli
+from core.cleaner import PCCleaner
+
+
+@pytest.fixture
+def scanned(monkeypatch):
+    """Record the categories scanned instead of walking the real system"""
+    categories = []
+
+    def scan_category(self, category):
+        categories.append(category)
+        return iter([])
+
+    monkeypatch.setattr(PCCleaner, 'scan_category', scan_category)
+    return categories
+
+
+@pytest.mark.parametrize('argv', [['scan'], ['clean', '--dry-run']])
+def test_categories_default_to_basic(argv, scanned, capsys):
+    assert cli.main(['--json'] + argv) == 0
+    assert scanned == ['basic']
+    assert json.loads(capsys.readouterr().out.splitlines()[-1])['event'] == 'summary'
+
+
+def test_categories_given(scanned):
+    assert cli.main(['scan', 'browser', 'gaming']) == 0
+    assert scanned == ['browser', 'gaming']
+
+
+def test_unknown_category_rejected(scanned):
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(['scan', 'bogus'])
+    assert exit_info.value.code == 2
+    assert scanned == []
@@ -0,0 +1,40 @@
+from core.duplicate_finder import DuplicateFinder
+from core.duplicate_tree import DuplicateTree
+
+
+def file_info(path, size, inode):
+    return {'path': path, 'filename': path.rsplit('/', 1)[-1], 'size': size, 'inode': inode,
+            'last_modified': 0}
+
+
+def test_payload_group_wasted_matches_calculate_savings():
+    # Same audio with different tags: file sizes differ, the group size is the payload's
+    group = {
+        'hash': 'payload-hash',
+        'size': 1000,
+        'match': 'payload',
+        'files': [
+            file_info('/music/a/song.mp3', 1500, (1, 10)),
+            file_info('/music/b/song.mp3', 1700, (1, 11)),
+            file_info('/music/b/link.mp3', 1700, (1, 11)),  # Hardlink of the previous file
+            file_info('/music/c/song.mp3', 1200, (1, 12)),
+        ],
+        'hardlink_sets': [['/music/b/song.mp3', '/music/b/link.mp3']]
+    }
+    finder = DuplicateFinder(cache_path=None)
+    tree = finder.get_duplicate_tree([group])
+
+    summary = tree.get_summary()
+    assert summary['wasted_bytes'] == finder.calculate_savings([group]) == 2000
+    assert summary['duplicate_bytes'] == 1500 + 1700 + 1700 + 1200
+
+
+def test_wasted_excludes_kept_file():
+    group = {'hash': 'h', 'size': 100,
+             'files': [file_info('/x/a', 100, (1, 1)), file_info('/y/b', 100, (1, 2))]}
+    tree = DuplicateTree()
+    tree.add_group(group, keep_path='/y/b')
+
+    assert tree.get_summary()['wasted_bytes'] == 100
+    assert tree.get_node(tree.find('/x/a'))['wasted_bytes'] == 100
+    assert tree.get_node(tree.find('/y/b'))['wasted_bytes'] == 0
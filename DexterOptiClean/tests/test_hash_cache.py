@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from core.duplicate_finder import DuplicateFinder
+from core.hash_cache import HashCache
+
+
+@pytest.fixture
+def undecodable_file(tmp_path):
+    """A file whose name is not valid UTF-8, as os.walk returns it"""
+    path = os.fsdecode(os.path.join(os.fsencode(str(tmp_path)), b'\xff\xfe.txt'))
+    try:
+        with open(path, 'wb') as f:
+            f.write(b'same content\n' * 100)
+    except (OSError, UnicodeEncodeError):
+        pytest.skip("filesystem does not accept non-UTF-8 names")
+    return path
+
+
+def test_undecodable_path_is_persisted(tmp_path, undecodable_file):
+    db_path = str(tmp_path / 'cache.db')
+    key = HashCache.make_key('full:blake2b', os.stat(undecodable_file))
+
+    cache = HashCache(db_path, flush_every=1)
+    cache.put(key, undecodable_file, 'abc')
+    cache.put(HashCache.make_key('full:blake2b', os.stat(db_path)), db_path, 'def')  # Later writes still work
+    cache.close()
+
+    cache = HashCache(db_path)
+    assert cache.get(key) == 'abc'
+    assert cache.prune() == 1  # Only the database entry, which changed since
+    os.remove(undecodable_file)
+    assert cache.prune() == 1
+    assert cache.get_stats()['disk_entries'] == 0
+    cache.close()
+
+
+def test_failed_flush_does_not_block_later_writes(tmp_path):
+    cache = HashCache(str(tmp_path / 'cache.db'), flush_every=100)
+    cache.put(('full', 1, 1, 1, 1), 'a', 'x')
+    cache._pending[0] = cache._pending[0][:5] + ('\udcff',) + cache._pending[0][6:]  # Raises UnicodeEncodeError
+    cache.flush()
+    cache.put(('full', 1, 2, 1, 1), 'b', 'y')
+    cache.flush()
+    assert cache.get_stats()['pending_writes'] == 0
+    assert cache._db.execute("SELECT hash FROM hashes").fetchall() == [('y',)]
+    cache.close()
+
+
+def test_find_duplicates_with_undecodable_name(tmp_path, undecodable_file):
+    copy_path = str(tmp_path / 'copy.txt')
+    with open(undecodable_file, 'rb') as src, open(copy_path, 'wb') as dst:
+        dst.write(src.read())
+
+    finder = DuplicateFinder(cache_path=str(tmp_path / 'cache.db'))
+    groups = finder.find_duplicates(str(tmp_path), min_file_size=1)
+    finder.hash_cache.close()
+
+    assert len(groups) == 1
+    assert sorted(f['path'] for f in groups[0]['files']) == sorted([copy_path, undecodable_file])
@@ -0,0 +1,32 @@
+import os
+
+from core.privileged_helper import OPCODES, STATUS_NOT_ALLOWED, STATUS_OK, _Executor
+
+
+def test_directory_delete_reports_the_size_of_its_files(tmp_path):
+    root = tmp_path / 'cache'
+    (root / 'victim' / 'nested').mkdir(parents=True)
+    (root / 'victim' / 'a.bin').write_bytes(b'x' * 5000)
+    (root / 'victim' / 'nested' / 'b.bin').write_bytes(b'y' * 7000)
+    (tmp_path / 'outside.bin').write_bytes(b'z' * 9000)
+    os.symlink(tmp_path / 'outside.bin', root / 'victim' / 'nested' / 'link')
+    os.symlink(tmp_path, root / 'victim' / 'dir_link')
+
+    executor = _Executor([str(root)], os.getuid())
+    status, freed, _ = executor.run(OPCODES['delete'], os.fsencode(root / 'victim'), b'')
+
+    assert status == STATUS_OK
+    assert freed == 12000
+    assert not (root / 'victim').exists()
+    assert (tmp_path / 'outside.bin').read_bytes() == b'z' * 9000  # Symlinks removed, not followed
+
+
+def test_file_delete_and_outside_paths(tmp_path):
+    root = tmp_path / 'cache'
+    root.mkdir()
+    (root / 'file').write_bytes(b'x' * 123)
+    executor = _Executor([str(root)], os.getuid())
+
+    assert executor.run(OPCODES['delete'], os.fsencode(root / 'file'), b'')[:2] == (STATUS_OK, 123)
+    assert executor.run(OPCODES['delete'], os.fsencode(root / '..' / 'cache'), b'')[0] == STATUS_NOT_ALLOWED
+    assert executor.run(OPCODES['delete'], os.fsencode(root), b'')[0] == STATUS_NOT_ALLOWED
@@ -0,0 +1,46 @@
+import csv
+import json
+import os
+
+import pytest
+
+from core.report_writer import iter_binary_report, open_report_writer
+
+# A name that is not valid UTF-8, as os.walk returns it
+UNDECODABLE = os.fsdecode(b'/data/\xff\xfe.txt')
+
+
+def make_group():
+    return {
+        'hash': '00112233445566778899aabbccddeeff',
+        'size': 10,
+        'files': [
+            {'path': '/data/plain.txt', 'last_modified': 1.5, 'inode': (1, 2)},
+            {'path': UNDECODABLE, 'last_modified': 2.5, 'inode': (1, 3)},
+        ]
+    }
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl', 'bin'])
+def test_undecodable_path_round_trips(tmp_path, fmt):
+    output_path = str(tmp_path / f'report.{fmt}')
+    with open_report_writer(output_path) as writer:
+        writer.write_group(make_group(), UNDECODABLE, 10)
+        writer.write_group(make_group(), '/data/plain.txt', 10)
+
+    if fmt == 'csv':
+        with open(output_path, encoding='utf-8', errors='surrogateescape', newline='') as f:
+            paths = [row['path'] for row in csv.DictReader(f)]
+        with open(output_path, 'rb') as f:
+            assert b'/data/\xff\xfe.txt' in f.read()  # Original bytes, as the binary format keeps them
+    elif fmt == 'jsonl':
+        with open(output_path, encoding='utf-8', errors='surrogateescape') as f:
+            records = [json.loads(line) for line in f]
+        assert records[-1] == {'type': 'summary', 'groups': 2, 'files': 4, 'potential_savings': 20}
+        paths = [f['path'] for record in records[:-1] for f in record['files']]
+    else:
+        records = list(iter_binary_report(output_path))
+        assert records[0]['keep'] == UNDECODABLE
+        paths = [f['path'] for record in records[:-1] for f in record['files']]
+
+    assert paths == ['/data/plain.txt', UNDECODABLE] * 2
@@ -0,0 +1,55 @@
+import gzip
+import json
+import os
+import time
+
+from core.duplicate_finder import DuplicateFinder
+from core.scan_checkpoint import ScanCheckpoint
+
+
+def write(path, content=b'duplicate content\n' * 10):
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def make_tree(tmp_path):
+    root = tmp_path / 'tree'
+    (root / 'sub').mkdir(parents=True)
+    write(str(root / 'a.txt'))
+    write(str(root / 'sub' / 'b.txt'))
+    for directory in (root, root / 'sub'):
+        os.utime(directory, (time.time() - 100, time.time() - 100))  # Later changes always move the mtime
+    return str(root)
+
+
+def walk(finder, root, checkpoint_path):
+    checkpoint = ScanCheckpoint(checkpoint_path, {'roots': [root]})
+    size_groups = finder._group_files_by_size(root, 1, checkpoint=checkpoint)
+    return sorted(path for paths in size_groups.values() for path in paths)
+
+
+def test_completed_walk_picks_up_changed_directories(tmp_path):
+    root = make_tree(tmp_path)
+    checkpoint_path = str(tmp_path / 'scan.ckpt')
+    finder = DuplicateFinder(cache_path=None)
+
+    first = walk(finder, root, checkpoint_path)
+    assert first == [os.path.join(root, 'a.txt'), os.path.join(root, 'sub', 'b.txt')]
+    assert walk(finder, root, checkpoint_path) == first
+
+    write(os.path.join(root, 'sub', 'c.txt'), b'new file\n' * 10)
+    assert walk(finder, root, checkpoint_path) == sorted(first + [os.path.join(root, 'sub', 'c.txt')])
+
+
+def test_expired_checkpoint_is_ignored(tmp_path):
+    checkpoint_path = str(tmp_path / 'scan.ckpt')
+    checkpoint = ScanCheckpoint(checkpoint_path, {'roots': ['/x']}, max_age=3600)
+    checkpoint.save({10: ['/x/a']}, {(1, 1): ['/x/a']}, {'/x': 0}, walk_complete=True)
+    assert checkpoint.load()['walk_complete']
+
+    with gzip.open(checkpoint_path, 'rt', encoding='utf-8') as f:
+        state = json.load(f)
+    state['saved'] -= 2 * 3600
+    with gzip.open(checkpoint_path, 'wt', encoding='utf-8') as f:
+        json.dump(state, f)
+    assert checkpoint.load() is None
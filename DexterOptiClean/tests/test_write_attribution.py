@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import psutil
+
+from core import write_attribution
+from core.write_attribution import DiskWriterTracker
+
+
+class FakeProcess:
+    def __init__(self, pid, name, written, path):
+        self.pid = pid
+        self.info = {'pid': pid, 'name': name, 'create_time': 1.0,
+                     'io_counters': SimpleNamespace(write_bytes=written)}
+        self._path = path
+
+    def open_files(self):
+        return [SimpleNamespace(path=self._path)]
+
+    def cwd(self):
+        return '/'
+
+
+def test_new_writer_survives_a_full_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(write_attribution, 'MAX_WRITERS_PER_ROOT', 3)
+    root = str(tmp_path)
+    target = str(tmp_path / 'file')
+    tracker = DiskWriterTracker({'temp': [root]})
+    counters = {}
+
+    def sample(writes):
+        for pid, (name, written) in writes.items():
+            counters[pid] = (name, counters.get(pid, (name, 0))[1] + written)
+        processes = [FakeProcess(pid, name, total, target) for pid, (name, total) in counters.items()]
+        monkeypatch.setattr(psutil, 'process_iter', lambda *args, **kwargs: iter(processes))
+        tracker.sample()
+
+    old_writers = {pid: (f'old{pid}', 0) for pid in (1, 2, 3)}
+    sample(old_writers)  # Baseline
+    sample({pid: (name, 10 ** 6) for pid, (name, _) in old_writers.items()})
+    for pid in (1, 3):
+        counters.pop(pid)  # Exited; writer 2 keeps writing
+    sample({2: ('old2', 10)})
+    sample({2: ('old2', 10), 4: ('heavy', 0)})  # Baseline for the new process
+    sample({2: ('old2', 10), 4: ('heavy', 500)})
+
+    writers = {w['name']: w for w in tracker.get_report()['roots'][0]['writers']}
+    assert 'heavy' in writers
+    assert writers['heavy']['bytes_written'] == 500
+    assert 'old2' in writers
+    assert len(writers) == 3